@@ -23,20 +23,73 @@
 """Test that an ingested reference catalog matches some subset of the original
 input data.
 
+The sampled input rows of each file are grouped by the shard that holds them,
+each shard is read once, and the rows are matched to it by ID, checking that
+their positions agree, with array operations. With ``--nPerFile 0`` and
+``--nFiles 0`` every row of every file is checked, and ``--nProcesses``
+checks the files in parallel.
+
 Example usage (note the quotes around the glob!):
     FILEGLOB="/project/shared/data/gaia_dr2/gaia_source/csv/*.csv.gz"
     python test_ingested_refcat.py  --config gaia_dr2_config.py --ref_name gaia-dr2 refcat/ $FILEGLOB
 """
 
+import concurrent.futures
 import glob
 import os.path
 import random
 
+import numpy as np
+
 import lsst.daf.persistence
 import lsst.geom
 from lsst.meas.algorithms import LoadIndexedReferenceObjectsConfig, LoadIndexedReferenceObjectsTask
 from lsst.meas.algorithms.ingestIndexReferenceTask import IngestIndexedReferenceConfig
 
+# Maximum separation between an input row and its ingested object
+MAX_SEPARATION = 1*lsst.geom.arcseconds
+
+# Reference loader, file reader and ingest config of a worker process
+_worker = {}
+
+
+def match_rows(ids, ra, dec, refCat):
+    """Match input rows to the objects of a shard by ID, and check their
+    positions.
+
+    Parameters
+    ----------
+    ids : `numpy.ndarray` of `int`
+        IDs of the input rows.
+    ra, dec : `numpy.ndarray` of `float`
+        Positions of the input rows (degrees).
+    refCat : `lsst.afw.table.SimpleCatalog` or `None`
+        The shard the rows were ingested into.
+
+    Returns
+    -------
+    found : `numpy.ndarray` of `bool`
+        Whether each row is in ``refCat``.
+    positionOk : `numpy.ndarray` of `bool`
+        Whether each row is in ``refCat`` within ``MAX_SEPARATION`` of its
+        input position.
+    """
+    if refCat is None or len(refCat) == 0:
+        return np.zeros(len(ids), dtype=bool), np.zeros(len(ids), dtype=bool)
+    if not refCat.isContiguous():
+        refCat = refCat.copy(deep=True)
+    refIds = refCat['id']
+    order = np.argsort(refIds)
+    index = np.searchsorted(refIds, ids, sorter=order)
+    index = order[np.minimum(index, len(refIds) - 1)]
+    found = refIds[index] == ids
+    # haversine separation, precise for small angles
+    ra1, dec1 = np.radians(ra), np.radians(dec)
+    ra2, dec2 = refCat['coord_ra'][index], refCat['coord_dec'][index]
+    hav = np.sin((dec2 - dec1)/2)**2 + np.cos(dec1)*np.cos(dec2)*np.sin((ra2 - ra1)/2)**2
+    separation = 2*np.arcsin(np.sqrt(np.clip(hav, 0, 1)))
+    return found, found & (separation <= MAX_SEPARATION.asRadians())
+
 
 def do_one_file(filename, refObjLoader, reader, config, n):
     """
@@ -44,27 +97,82 @@ def do_one_file(filename, refObjLoader, reader, config, n):
     ----------
     filename : `str`
         The file to read data from.
-    refObjLoader : `lsst.meas.algorithms.LoadReferenceObjectsTask`
-        Reference loader to use to search for the sources from ``filename``.
+    refObjLoader : `lsst.meas.algorithms.LoadIndexedReferenceObjectsTask`
+        Reference loader to use to read the shards holding the sources from
+        ``filename``.
     reader : `lsst.meas.algorithms.ReadTextCatalogTask`
         File reader to use to load the data in ``filename``.
     config : `lsst.pex.config.Config`
         Configuration used to originally ingest the reference catalog, used
         to identify the mappings between input and output column names.
     n : `int`
-        Number of sources from the file to check (randomly sampled).
+        Number of sources from the file to check (randomly sampled); all
+        sources are checked if 0 or more than the number of sources.
+
+    Returns
+    -------
+    filename : `str`
+        The file checked.
+    successCount : `int`
+        Number of sources found at their input position.
+    foundCount : `int`
+        Number of sources found by ID.
+    n : `int`
+        Number of sources checked.
     """
     data = reader.run(filename)
-    filterName = config.mag_column_list[0]
-    successCount = 0
-    print("Checking:", os.path.basename(filename), end=" : ")
-    for i in random.sample(range(len(data)), n):
-        center = lsst.geom.SpherePoint(data[i][config.ra_name], data[i][config.dec_name], lsst.geom.degrees)
-        radius = 1*lsst.geom.arcseconds  # don't need to search far to get an exact match!
-        refCat = refObjLoader.loadSkyCircle(center, radius, filterName).refCat
-        if any(refCat['id'] == data[i][config.id_name]):
-            successCount += 1
-    print(f"{successCount} / {n}")
+    if 0 < n < len(data):
+        rows = np.array(sorted(random.sample(range(len(data)), n)), dtype=int)
+    else:
+        rows = np.arange(len(data))
+    ids = np.asarray(data[config.id_name])[rows]
+    ra = np.asarray(data[config.ra_name], dtype=float)[rows]
+    dec = np.asarray(data[config.dec_name], dtype=float)[rows]
+
+    # read each shard holding sampled rows once
+    shardIds = np.asarray(refObjLoader.indexer.indexPoints(ra, dec))
+    uniqueShardIds, inverse = np.unique(shardIds, return_inverse=True)
+    found = np.zeros(len(rows), dtype=bool)
+    positionOk = np.zeros(len(rows), dtype=bool)
+    for i, shardId in enumerate(uniqueShardIds):
+        # getShards omits missing shards, so read them one at a time
+        refCats = refObjLoader.getShards([int(shardId)])
+        refCat = refCats[0] if refCats else None
+        inShard = inverse == i
+        found[inShard], positionOk[inShard] = match_rows(ids[inShard], ra[inShard], dec[inShard], refCat)
+    return filename, int(positionOk.sum()), int(found.sum()), len(rows)
+
+
+def init_worker(refCatPath, refName, ingestConfig):
+    """Make the reference loader and file reader of a worker process.
+    """
+    _worker["loader"] = make_loader(refCatPath, refName)
+    _worker["reader"] = ingestConfig.file_reader.target()
+    _worker["config"] = ingestConfig
+
+
+def do_one_file_in_worker(filename, n):
+    """Check one file with the loader and reader of a worker process.
+    """
+    return do_one_file(filename, _worker["loader"], _worker["reader"], _worker["config"], n)
+
+
+def make_loader(refCatPath, refName):
+    """Make a reference loader for the reference catalog to check.
+    """
+    butler = lsst.daf.persistence.Butler(refCatPath)
+    refObjConfig = LoadIndexedReferenceObjectsConfig()
+    refObjConfig.ref_dataset_name = refName
+    return LoadIndexedReferenceObjectsTask(butler, config=refObjConfig)
+
+
+def print_result(filename, successCount, foundCount, n):
+    """Print the result of checking one file.
+    """
+    print(f"Checking: {os.path.basename(filename)} : {successCount} / {n}", end="")
+    if foundCount != successCount:
+        print(f" ({foundCount - successCount} found at a different position)", end="")
+    print()
 
 
 def main():
@@ -82,9 +190,12 @@ def main():
                         help="A glob pattern specifying the files (read by IngestIndexedReferenceTask) to "
                         " check against the refCatPath output. (e.g. '/datasets/foo/*.csv'")
     parser.add_argument("--nFiles", default=5, type=int,
-                        help="Number of input files to test (randomly selected from inputGlob).")
+                        help="Number of input files to test (randomly selected from inputGlob); "
+                        "0 for all files.")
     parser.add_argument("--nPerFile", default=100, type=int,
-                        help="Number of objects to test per file (randomly selected).")
+                        help="Number of objects to test per file (randomly selected); 0 for all objects.")
+    parser.add_argument("--nProcesses", default=1, type=int,
+                        help="Number of processes used to check files in parallel.")
     parser.add_argument("--config",
                         help="A IngestIndexedReferenceConfig config file, for the field name mappings.")
     parser.add_argument("--ref_name",
@@ -94,16 +205,24 @@ def main():
     ingestConfig = IngestIndexedReferenceConfig()
     ingestConfig.load(args.config)
 
-    butler = lsst.daf.persistence.Butler(args.refCatPath)
-    refObjConfig = LoadIndexedReferenceObjectsConfig()
-    refObjConfig.ref_dataset_name = args.ref_name
-    refObjLoader = LoadIndexedReferenceObjectsTask(butler, config=refObjConfig)
-    reader = ingestConfig.file_reader.target()
-
     files = glob.glob(args.inputGlob)
     files.sort()
-    for filename in random.sample(files, args.nFiles):
-        do_one_file(filename, refObjLoader, reader, ingestConfig, args.nPerFile)
+    if 0 < args.nFiles < len(files):
+        files = random.sample(files, args.nFiles)
+
+    if args.nProcesses == 1:
+        refObjLoader = make_loader(args.refCatPath, args.ref_name)
+        reader = ingestConfig.file_reader.target()
+        for filename in files:
+            print_result(*do_one_file(filename, refObjLoader, reader, ingestConfig, args.nPerFile))
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.nProcesses, initializer=init_worker,
+                                                initargs=(args.refCatPath, args.ref_name,
+                                                          ingestConfig)) as executor:
+        futures = [executor.submit(do_one_file_in_worker, filename, args.nPerFile) for filename in files]
+        for future in concurrent.futures.as_completed(futures):
+            print_result(*future.result())
 
 
 if __name__ == "__main__":
@@ -37,19 +37,37 @@ write the output.
 
 If you are processing a large number of files (e.g. ps1_pv3), we recommend
 capturing stdout to a log file, and using the -n8 option to parallelize it.
+
+Each file is written to a temporary file that then replaces the original, so
+an interrupted conversion never leaves a partially written file. The files
+already converted are recorded in a done-list in the directory, and
+`master_schema.fits` is converted last, so rerunning an interrupted
+conversion with ``--write`` resumes where it stopped. The throughput, in
+files and rows per second, is reported as the files are converted.
 """
 import os.path
 import glob
+import time
 
 import concurrent.futures
-import itertools
 
 import lsst.afw.table
 from lsst.meas.algorithms import DatasetConfig
-from lsst.meas.algorithms.loadReferenceObjects import convertToNanojansky, hasNanojanskyFluxUnits
+from lsst.meas.algorithms.loadReferenceObjects import (convertToNanojansky, hasNanojanskyFluxUnits,
+                                                       _makeNanojanskyMapper, _applyNanojanskyMapper)
 from lsst.meas.algorithms.ingestIndexReferenceTask import addRefCatMetadata
 import lsst.log
 
+# Name of the file listing the converted files, in the catalog directory
+DONE_LIST_NAME = "convert_refcat_to_nJy.done"
+
+# Seconds between throughput reports
+REPORT_INTERVAL = 10
+
+# Schema mapper of the last converted schema, reused by the files of a
+# process that have the same schema
+_mapperCache = {}
+
 
 def is_old_schema(config, filename):
     """Check whether this file's schema has "old-style" fluxes."""
@@ -57,6 +75,17 @@ def is_old_schema(config, filename):
     return (config.format_version == 0) and (not hasNanojanskyFluxUnits(catalog.schema))
 
 
+def get_mapper(schema):
+    """Return the schema mapper converting a schema to nJy, reusing the
+    mapper of the previous file if it has the same schema.
+    """
+    cached = _mapperCache.get("mapper")
+    if cached is None or cached[0].getInputSchema() != schema:
+        cached = _makeNanojanskyMapper(schema)
+        _mapperCache["mapper"] = cached
+    return cached
+
+
 def process_one(filename, write=False, quiet=False):
     """Convert one file in-place from Jy (or no units) to nJy fluxes.
 
@@ -68,6 +97,13 @@ def process_one(filename, write=False, quiet=False):
         Write the converted catalog out, overwriting the read in catalog?
     quiet : `bool`, optional
         Do not print messages about files read/written or fields found?
+
+    Returns
+    -------
+    filename : `str`
+        The converted file.
+    nRows : `int`
+        The number of rows in the file.
     """
     log = lsst.log.Log()
     if quiet:
@@ -76,12 +112,79 @@ def process_one(filename, write=False, quiet=False):
     log.info(f"Reading: {filename}")
     catalog = lsst.afw.table.SimpleCatalog.readFits(filename)
 
-    output = convertToNanojansky(catalog, log, doConvert=write)
-
     if write:
+        mapper, input_fields, output_fields = get_mapper(catalog.schema)
+        output = _applyNanojanskyMapper(catalog, mapper, output_fields)
+        fluxFieldsStr = '; '.join("(%s, '%s')" % (field.getName(), field.getUnits())
+                                  for field in input_fields)
+        log.info(f"Converted refcat flux fields to nJy (name, units): {fluxFieldsStr}")
         addRefCatMetadata(output)
-        output.writeFits(filename)
+        # write atomically, so that an interrupted conversion never leaves a
+        # partially written file behind
+        tmpFilename = filename + ".tmp"
+        output.writeFits(tmpFilename)
+        os.replace(tmpFilename, filename)
         log.info(f"Wrote: {filename}")
+    else:
+        convertToNanojansky(catalog, log, doConvert=False)
+    return filename, len(catalog)
+
+
+def read_done_list(path):
+    """Return the names of the files already converted in a directory.
+    """
+    doneListPath = os.path.join(path, DONE_LIST_NAME)
+    if not os.path.exists(doneListPath):
+        return set()
+    with open(doneListPath) as f:
+        return set(line.strip() for line in f if line.strip())
+
+
+def process_files(files, nprocesses=1, write=False, quiet=False, doneListPath=None):
+    """Convert files in parallel, reporting the throughput.
+
+    Parameters
+    ----------
+    files : `list` of `str`
+        The files to convert.
+    nprocesses : `int`, optional
+        Number of processes to use.
+    write : `bool`, optional
+        Write the converted catalogs out, overwriting the read in catalogs?
+    quiet : `bool`, optional
+        Do not print messages about files read/written or fields found?
+    doneListPath : `str`, optional
+        File to which to append the name of each converted file.
+    """
+    start = time.monotonic()
+    lastReport = start
+    nFiles = 0
+    nRows = 0
+
+    def report():
+        elapsed = max(time.monotonic() - start, 1e-9)
+        print(f"Converted {nFiles}/{len(files)} files, {nRows} rows: "
+              f"{nFiles/elapsed:.1f} files/s, {nRows/elapsed:.0f} rows/s")
+
+    doneList = open(doneListPath, "a") if doneListPath is not None else None
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=nprocesses) as executor:
+            futures = [executor.submit(process_one, filename, write, quiet) for filename in files]
+            # we have to at least loop over the futures, otherwise exceptions will be lost
+            for future in concurrent.futures.as_completed(futures):
+                filename, rows = future.result()
+                nFiles += 1
+                nRows += rows
+                if doneList is not None:
+                    doneList.write(os.path.basename(filename) + "\n")
+                    doneList.flush()
+                if time.monotonic() - lastReport >= REPORT_INTERVAL:
+                    lastReport = time.monotonic()
+                    report()
+    finally:
+        if doneList is not None:
+            doneList.close()
+    report()
 
 
 def main():
@@ -113,16 +216,29 @@ def main():
     configPath = os.path.join(args.path, 'config.py')
     config = DatasetConfig()
     config.load(configPath)
-    if not is_old_schema(config, schema_file):
+    # an interrupted conversion may have converted the master schema already
+    isResuming = os.path.exists(os.path.join(args.path, DONE_LIST_NAME))
+    if not isResuming and not is_old_schema(config, schema_file):
         print("Catalog does not contain old-style fluxes; nothing to convert.")
         sys.exit(0)
 
     files = glob.glob(os.path.join(args.path, "*.fits"))
-    with concurrent.futures.ProcessPoolExecutor(max_workers=args.nprocesses) as executor:
-        futures = executor.map(process_one, files, itertools.repeat(args.write), itertools.repeat(args.quiet))
-        # we have to at least loop over the futures, otherwise exceptions will be lost
-        for future in futures:
-            pass
+    doneListPath = None
+    if args.write:
+        doneListPath = os.path.join(args.path, DONE_LIST_NAME)
+        done = read_done_list(args.path)
+        if done:
+            print(f"Resuming: skipping {len(done)} files already converted.")
+        files = [filename for filename in files if os.path.basename(filename) not in done]
+    # convert the master schema last, so that an interrupted conversion is
+    # still recognized as one of an old-style catalog
+    process_files([filename for filename in files if filename != schema_file], args.nprocesses,
+                  args.write, args.quiet, doneListPath)
+    if schema_file in files:
+        process_one(schema_file, args.write, args.quiet)
+        if args.write:
+            with open(doneListPath, "a") as doneList:
+                doneList.write(os.path.basename(schema_file) + "\n")
 
     if args.write:
         config.format_version = 1
@@ -130,6 +246,7 @@ def main():
         msg = "\nUpdated refcat from version 0->1 to have nJy flux units via convert_refcat_to_nJy.py"
         config._fields['format_version'].doc += msg
         config.save(configPath)
+        os.remove(doneListPath)
         if not args.quiet:
             print("Added `format_version=1` to config.py")
 
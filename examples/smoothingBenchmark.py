@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+# Copyright 2008-2017 AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+"""Benchmark the smoothing engines of SourceDetectionTask.convolveImage
+
+Times each engine ("separable", "fft" and "recursive"), with and without
+smoothing the variance plane, on a random image for a range of PSF sigmas,
+and prints the fastest engine for each sigma and the largest difference of
+each engine's smoothed image from the separable convolution's.
+
+Example usage:
+    python smoothingBenchmark.py --size 4096 --sigma 1 2 4 8 16
+"""
+import argparse
+import time
+
+import numpy as np
+
+import lsst.afw.detection as afwDet
+import lsst.afw.image as afwImage
+from lsst.meas.algorithms import SourceDetectionTask
+
+ENGINES = ("separable", "fft", "recursive")
+
+
+def makeImage(size, seed=1):
+    """Make a noise image with a few NO_DATA pixels"""
+    maskedImage = afwImage.MaskedImageF(size, size)
+    rng = np.random.RandomState(seed)
+    maskedImage.image.array[:] = rng.normal(1000.0, 30.0, size=(size, size))
+    maskedImage.variance.array[:] = 900.0
+    maskedImage.mask.array[:] = 0
+    maskedImage.image.array[rng.randint(size, size=10), rng.randint(size, size=10)] = np.nan
+    return maskedImage
+
+
+def timeEngine(maskedImage, sigma, engine, doSmoothVariance, repeat):
+    """Return the best time and the smoothed image of one engine"""
+    config = SourceDetectionTask.ConfigClass()
+    config.smoothingEngine = engine
+    config.doSmoothVariance = doSmoothVariance
+    task = SourceDetectionTask(config=config)
+    kWidth = task.calculateKernelSize(sigma)
+    psf = afwDet.GaussianPsf(kWidth, kWidth, sigma)
+    best = None
+    for _ in range(repeat):
+        image = maskedImage.clone()
+        start = time.perf_counter()
+        middle = task.convolveImage(image, psf).middle
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, middle.image.array
+
+
+def run(size, sigmas, repeat):
+    maskedImage = makeImage(size)
+    print("%6s %6s %-9s %10s %10s %12s" % ("sigma", "kWidth", "engine", "time(s)", "noVar(s)", "maxDiff"))
+    for sigma in sigmas:
+        times = {}
+        reference = None
+        for engine in ENGINES:
+            elapsed, smoothed = timeEngine(maskedImage, sigma, engine, True, repeat)
+            noVarElapsed, _ = timeEngine(maskedImage, sigma, engine, False, repeat)
+            if reference is None:
+                reference = smoothed
+            good = np.isfinite(reference) & np.isfinite(smoothed)
+            maxDiff = np.max(np.abs(smoothed[good] - reference[good]))
+            times[engine] = noVarElapsed
+            kWidth = SourceDetectionTask().calculateKernelSize(sigma)
+            print("%6.2f %6d %-9s %10.3f %10.3f %12.4g" %
+                  (sigma, kWidth, engine, elapsed, noVarElapsed, maxDiff))
+        print("sigma=%g: fastest engine is %s" % (sigma, min(times, key=times.get)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=2048, help="Width and height of the image (pixels)")
+    parser.add_argument("--sigma", type=float, nargs="+", default=[1.0, 2.0, 4.0, 8.0, 16.0],
+                        help="PSF sigmas (pixels) to benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timings per engine (best is kept)")
+    args = parser.parse_args()
+    run(args.size, args.sigma, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -37,6 +37,8 @@ import lsst.afw.table as afwTable
 import lsst.pex.config as pexConfig
 import lsst.pipe.base as pipeBase
 from .subtractBackground import SubtractBackgroundTask
+from .gaussianSmoothing import (makeGaussianKernel1d, fftGaussianSmooth, recursiveGaussianSmooth,
+                                recursiveGaussianSumSquares, orFilter)
 
 
 class SourceDetectionConfig(pexConfig.Config):
@@ -142,6 +144,23 @@ class SourceDetectionConfig(pexConfig.Config):
         doc="Mask planes to ignore when calculating statistics of image (for thresholdType=stdev)",
         default=['BAD', 'SAT', 'EDGE', 'NO_DATA'],
     )
+    smoothingEngine = pexConfig.ChoiceField(
+        dtype=str,
+        doc="How to smooth the image with the Gaussian approximation to the PSF",
+        default="separable",
+        allowed={
+            "separable": "separable convolution (lsst.afw.math.convolve); cost grows with kernel width",
+            "fft": "the same kernel applied through Fourier transforms; for wide kernels",
+            "recursive": ("recursive (IIR) approximation to a Gaussian, whose cost does not depend on "
+                          "sigma; accurate to 0.1%, and replaced by 'fft' for sigma < 1"),
+        },
+    )
+    doSmoothVariance = pexConfig.Field(
+        dtype=bool,
+        doc=("Smooth the variance plane? If False, the smoothed image gets the unsmoothed variance, "
+             "unless thresholdType ('variance' or 'pixel_stdev') uses the variance"),
+        default=True,
+    )
 
     def setDefaults(self):
         self.tempLocalBackground.binSize = 64
@@ -512,7 +531,10 @@ into your debug.py file and run measAlgTasks.py with the @c --debug flag.
         We convolve the image with a Gaussian approximation to the PSF,
         because this is separable and therefore fast. It's technically a
         correlation rather than a convolution, but since we use a symmetric
-        Gaussian there's no difference.
+        Gaussian there's no difference. The ``smoothingEngine`` configuration
+        parameter selects whether the convolution is direct, through Fourier
+        transforms, or approximated recursively; see
+        ``examples/smoothingBenchmark.py`` for which is fastest when.
 
         The convolution can be disabled with ``doSmooth=False``. If we do
         convolve, we mask the edges as ``EDGE`` and return the convolved image
@@ -553,12 +575,22 @@ into your debug.py file and run measAlgTasks.py with the @c --debug flag.
         gaussKernel = afwMath.SeparableKernel(kWidth, kWidth, gaussFunc, gaussFunc)
 
         convolvedImage = maskedImage.Factory(maskedImage.getBBox())
-
-        afwMath.convolve(convolvedImage, maskedImage, gaussKernel, afwMath.ConvolutionControl())
         #
         # Only search psf-smoothed part of frame
         #
         goodBBox = gaussKernel.shrinkBBox(convolvedImage.getBBox())
+
+        engine = self.config.smoothingEngine
+        if engine == "recursive" and sigma < 1.0:
+            # the recursive approximation is least accurate for small sigma
+            # (and the variance is smoothed with sigma/sqrt(2)), where the
+            # kernel is narrow anyway
+            engine = "fft"
+        self.metadata.set("smoothingEngine", engine)
+        if engine != "separable":
+            self._smoothArrays(convolvedImage, maskedImage, kWidth, sigma, engine)
+        else:
+            self._convolveSeparable(convolvedImage, maskedImage, gaussKernel)
         middle = convolvedImage.Factory(convolvedImage, goodBBox, afwImage.PARENT, False)
         #
         # Mark the parts of the image outside goodBBox as EDGE
@@ -567,6 +599,81 @@ into your debug.py file and run measAlgTasks.py with the @c --debug flag.
 
         return pipeBase.Struct(middle=middle, sigma=sigma)
 
+    def _needsSmoothedVariance(self):
+        """Return whether the variance plane should be smoothed.
+        """
+        return self.config.doSmoothVariance or self.config.thresholdType in ("variance", "pixel_stdev")
+
+    def _convolveSeparable(self, convolvedImage, maskedImage, kernel):
+        """Convolve an image with a separable kernel.
+
+        Parameters
+        ----------
+        convolvedImage : `lsst.afw.image.MaskedImage`
+            Image in which to write the convolved image.
+        maskedImage : `lsst.afw.image.MaskedImage`
+            Image to convolve.
+        kernel : `lsst.afw.math.SeparableKernel`
+            Convolution kernel.
+        """
+        if self._needsSmoothedVariance():
+            afwMath.convolve(convolvedImage, maskedImage, kernel, afwMath.ConvolutionControl())
+            return
+        afwMath.convolve(convolvedImage.image, maskedImage.image, kernel, afwMath.ConvolutionControl())
+        convolvedImage.mask.array[:] = orFilter(maskedImage.mask.array, kernel.getWidth()//2)
+        convolvedImage.variance.assign(maskedImage.variance)
+
+    def _smoothArrays(self, convolvedImage, maskedImage, kWidth, sigma, engine):
+        """Smooth an image with a Gaussian using numpy arrays.
+
+        The mask bits and non-finite pixels spread over the kernel width,
+        as they do with `lsst.afw.math.convolve`, and the variance is
+        smoothed with the square of the kernel.
+
+        Parameters
+        ----------
+        convolvedImage : `lsst.afw.image.MaskedImage`
+            Image in which to write the smoothed image.
+        maskedImage : `lsst.afw.image.MaskedImage`
+            Image to smooth.
+        kWidth : `int`
+            Width of the convolution kernel.
+        sigma : `float`
+            Gaussian sigma of the kernel.
+        engine : `str`
+            Smoothing engine: "fft" or "recursive".
+        """
+        halfWidth = kWidth//2
+        if engine == "fft":
+            kernel = makeGaussianKernel1d(sigma, kWidth)
+
+            def smooth(array, squared):
+                return fftGaussianSmooth(array, kernel**2 if squared else kernel)
+        else:
+            sumSquares = recursiveGaussianSumSquares(sigma)
+
+            def smooth(array, squared):
+                if squared:
+                    # the square of the filter is close to a narrower
+                    # Gaussian, scaled by the filter's own sum of squares
+                    return recursiveGaussianSmooth(array, sigma/np.sqrt(2))*sumSquares**2
+                return recursiveGaussianSmooth(array, sigma)
+
+        def smoothFinite(array, squared=False):
+            bad = ~np.isfinite(array)
+            if not bad.any():
+                return smooth(array, squared)
+            smoothed = smooth(np.where(bad, 0.0, array), squared)
+            smoothed[orFilter(bad, halfWidth)] = np.nan
+            return smoothed
+
+        convolvedImage.image.array[:] = smoothFinite(maskedImage.image.array)
+        convolvedImage.mask.array[:] = orFilter(maskedImage.mask.array, halfWidth)
+        if self._needsSmoothedVariance():
+            convolvedImage.variance.array[:] = smoothFinite(maskedImage.variance.array, squared=True)
+        else:
+            convolvedImage.variance.assign(maskedImage.variance)
+
     def applyThreshold(self, middle, bbox, factor=1.0):
         """Apply thresholds to the convolved image
 
@@ -595,24 +702,19 @@ into your debug.py file and run measAlgTasks.py with the @c --debug flag.
         """
         results = pipeBase.Struct(positive=None, negative=None, factor=factor)
         # Detect the Footprints (peaks may be replaced if doTempLocalBackground)
-        if self.config.reEstimateBackground or self.config.thresholdPolarity != "negative":
-            threshold = self.makeThreshold(middle, "positive", factor=factor)
-            results.positive = afwDet.FootprintSet(
-                middle,
-                threshold,
-                "DETECTED",
-                self.config.minPixels
-            )
-            results.positive.setRegion(bbox)
-        if self.config.reEstimateBackground or self.config.thresholdPolarity != "positive":
-            threshold = self.makeThreshold(middle, "negative", factor=factor)
-            results.negative = afwDet.FootprintSet(
+        for polarity, maskName, unwanted in (("positive", "DETECTED", "negative"),
+                                             ("negative", "DETECTED_NEGATIVE", "positive")):
+            if not self.config.reEstimateBackground and self.config.thresholdPolarity == unwanted:
+                continue
+            threshold = self.makeThreshold(middle, polarity, factor=factor)
+            fpSet = afwDet.FootprintSet(
                 middle,
                 threshold,
-                "DETECTED_NEGATIVE",
+                maskName,
                 self.config.minPixels
             )
-            results.negative.setRegion(bbox)
+            fpSet.setRegion(bbox)
+            setattr(results, polarity, fpSet)
 
         return results
 
@@ -845,29 +947,55 @@ into your debug.py file and run measAlgTasks.py with the @c --debug flag.
         Input Footprints with fewer Peaks than self.config.nPeaksMaxSimple
         are not modified, and if no new Peaks are detected in an input
         Footprint, the brightest original Peak in that Footprint is kept.
+
+        The new Peaks are detected in a single pass over the part of the
+        image covering the Footprints to update, and assigned to them through
+        an image of their labels.
         """
-        for footprint in fpSet.getFootprints():
+        footprints = [footprint for footprint in fpSet.getFootprints()
+                      if len(footprint.getPeaks()) > self.config.nPeaksMaxSimple]
+        if not footprints:
+            return
+        bbox = lsst.geom.Box2I()
+        for footprint in footprints:
+            bbox.include(footprint.getBBox())
+        bbox.clip(image.getBBox())
+        if bbox.isEmpty():
+            return
+        labels = afwImage.ImageI(bbox)
+        labels.set(0)
+        for label, footprint in enumerate(footprints, 1):
+            footprint.getSpans().clippedTo(bbox).setImage(labels, label)
+
+        fpSetForPeaks = afwDet.FootprintSet(
+            image.Factory(image, bbox, afwImage.PARENT),
+            threshold,
+            "",  # don't set a mask plane
+            self.config.minPixels
+        )
+        allPeaks = afwDet.PeakCatalog(afwDet.PeakTable.makeMinimalSchema())
+        allPeaks.reserve(sum(len(fp.getPeaks()) for fp in fpSetForPeaks.getFootprints()))
+        for fpForPeaks in fpSetForPeaks.getFootprints():
+            allPeaks.extend(fpForPeaks.getPeaks(), deep=True)
+        if not allPeaks.isContiguous():
+            allPeaks = allPeaks.copy(deep=True)
+
+        # Sort the new peaks by the label of the footprint they fall in,
+        # keeping their detection order within each footprint, so that each
+        # footprint's peaks are a contiguous slice
+        peakLabels = labels.array[allPeaks["i_y"] - bbox.getMinY(), allPeaks["i_x"] - bbox.getMinX()]
+        order = np.argsort(peakLabels, kind="stable")
+        bounds = np.searchsorted(peakLabels[order], np.arange(len(footprints) + 2))
+        sortedPeaks = afwDet.PeakCatalog(allPeaks.getTable())
+        sortedPeaks.resize(len(allPeaks))
+        for item in allPeaks.schema:
+            sortedPeaks[item.key] = allPeaks[item.key][order]
+        for label, footprint in enumerate(footprints, 1):
             oldPeaks = footprint.getPeaks()
-            if len(oldPeaks) <= self.config.nPeaksMaxSimple:
-                continue
-            # We detect a new FootprintSet within each non-simple Footprint's
-            # bbox to avoid a big O(N^2) comparison between the two sets of
-            # Footprints.
-            sub = image.Factory(image, footprint.getBBox())
-            fpSetForPeaks = afwDet.FootprintSet(
-                sub,
-                threshold,
-                "",  # don't set a mask plane
-                self.config.minPixels
-            )
-            newPeaks = afwDet.PeakCatalog(oldPeaks.getTable())
-            for fpForPeaks in fpSetForPeaks.getFootprints():
-                for peak in fpForPeaks.getPeaks():
-                    if footprint.contains(peak.getI()):
-                        newPeaks.append(peak)
-            if len(newPeaks) > 0:
+            start, end = bounds[label], bounds[label + 1]
+            if end > start:
                 del oldPeaks[:]
-                oldPeaks.extend(newPeaks)
+                oldPeaks.extend(sortedPeaks[int(start):int(end)])
             else:
                 del oldPeaks[1:]
 
@@ -10,6 +10,7 @@ from .detection import SourceDetectionConfig, SourceDetectionTask
 from .skyObjects import SkyObjectsTask
 
 from lsst.afw.detection import FootprintSet
+from lsst.afw.geom import SpanSet
 from lsst.afw.table import SourceCatalog, SourceTable
 from lsst.meas.base import ForcedMeasurementTask
 
@@ -27,6 +28,14 @@ class DynamicDetectionConfig(SourceDetectionConfig):
     minNumSources = Field(dtype=int, default=10,
                           doc="Minimum number of sky sources in statistical sample; "
                               "if below this number, we refuse to modify the threshold.")
+    doReuseConvolvedImage = Field(dtype=bool, default=True,
+                                  doc="For the background tweak, derive the smoothed image from the first "
+                                      "pass's by adding the change in the image since then (a smooth "
+                                      "background), rather than smoothing again?")
+    doReuseSkyObjects = Field(dtype=bool, default=True,
+                              doc="For the background tweak, reuse the first pass's sky objects that are "
+                                  "still clear of the avoided mask planes, correcting their measurements "
+                                  "for the change in the image, rather than placing and measuring new ones?")
 
     def setDefaults(self):
         SourceDetectionConfig.setDefaults(self)
@@ -98,6 +107,26 @@ class DynamicDetectionTask(SourceDetectionTask):
                 configured detection threshold (`float`).
             - ``additive``: additive factor to be applied to the background
                 level (`float`).
+            - ``catalog``: measured sky objects
+                (`lsst.afw.table.SourceCatalog`).
+        """
+        catalog = self.measureSkyObjects(exposure, seed)
+        return self.calculateThresholdFromCatalog(catalog)
+
+    def measureSkyObjects(self, exposure, seed):
+        """Place sky objects and perform forced photometry on them
+
+        Parameters
+        ----------
+        exposure : `lsst.afw.image.Exposure`
+            Exposure on which we're detecting sources.
+        seed : `int`
+            RNG seed to use for finding sky objects.
+
+        Returns
+        -------
+        catalog : `lsst.afw.table.SourceCatalog`
+            Measured sky objects.
         """
         # Make a catalog of sky objects
         fp = self.skyObjects.run(exposure.maskedImage.mask, seed)
@@ -116,11 +145,39 @@ class DynamicDetectionTask(SourceDetectionTask):
 
         # Forced photometry on sky objects
         self.skyMeasurement.run(catalog, exposure, catalog, exposure.getWcs())
+        return catalog
+
+    def calculateThresholdFromCatalog(self, catalog, offsets=None):
+        """Calculate new threshold from measured sky objects
+
+        Parameters
+        ----------
+        catalog : `lsst.afw.table.SourceCatalog`
+            Measured sky objects, from `measureSkyObjects`; contiguous.
+        offsets : `numpy.ndarray`, optional
+            Change in the image level at each sky object since it was
+            measured; the measurements are corrected for it.
 
+        Returns
+        -------
+        result : `lsst.pipe.base.Struct`
+            Result struct with components:
+
+            - ``multiplicative``: multiplicative factor to be applied to the
+                configured detection threshold (`float`).
+            - ``additive``: additive factor to be applied to the background
+                level (`float`).
+            - ``catalog``: measured sky objects
+                (`lsst.afw.table.SourceCatalog`).
+        """
         # Calculate new threshold
         fluxes = catalog["base_PsfFlux_instFlux"]
         area = catalog["base_PsfFlux_area"]
         bg = catalog["base_LocalBackground_instFlux"]
+        if offsets is not None:
+            # A constant level c contributes c*area to the PSF flux
+            fluxes = fluxes + offsets*area
+            bg = bg + offsets
 
         good = (~catalog["base_PsfFlux_flag"] & ~catalog["base_LocalBackground_flag"] &
                 np.isfinite(fluxes) & np.isfinite(area) & np.isfinite(bg))
@@ -128,14 +185,59 @@ class DynamicDetectionTask(SourceDetectionTask):
         if good.sum() < self.config.minNumSources:
             self.log.warn("Insufficient good flux measurements (%d < %d) for dynamic threshold calculation",
                           good.sum(), self.config.minNumSources)
-            return Struct(multiplicative=1.0, additive=0.0)
+            return Struct(multiplicative=1.0, additive=0.0, catalog=catalog)
 
         bgMedian = np.median((fluxes/area)[good])
 
         lq, uq = np.percentile((fluxes - bg*area)[good], [25.0, 75.0])
         stdevMeas = 0.741*(uq - lq)
         medianError = np.median(catalog["base_PsfFlux_instFluxErr"][good])
-        return Struct(multiplicative=medianError/stdevMeas, additive=bgMedian)
+        return Struct(multiplicative=medianError/stdevMeas, additive=bgMedian, catalog=catalog)
+
+    def recalculateThreshold(self, exposure, catalog, offset, seed, sigma=None):
+        """Calculate new threshold again, reusing sky objects
+
+        Sky objects from a previous `calculateThreshold` that don't overlap
+        the pixels to avoid in the current mask are kept, and their
+        measurements are corrected for the change in the image since, which
+        is assumed to be smooth on the scale of the sky objects. If too few
+        are kept, new sky objects are placed and measured.
+
+        Parameters
+        ----------
+        exposure : `lsst.afw.image.Exposure`
+            Exposure on which we're detecting sources.
+        catalog : `lsst.afw.table.SourceCatalog`
+            Sky objects measured by `calculateThreshold`.
+        offset : `numpy.ndarray`
+            Change in the image array since ``catalog`` was measured.
+        seed : `int`
+            RNG seed to use for finding new sky objects.
+        sigma : `float`, optional
+            Gaussian sigma of smoothing kernel; if not provided,
+            will be deduced from the exposure's PSF.
+
+        Returns
+        -------
+        result : `lsst.pipe.base.Struct`
+            Result struct as for `calculateThresholdFromCatalog`.
+        """
+        mask = exposure.maskedImage.mask
+        avoid = SpanSet.fromMask(mask, mask.getPlaneBitMask(self.skyObjects.config.avoidMask))
+        if self.skyObjects.config.growMask > 0:
+            avoid = avoid.dilated(self.skyObjects.config.growMask)
+        keep = np.array([not source.getFootprint().getSpans().overlaps(avoid) for source in catalog],
+                        dtype=bool)
+        if keep.sum() < self.config.minNumSources:
+            self.log.info("Only %d of %d sky objects can be reused; placing new ones",
+                          keep.sum(), len(catalog))
+            return self.calculateThreshold(exposure, seed, sigma=sigma)
+        self.log.info("Reusing %d of %d sky objects", keep.sum(), len(catalog))
+        catalog = catalog[keep].copy(deep=True)
+        x0, y0 = exposure.getXY0()
+        xx = np.round(catalog.getX()).astype(int) - x0
+        yy = np.round(catalog.getY()).astype(int) - y0
+        return self.calculateThresholdFromCatalog(catalog, offset[yy, xx])
 
     def detectFootprints(self, exposure, doSmooth=True, sigma=None, clearMask=True, expId=None):
         """Detect footprints with a dynamic threshold
@@ -200,6 +302,14 @@ class DynamicDetectionTask(SourceDetectionTask):
             convolveResults = self.convolveImage(maskedImage, psf, doSmooth=doSmooth)
             middle = convolveResults.middle
             sigma = convolveResults.sigma
+            reuse = self.config.doBackgroundTweak and (self.config.doReuseConvolvedImage or
+                                                       self.config.doReuseSkyObjects)
+            if reuse:
+                # Keep the image, and the smoothed image before thresholding
+                # marks it, for the background tweak
+                firstImage = maskedImage.image.array.copy()
+                if self.config.doReuseConvolvedImage:
+                    convolved = middle.Factory(middle, True)
             prelim = self.applyThreshold(middle, maskedImage.getBBox(), self.config.prelimThresholdFactor)
             self.finalizeFootprints(maskedImage.mask, prelim, sigma, self.config.prelimThresholdFactor)
 
@@ -238,13 +348,31 @@ class DynamicDetectionTask(SourceDetectionTask):
             # from being selected for sky objects in the calculation, so do another detection pass without
             # either the local or wide temporary background subtraction; the DETECTED pixels will mark
             # the area to ignore.
+            #
+            # The image differs from the first pass's only by smooth backgrounds (the temporary wide
+            # background and the re-estimated background), which smoothing leaves unchanged, so the
+            # first pass's smoothed image and sky objects can be corrected for the difference.
             originalMask = maskedImage.mask.array.copy()
+            if reuse:
+                offset = maskedImage.image.array - firstImage
+                del firstImage
             try:
                 self.clearMask(exposure.mask)
-                convolveResults = self.convolveImage(maskedImage, psf, doSmooth=doSmooth)
-                tweakDetResults = self.applyThreshold(convolveResults.middle, maskedImage.getBBox(), factor)
+                if self.config.doReuseConvolvedImage:
+                    tweakMiddle = convolved
+                    bbox = tweakMiddle.getBBox()
+                    x0, y0 = maskedImage.getXY0()
+                    tweakMiddle.image.array += offset[bbox.getMinY() - y0:bbox.getEndY() - y0,
+                                                      bbox.getMinX() - x0:bbox.getEndX() - x0]
+                else:
+                    tweakMiddle = self.convolveImage(maskedImage, psf, doSmooth=doSmooth).middle
+                tweakDetResults = self.applyThreshold(tweakMiddle, maskedImage.getBBox(), factor)
                 self.finalizeFootprints(maskedImage.mask, tweakDetResults, sigma, factor)
-                bgLevel = self.calculateThreshold(exposure, seed, sigma=sigma).additive
+                if self.config.doReuseSkyObjects:
+                    bgLevel = self.recalculateThreshold(exposure, threshResults.catalog, offset, seed,
+                                                        sigma=sigma).additive
+                else:
+                    bgLevel = self.calculateThreshold(exposure, seed, sigma=sigma).additive
             finally:
                 maskedImage.mask.array[:] = originalMask
             self.tweakBackground(exposure, bgLevel, results.background)
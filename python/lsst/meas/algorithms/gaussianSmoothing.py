@@ -0,0 +1,290 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2017  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Gaussian smoothing of image arrays, as alternatives to
+`lsst.afw.math.convolve` with a separable Gaussian kernel.
+
+`fftGaussianSmooth` applies the same truncated, normalized kernel as the
+separable convolution, through Fourier transforms, so its cost does not grow
+with the kernel width. `recursiveGaussianSmooth` applies the fourth-order
+recursive (IIR) approximation of a Gaussian of Deriche (1993), normalized by
+its own impulse response, whose cost depends on neither the kernel width nor
+sigma.
+`orFilter` spreads mask bits as the convolution of a mask plane does.
+"""
+
+__all__ = ["makeGaussianKernel1d", "fftGaussianSmooth", "recursiveGaussianSmooth",
+           "recursiveGaussianSumSquares", "orFilter"]
+
+import functools
+
+import numpy as np
+
+
+def makeGaussianKernel1d(sigma, width):
+    """Make the normalized one-dimensional Gaussian kernel of a separable
+    convolution.
+
+    Parameters
+    ----------
+    sigma : `float`
+        Gaussian sigma (pixels).
+    width : `int`
+        Odd width of the kernel (pixels).
+
+    Returns
+    -------
+    kernel : `numpy.ndarray`
+        Kernel values, summing to 1.
+    """
+    x = np.arange(width) - width//2
+    kernel = np.exp(-0.5*(x/sigma)**2)
+    return kernel/kernel.sum()
+
+
+def _fastLength(n):
+    """Return the smallest length of the form 2^a 3^b 5^c that is at least
+    ``n``, for which Fourier transforms are fast.
+    """
+    best = 1 << max(int(n) - 1, 0).bit_length()
+    power5 = 1
+    while power5 < best:
+        power35 = power5
+        while power35 < best:
+            length = power35
+            while length < n:
+                length *= 2
+            best = min(best, length)
+            power35 *= 3
+        power5 *= 5
+    return best
+
+
+def _fftConvolve1d(array, kernel, axis):
+    """Convolve an array with a symmetric kernel along one axis, through
+    Fourier transforms, treating pixels beyond the edges as zero.
+    """
+    n = array.shape[axis]
+    length = _fastLength(n + len(kernel) - 1)
+    shape = [1]*array.ndim
+    shape[axis] = -1
+    spectrum = np.fft.rfft(array, length, axis=axis)*np.fft.rfft(kernel, length).reshape(shape)
+    full = np.fft.irfft(spectrum, length, axis=axis)
+    center = len(kernel)//2
+    index = [slice(None)]*array.ndim
+    index[axis] = slice(center, center + n)
+    return full[tuple(index)]
+
+
+def fftGaussianSmooth(array, kernel):
+    """Convolve a 2-d array with a separable kernel, through Fourier
+    transforms.
+
+    Parameters
+    ----------
+    array : `numpy.ndarray`
+        Array to smooth; must be finite.
+    kernel : `numpy.ndarray`
+        Symmetric one-dimensional kernel, applied along both axes, e.g. from
+        `makeGaussianKernel1d`.
+
+    Returns
+    -------
+    smoothed : `numpy.ndarray`
+        Smoothed array (float64). Pixels within half the kernel width of
+        the edges are affected by treating pixels beyond the edges as zero.
+    """
+    smoothed = _fftConvolve1d(np.asarray(array, dtype=np.float64), kernel, 1)
+    return _fftConvolve1d(smoothed, kernel, 0)
+
+
+@functools.lru_cache(maxsize=64)
+def _dericheCoefficients(sigma):
+    """Return the coefficients of the fourth-order recursive Gaussian filter
+    of Deriche (1993, INRIA Research Report 1893): the numerators of the
+    causal and anticausal passes and their common denominator.
+    """
+    a0, a1, b0, b1 = 1.680, 3.735, 1.783, 1.723
+    c0, c1, w0, w1 = -0.6803, -0.2598, 0.6318, 1.997
+    cos0, sin0 = np.cos(w0/sigma), np.sin(w0/sigma)
+    cos1, sin1 = np.cos(w1/sigma), np.sin(w1/sigma)
+    exp0, exp1 = np.exp(-b0/sigma), np.exp(-b1/sigma)
+    n0 = a0 + c0
+    n1 = exp1*(c1*sin1 - (c0 + 2*a0)*cos1) + exp0*(a1*sin0 - (2*c0 + a0)*cos0)
+    n2 = (2*exp0*exp1*((a0 + c0)*cos1*cos0 - a1*cos1*sin0 - c1*cos0*sin1) +
+          c0*exp0**2 + a0*exp1**2)
+    n3 = exp1*exp0**2*(c1*sin1 - c0*cos1) + exp0*exp1**2*(a1*sin0 - a0*cos0)
+    d1 = -2*exp1*cos1 - 2*exp0*cos0
+    d2 = 4*cos1*cos0*exp0*exp1 + exp1**2 + exp0**2
+    d3 = -2*cos0*exp0*exp1**2 - 2*cos1*exp1*exp0**2
+    d4 = (exp0*exp1)**2
+    causal = (n0, n1, n2, n3)
+    anticausal = (n1 - d1*n0, n2 - d2*n0, n3 - d3*n0, -d4*n0)
+    return causal, anticausal, (d1, d2, d3, d4)
+
+
+def _dericheFilter(data, sigma):
+    """Apply the unnormalized recursive Gaussian filter along the first axis
+    of a float64 array.
+
+    Each step is vectorized over the other axes; the edge pixels are repeated
+    beyond the edges, and the filter starts in the steady state for them.
+    """
+    causal, anticausal, denominator = _dericheCoefficients(sigma)
+    n = data.shape[0]
+    steady = 1 + sum(denominator)
+
+    source = np.empty((n + 4,) + data.shape[1:])
+    source[:4] = data[0]
+    source[4:] = data
+    forward = np.empty_like(source)
+    forward[:4] = data[0]*sum(causal)/steady
+    for i in range(4, n + 4):
+        forward[i] = (causal[0]*source[i] + causal[1]*source[i - 1] + causal[2]*source[i - 2] +
+                      causal[3]*source[i - 3] - denominator[0]*forward[i - 1] -
+                      denominator[1]*forward[i - 2] - denominator[2]*forward[i - 3] -
+                      denominator[3]*forward[i - 4])
+
+    source[:n] = data
+    source[n:] = data[-1]
+    backward = np.empty_like(source)
+    backward[n:] = data[-1]*sum(anticausal)/steady
+    for i in range(n - 1, -1, -1):
+        backward[i] = (anticausal[0]*source[i + 1] + anticausal[1]*source[i + 2] +
+                       anticausal[2]*source[i + 3] + anticausal[3]*source[i + 4] -
+                       denominator[0]*backward[i + 1] - denominator[1]*backward[i + 2] -
+                       denominator[2]*backward[i + 3] - denominator[3]*backward[i + 4])
+    return forward[4:] + backward[:n]
+
+
+@functools.lru_cache(maxsize=64)
+def _recursiveImpulseResponse(sigma):
+    """Return the impulse response of the unnormalized recursive filter,
+    out to 10 sigma on either side.
+    """
+    halfWidth = int(np.ceil(10*sigma))
+    delta = np.zeros((2*halfWidth + 1, 1))
+    delta[halfWidth] = 1.0
+    response = _dericheFilter(delta, sigma)[:, 0]
+    response.flags.writeable = False
+    return response
+
+
+def _recursiveGaussian1d(array, sigma, axis):
+    """Apply the recursive Gaussian filter along one axis, normalized to
+    preserve flux.
+    """
+    data = np.ascontiguousarray(np.moveaxis(np.asarray(array, dtype=np.float64), axis, 0))
+    smoothed = _dericheFilter(data, sigma)/_recursiveImpulseResponse(sigma).sum()
+    return np.moveaxis(smoothed, 0, axis)
+
+
+def recursiveGaussianSmooth(array, sigma):
+    """Smooth a 2-d array with a recursive approximation to a Gaussian.
+
+    The cost is independent of ``sigma``. The filter's impulse response
+    differs from a normalized Gaussian by less than 0.1% of its peak.
+
+    Parameters
+    ----------
+    array : `numpy.ndarray`
+        Array to smooth; must be finite.
+    sigma : `float`
+        Gaussian sigma (pixels); at least 0.5.
+
+    Returns
+    -------
+    smoothed : `numpy.ndarray`
+        Smoothed array (float64).
+
+    Raises
+    ------
+    ValueError
+        Raised if ``sigma`` is less than 0.5, for which the approximation
+        is not valid.
+    """
+    if sigma < 0.5:
+        raise ValueError("Recursive Gaussian smoothing requires sigma >= 0.5, not %g" % (sigma,))
+    return _recursiveGaussian1d(_recursiveGaussian1d(array, sigma, 1), sigma, 0)
+
+
+def recursiveGaussianSumSquares(sigma):
+    """Return the sum of the squares of the one-dimensional impulse response
+    of `recursiveGaussianSmooth`.
+
+    Smoothing the variance of an image smoothed with ``sigma`` requires the
+    square of the filter, which is close to a Gaussian of
+    ``sigma/sqrt(2)`` scaled by this sum (squared, in two dimensions).
+
+    Parameters
+    ----------
+    sigma : `float`
+        Gaussian sigma (pixels); at least 0.5.
+
+    Returns
+    -------
+    sumSquares : `float`
+        Sum of the squares of the normalized impulse response.
+    """
+    response = _recursiveImpulseResponse(sigma)
+    return float(np.sum(response**2)/response.sum()**2)
+
+
+def _orFilter1d(array, halfWidth, axis):
+    """OR each element of an integer array with its neighbors within
+    ``halfWidth`` along one axis.
+    """
+    width = 2*halfWidth + 1
+    data = np.moveaxis(array, axis, 0)
+    n = data.shape[0]
+    padded = np.zeros((n + 2*halfWidth,) + data.shape[1:], dtype=data.dtype)
+    padded[halfWidth:halfWidth + n] = data
+    # spans[i] is the OR of padded[i:i + length]; double length while it
+    # fits in the window, then OR two overlapping spans
+    spans = padded
+    length = 1
+    while 2*length <= width:
+        spans = spans[:-length] | spans[length:]
+        length *= 2
+    result = spans[:n] | spans[width - length:width - length + n]
+    return np.moveaxis(result, 0, axis)
+
+
+def orFilter(array, halfWidth):
+    """OR each element of a 2-d integer array with its neighbors within a
+    square window, as convolving a mask plane does.
+
+    Parameters
+    ----------
+    array : `numpy.ndarray`
+        Integer array, e.g. mask bits.
+    halfWidth : `int`
+        Half the width of the window (pixels).
+
+    Returns
+    -------
+    filtered : `numpy.ndarray`
+        Array of the same type as ``array``.
+    """
+    if halfWidth <= 0:
+        return array.copy()
+    return _orFilter1d(_orFilter1d(array, halfWidth, 1), halfWidth, 0)
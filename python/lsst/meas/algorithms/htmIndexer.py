@@ -21,6 +21,47 @@
 # see <https://www.lsstcorp.org/LegalNotices/>.
 #
 import esutil
+import numpy
+
+import lsst.sphgeom
+
+
+def _intersectCircle(depth, ctrCoord, radius):
+    """Find the trixels that touch a circular aperture, and which of them are
+    on its boundary, in a single pass.
+
+    Parameters
+    ----------
+    depth : `int`
+        Depth of the trixels.
+    ctrCoord : `lsst.geom.SpherePoint`
+        ICRS center of search region.
+    radius : `lsst.geom.Angle`
+        Radius of search region.
+
+    Returns
+    -------
+    shardIds : `numpy.ndarray` of `int`
+        Sorted IDs of the trixels that touch the aperture.
+    isOnBoundary : `numpy.ndarray` of `bool`
+        For each of ``shardIds``, is the trixel not fully enclosed by the
+        aperture?
+    """
+    pixelization = lsst.sphgeom.HtmPixelization(depth)
+    circle = lsst.sphgeom.Circle(ctrCoord.getVector(), lsst.sphgeom.Angle(radius.asRadians()))
+    # the range sets are sorted and disjoint, so the interior ranges can be
+    # looked up by bisection instead of testing each ID against a list
+    envelope = [numpy.arange(begin, end, dtype=numpy.int64)
+                for begin, end in pixelization.envelope(circle)]
+    shardIds = numpy.concatenate(envelope) if envelope else numpy.array([], dtype=numpy.int64)
+    interior = numpy.array([(begin, end) for begin, end in pixelization.interior(circle)],
+                           dtype=numpy.int64).reshape(-1, 2)
+    index = numpy.searchsorted(interior[:, 0], shardIds, side="right") - 1
+    if len(interior) > 0:
+        isCovered = (index >= 0) & (shardIds < interior[numpy.maximum(index, 0), 1])
+    else:
+        isCovered = numpy.zeros(len(shardIds), dtype=bool)
+    return shardIds, ~isCovered
 
 
 class HtmIndexer:
@@ -56,14 +97,8 @@ class HtmIndexer:
                 For each shard in ``shardIdList`` is the shard on the
                 boundary (not fully enclosed by the search region)?
         """
-        shardIdList = self.htm.intersect(ctrCoord.getLongitude().asDegrees(),
-                                         ctrCoord.getLatitude().asDegrees(),
-                                         radius.asDegrees(), inclusive=True)
-        coveredShardIdList = self.htm.intersect(ctrCoord.getLongitude().asDegrees(),
-                                                ctrCoord.getLatitude().asDegrees(),
-                                                radius.asDegrees(), inclusive=False)
-        isOnBoundary = (shardId not in coveredShardIdList for shardId in shardIdList)
-        return shardIdList, isOnBoundary
+        shardIds, isOnBoundary = _intersectCircle(self.htm.get_depth(), ctrCoord, radius)
+        return shardIds.tolist(), isOnBoundary.tolist()
 
     def indexPoints(self, raList, decList):
         """Generate shard IDs for sky positions.
@@ -102,3 +137,182 @@ class HtmIndexer:
             # NoneType doesn't format, so make dummy pixel
             shardId = 0
         return {'pixel_id': shardId, 'name': datasetName}
+
+
+class AdaptiveHtmIndexer(HtmIndexer):
+    """Manage a spatial index of hierarchical triangular mesh (HTM) shards
+    of varying depth.
+
+    Trixels at the base depth are split into their four children, down to a
+    maximum depth, wherever they hold too many objects; the leaves of the
+    resulting tree are the shards. The tree is described by the IDs of the
+    split trixels: the children of trixel ``i`` are ``4*i`` to ``4*i + 3``.
+
+    Parameters
+    ----------
+    depth : `int`
+        Base depth of the HTM hierarchy.
+    maxDepth : `int`
+        Maximum depth to which trixels may be split.
+    maxRows : `int`
+        Trixels with more objects than this are split by `makeShardTree`.
+    splitShardIds : iterable of `int`, optional
+        IDs of the split trixels, as computed by `makeShardTree`; if `None`,
+        no trixel is split.
+    """
+    def __init__(self, depth=7, maxDepth=12, maxRows=100000, splitShardIds=None):
+        super().__init__(depth=depth)
+        self.depth = depth
+        self.maxDepth = maxDepth
+        self.maxRows = maxRows
+        self._htmByDepth = {depth: self.htm}
+        self._setSplitShardIds(splitShardIds or [])
+
+    def _setSplitShardIds(self, splitShardIds):
+        self.splitShardIds = numpy.unique(numpy.asarray(splitShardIds, dtype=numpy.int64))
+        self._splitShardIdSet = set(self.splitShardIds.tolist())
+        # the deepest depth at which there are leaves
+        if len(self.splitShardIds) > 0:
+            self._leafDepth = self._getDepth(self.splitShardIds.max()) + 1
+        else:
+            self._leafDepth = self.depth
+
+    @staticmethod
+    def _getDepth(shardId):
+        """Return the depth of an HTM ID; IDs at depth d are in
+        [8*4**d, 16*4**d).
+        """
+        return (int(shardId).bit_length() - 4)//2
+
+    def _getHtm(self, depth):
+        if depth not in self._htmByDepth:
+            self._htmByDepth[depth] = esutil.htm.HTM(depth)
+        return self._htmByDepth[depth]
+
+    def makeShardTree(self, pixelIds, counts):
+        """Compute which trixels to split from object counts.
+
+        Parameters
+        ----------
+        pixelIds : `numpy.ndarray` of `int`
+            HTM IDs at ``maxDepth``, as returned by `indexPointsAtMaxDepth`;
+            may contain duplicates.
+        counts : `numpy.ndarray` of `int`
+            Number of objects in each of ``pixelIds``.
+
+        Returns
+        -------
+        splitShardIds : `numpy.ndarray` of `int`
+            IDs of the split trixels; also used by this indexer from now on.
+        """
+        pixelIds = numpy.asarray(pixelIds, dtype=numpy.int64)
+        counts = numpy.asarray(counts, dtype=numpy.int64)
+        splitShardIds = []
+        # trixels whose ancestors are all split, at the current depth
+        candidates = None
+        for depth in range(self.depth, self.maxDepth):
+            parentIds = pixelIds >> 2*(self.maxDepth - depth)
+            uniqueIds, inverse = numpy.unique(parentIds, return_inverse=True)
+            totals = numpy.bincount(inverse, weights=counts)
+            dense = uniqueIds[totals > self.maxRows]
+            if candidates is not None:
+                dense = dense[numpy.isin(dense >> 2, candidates)]
+            if len(dense) == 0:
+                break
+            splitShardIds.append(dense)
+            candidates = dense
+        self._setSplitShardIds(numpy.concatenate(splitShardIds) if splitShardIds else [])
+        return self.splitShardIds
+
+    def getLeafShardIds(self):
+        """Return the IDs of all shards.
+
+        Returns
+        -------
+        shardIds : `list` of `int`
+            IDs of the leaves of the shard tree, which may be at different
+            depths.
+        """
+        start = 8*4**self.depth
+        shardIds = [i for i in range(start, 2*start) if i not in self._splitShardIdSet]
+        for splitId in self.splitShardIds.tolist():
+            shardIds.extend(i for i in range(4*splitId, 4*splitId + 4) if i not in self._splitShardIdSet)
+        return sorted(shardIds)
+
+    def getShardIds(self, ctrCoord, radius):
+        """Get the IDs of all shards that touch a circular aperture.
+
+        Parameters
+        ----------
+        ctrCoord : `lsst.geom.SpherePoint`
+            ICRS center of search region.
+        radius : `lsst.geom.Angle`
+            Radius of search region.
+
+        Returns
+        -------
+        results : `tuple`
+            A tuple containing:
+
+            - shardIdList : `list` of `int`
+                List of shard IDs, which may be at different depths.
+            - isOnBoundary : `list` of `bool`
+                For each shard in ``shardIdList`` is the shard on the
+                boundary (not fully enclosed by the search region)?
+        """
+        shardIdList = []
+        isOnBoundary = []
+        for depth in range(self.depth, self._leafDepth + 1):
+            candidateIds, candidateIsOnBoundary = _intersectCircle(depth, ctrCoord, radius)
+            # keep the leaves: trixels that are not split, and whose parent is
+            # split unless they are at the base depth
+            isLeaf = ~numpy.isin(candidateIds, self.splitShardIds)
+            if depth > self.depth:
+                isLeaf &= numpy.isin(candidateIds >> 2, self.splitShardIds)
+            shardIdList.extend(candidateIds[isLeaf].tolist())
+            isOnBoundary.extend(candidateIsOnBoundary[isLeaf].tolist())
+        return shardIdList, isOnBoundary
+
+    def indexPointsAtMaxDepth(self, raList, decList):
+        """Generate HTM IDs at ``maxDepth`` for sky positions.
+
+        Parameters
+        ----------
+        raList : `list` of `float`
+            List of right ascensions, in degrees.
+        decList : `list` of `float`
+            List of declinations, in degrees.
+
+        Returns
+        -------
+        pixelIds : `numpy.ndarray` of `int`
+            HTM IDs at ``maxDepth``.
+        """
+        return numpy.asarray(self._getHtm(self.maxDepth).lookup_id(raList, decList), dtype=numpy.int64)
+
+    def indexPoints(self, raList, decList):
+        """Generate shard IDs for sky positions.
+
+        Parameters
+        ----------
+        raList : `list` of `float`
+            List of right ascensions, in degrees.
+        decList : `list` of `float`
+            List of declinations, in degrees.
+
+        Returns
+        -------
+        shardIds : `numpy.ndarray` of `int`
+            IDs of the shards containing each position.
+        """
+        if len(self.splitShardIds) == 0:
+            return super().indexPoints(raList, decList)
+        fineIds = self._getHtm(self._leafDepth).lookup_id(raList, decList)
+        fineIds = numpy.asarray(fineIds, dtype=numpy.int64)
+        shardIds = fineIds >> 2*(self._leafDepth - self.depth)
+        descend = numpy.isin(shardIds, self.splitShardIds)
+        for depth in range(self.depth + 1, self._leafDepth + 1):
+            childIds = fineIds >> 2*(self._leafDepth - depth)
+            shardIds = numpy.where(descend, childIds, shardIds)
+            descend &= numpy.isin(childIds, self.splitShardIds)
+        return shardIds
@@ -23,8 +23,8 @@
 
 __all__ = ["IndexerRegistry"]
 
-from lsst.pex.config import Config, makeRegistry, Field
-from .htmIndexer import HtmIndexer
+from lsst.pex.config import Config, makeRegistry, Field, ListField
+from .htmIndexer import HtmIndexer, AdaptiveHtmIndexer
 
 IndexerRegistry = makeRegistry(
     """Registry of indexing algorithms
@@ -48,3 +48,41 @@ def makeHtmIndexer(config):
 
 makeHtmIndexer.ConfigClass = HtmIndexerConfig
 IndexerRegistry.register("HTM", makeHtmIndexer)
+
+
+class AdaptiveHtmIndexerConfig(HtmIndexerConfig):
+    max_depth = Field(
+        doc="Maximum depth to which dense trixels are split.",
+        dtype=int,
+        default=12,
+    )
+    max_rows = Field(
+        doc="Target maximum number of objects per shard; at ingest, trixels with more objects than this "
+            "are split into their children, down to max_depth.",
+        dtype=int,
+        default=100000,
+    )
+    split_shard_ids = ListField(
+        doc="IDs of the trixels that are split into their four children. Computed when the catalog "
+            "is ingested, and recorded in the dataset config so that loaders use the same shard tree.",
+        dtype=int,
+        optional=True,
+        default=None,
+    )
+
+    def validate(self):
+        super().validate()
+        if self.max_depth < self.depth:
+            raise ValueError("max_depth (%d) must not be smaller than depth (%d)" %
+                             (self.max_depth, self.depth))
+
+
+def makeAdaptiveHtmIndexer(config):
+    """Make an AdaptiveHtmIndexer
+    """
+    return AdaptiveHtmIndexer(depth=config.depth, maxDepth=config.max_depth, maxRows=config.max_rows,
+                              splitShardIds=config.split_shard_ids)
+
+
+makeAdaptiveHtmIndexer.ConfigClass = AdaptiveHtmIndexerConfig
+IndexerRegistry.register("ADAPTIVE_HTM", makeAdaptiveHtmIndexer)
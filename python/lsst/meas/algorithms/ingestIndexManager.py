@@ -21,26 +21,78 @@
 
 __all__ = ["IngestIndexManager"]
 
+import hashlib
+import json
 import os.path
 import itertools
 import multiprocessing
+import shutil
 
 import astropy.time
 import astropy.units as u
+import esutil
 import numpy as np
+import numpy.lib.recfunctions
 
 import lsst.sphgeom
 import lsst.afw.table as afwTable
 from lsst.afw.image import fluxErrFromABMagErr
+from .parquetShard import readParquetShard, writeParquetShard
+from .shardSubIndex import writeSubIndex
 
 
-# global shared counter to keep track of source ids
-# (multiprocess sharing is most easily done with a global)
-COUNTER = 0
 # global shared counter to keep track of number of files processed.
 FILE_PROGRESS = 0
 
 
+def _readBlocks(fileReader, filename):
+    """Read an input file in blocks of rows, or whole if the file reader
+    cannot read it in blocks.
+
+    Parameters
+    ----------
+    fileReader : `lsst.pipe.base.Task`
+        The file reader to use to load the file.
+    filename : `str`
+        The file to read.
+
+    Returns
+    -------
+    blocks : iterable of `numpy.ndarray`
+        The blocks of rows of the file.
+    """
+    if hasattr(fileReader, "readBlocks"):
+        return fileReader.readBlocks(filename)
+    return [fileReader.run(filename)]
+
+
+def _countRows(fileReader, filename):
+    """Return the number of rows in an input file, reading the whole file if
+    the file reader cannot count them without parsing it.
+
+    Parameters
+    ----------
+    fileReader : `lsst.pipe.base.Task`
+        The file reader to use to load the file.
+    filename : `str`
+        The file to read.
+
+    Returns
+    -------
+    nRows : `int`
+        The number of rows the file reader reads from the file.
+    """
+    if hasattr(fileReader, "getRowCount"):
+        return fileReader.getRowCount(filename)
+    return len(fileReader.run(filename))
+
+
+# numpy types of the numeric afw.table field type strings
+_FIELD_DTYPES = {"B": np.dtype(np.uint8), "U": np.dtype(np.uint16), "I": np.dtype(np.int32),
+                 "L": np.dtype(np.int64), "F": np.dtype(np.float32), "D": np.dtype(np.float64),
+                 "Angle": np.dtype(np.float64)}
+
+
 class IngestIndexManager:
     """
     Ingest a reference catalog from external files into a butler repository,
@@ -49,7 +101,8 @@ class IngestIndexManager:
     Parameters
     ----------
     filenames : `dict` [`int`, `str`]
-        The HTM pixel id and filenames to ingest the catalog into.
+        The HTM pixel id and filenames to ingest the catalog into; there
+        must be a filename for every shard ID returned by the indexer.
     config : `lsst.meas.algorithms.IngestIndexedReferenceConfig`
         The Task configuration holding the field names.
     file_reader : `lsst.pipe.base.Task`
@@ -89,22 +142,283 @@ class IngestIndexManager:
         ----------
         inputFiles : `list`
             A list of file paths to read data from.
+
+        Raises
+        ------
+        RuntimeError
+            Raised if ``config.two_phase`` is not set and some output files
+            already exist.
         """
-        global COUNTER, FILE_PROGRESS
+        global FILE_PROGRESS
         self.nInputFiles = len(inputFiles)
 
+        if self.config.two_phase:
+            self._runTwoPhase(inputFiles)
+            return
+
+        # a single-phase ingest appends to the output files, so it cannot
+        # resume an interrupted one without duplicating rows
+        existing = self._findExistingOutputs()
+        if existing:
+            raise RuntimeError(f"{len(existing)} output files already exist, e.g. {existing[0]}, maybe "
+                               "from an interrupted ingest, and a single-phase ingest would append to "
+                               "them. Delete them to start again; set two_phase for an ingest that can "
+                               "be resumed.")
+
         with multiprocessing.Manager() as manager:
-            COUNTER = multiprocessing.Value('i', 0)
             FILE_PROGRESS = multiprocessing.Value('i', 0)
             fileLocks = manager.dict()
-            self.log.info("Creating %s file locks.", self.htmRange[1] - self.htmRange[0])
-            for i in range(self.htmRange[0], self.htmRange[1]):
+            self.log.info("Creating %s file locks.", len(self.filenames))
+            for i in self.filenames:
                 fileLocks[i] = manager.Lock()
             self.log.info("File locks created.")
             with multiprocessing.Pool(self.config.n_processes) as pool:
-                pool.starmap(self._ingestOneFile, zip(inputFiles, itertools.repeat(fileLocks)))
+                idOffsets, nRows = self._getIdOffsets(inputFiles, pool)
+                pool.starmap(self._ingestOneFile, zip(inputFiles, idOffsets, nRows,
+                                                      itertools.repeat(fileLocks)))
+
+    def _findExistingOutputs(self):
+        """Return the output files that already exist.
+
+        Each output directory is listed once, rather than checking each of
+        the (possibly very many) output files.
+
+        Returns
+        -------
+        existing : `list` [`str`]
+            Sorted paths of the existing output files.
+        """
+        byDirectory = {}
+        for filename in self.filenames.values():
+            byDirectory.setdefault(os.path.dirname(filename), set()).add(os.path.basename(filename))
+        existing = []
+        for directory, names in byDirectory.items():
+            if os.path.isdir(directory):
+                existing.extend(os.path.join(directory, name) for name in names & set(os.listdir(directory)))
+        return sorted(existing)
+
+    def _runTwoPhase(self, inputFiles):
+        """Index a set of input files in two phases, writing each output
+        file exactly once.
+
+        In the first (scatter) phase, each input file is split by HTM pixel
+        and the rows for each pixel are appended to that pixel's spill
+        directory as a ``.npz`` chunk; each chunk has exactly one writer, so
+        no locking is needed. In the second (gather) phase, the chunks for
+        each pixel are read back and the output catalog for that pixel is
+        written once. The rows of each file are counted as it is scattered,
+        and (unless ``config.id_name`` is set) numbered from the total number
+        of rows in the files before it when they are gathered, so the files
+        need not be scanned for their number of rows beforehand.
+
+        Completed input files and output pixels are recorded in a manifest
+        in the spill directory, so that an interrupted ingest can be rerun
+        with the same inputs and skip the work that was already done. The
+        spill chunks and the ids of each file depend on its position in the
+        list of input files, so the manifest also records a digest of that
+        list (and of the file reader configuration), and resuming with a
+        different one is refused.
+
+        Parameters
+        ----------
+        inputFiles : `list`
+            A list of file paths to read data from.
+
+        Raises
+        ------
+        RuntimeError
+            Raised if the spill directory holds an interrupted ingest of
+            different input files.
+        """
+        global FILE_PROGRESS
+        spillDir = self._getSpillDir()
+        manifestPath = os.path.join(spillDir, "manifest.txt")
+        os.makedirs(spillDir, exist_ok=True)
+        inputsDigest = self._getInputsDigest(inputFiles)
+        manifestDigest, doneFiles, donePixels = self._readManifest(manifestPath)
+        if manifestDigest is None:
+            self._appendManifest(manifestPath, "inputs", inputsDigest)
+        elif manifestDigest != inputsDigest:
+            raise RuntimeError(f"{spillDir} holds an interrupted ingest of different input files, or of "
+                               "files in a different order or read with a different configuration; "
+                               "rerun with the same inputs to resume it, or delete it to start again.")
+        if doneFiles or donePixels:
+            self.log.info("Resuming ingest from %s: %d input files and %d pixels already done.",
+                          manifestPath, len(doneFiles), len(donePixels))
+
+        FILE_PROGRESS = multiprocessing.Value('i', len(doneFiles))
+        with multiprocessing.Pool(self.config.n_processes) as pool:
+            self.log.info("Scattering %d input files into %s.", self.nInputFiles - len(doneFiles), spillDir)
+            # Result callbacks all run in one thread of this process, so the
+            # manifest has a single writer.
+            results = {filename: pool.apply_async(self._scatterOneFile, (filename, fileIndex, spillDir),
+                                                  callback=lambda nRows, filename=filename:
+                                                  self._appendManifest(manifestPath, "file",
+                                                                       f"{nRows}\t{filename}"))
+                       for fileIndex, filename in enumerate(inputFiles) if filename not in doneFiles}
+            nRows = [doneFiles[filename] if filename in doneFiles else results[filename].get()
+                     for filename in inputFiles]
+            if self.config.id_name:
+                idOffsets = [0]*len(inputFiles)
+            else:
+                idOffsets = [0] + list(itertools.accumulate(nRows))[:-1]
+
+            pixelIds = sorted(int(name) for name in os.listdir(spillDir) if name.isdigit())
+            self.log.info("Gathering %d HTM pixels.", len(pixelIds) - len(donePixels))
+            results = [pool.apply_async(self._gatherOnePixel, (pixelId, spillDir, idOffsets),
+                                        callback=lambda _, pixelId=pixelId:
+                                        self._appendManifest(manifestPath, "pixel", pixelId))
+                       for pixelId in pixelIds if pixelId not in donePixels]
+            for result in results:
+                result.get()
+        shutil.rmtree(spillDir)
+
+    @staticmethod
+    def _readManifest(manifestPath):
+        """Read the manifest of completed work of a two-phase ingest.
+
+        Parameters
+        ----------
+        manifestPath : `str`
+            Path to the manifest; it need not exist.
+
+        Returns
+        -------
+        inputsDigest : `str` or `None`
+            The digest of the input files of the ingest (see
+            `_getInputsDigest`), or `None` if none was recorded.
+        doneFiles : `dict` [`str`, `int`]
+            The number of rows of each input file whose rows have all been
+            written to spill files.
+        donePixels : `set` [`int`]
+            The pixels whose output files have been written.
+        """
+        inputsDigest = None
+        doneFiles = {}
+        donePixels = set()
+        if not os.path.exists(manifestPath):
+            return inputsDigest, doneFiles, donePixels
+        with open(manifestPath) as f:
+            for line in f:
+                # an interrupted write can leave a partial last line
+                if not line.endswith("\n"):
+                    break
+                kind, value = line.rstrip("\n").split("\t", 1)
+                if kind == "inputs":
+                    inputsDigest = value
+                elif kind == "file":
+                    nRows, filename = value.split("\t", 1)
+                    doneFiles[filename] = int(nRows)
+                elif kind == "pixel":
+                    donePixels.add(int(value))
+        return inputsDigest, doneFiles, donePixels
+
+    def _getInputsDigest(self, inputFiles):
+        """Return a digest of the ordered input files and of the file reader
+        configuration, on which the spill chunks and ids of a two-phase
+        ingest depend.
+
+        Parameters
+        ----------
+        inputFiles : `list`
+            A list of file paths to read data from.
+
+        Returns
+        -------
+        digest : `str`
+            Hexadecimal SHA-256 digest.
+        """
+        state = {"inputFiles": list(inputFiles), "id_name": self.config.id_name,
+                 "file_reader": self.file_reader.config.toDict()}
+        return hashlib.sha256(json.dumps(state, sort_keys=True, default=str).encode()).hexdigest()
+
+    @staticmethod
+    def _appendManifest(manifestPath, kind, value):
+        """Record the input files, or one completed input file or output
+        pixel, in the manifest.
+
+        Parameters
+        ----------
+        manifestPath : `str`
+            Path to the manifest.
+        kind : `str`
+            Either "inputs", "file" or "pixel".
+        value : `str` or `int`
+            The digest of the input files, the number of rows and path of
+            the input file separated by a tab, or the pixel id.
+        """
+        with open(manifestPath, "a") as f:
+            f.write(f"{kind}\t{value}\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _getIdOffsets(self, inputFiles, pool):
+        """Reserve a range of ids for each input file.
+
+        The ranges are computed by prefix-summing the number of rows in each
+        file, from the file reader's ``getRowCount`` (or, for readers
+        without it, from reading the whole file). Each worker can then
+        assign ids without any inter-process communication, and the ids of a
+        given input are consecutive, and the same regardless of
+        ``n_processes``, of the order in which the files are processed, or
+        of ``config.two_phase``. For text files, this reads (and
+        decompresses) every file once more before any is ingested; the
+        two-phase ingest avoids that by counting the rows as it scatters
+        them.
+
+        Parameters
+        ----------
+        inputFiles : `list`
+            A list of file paths to read data from.
+        pool : `multiprocessing.Pool`
+            Pool in which to scan the files.
+
+        Returns
+        -------
+        idOffsets : `list` [`int`]
+            The first id to assign to the rows of each input file, or 0 for
+            every file if ``config.id_name`` is set.
+        nRows : `list` [`int` or `None`]
+            The number of rows in each input file, or `None` for every file
+            if ``config.id_name`` is set.
+        """
+        if self.config.id_name:
+            return [0]*len(inputFiles), [None]*len(inputFiles)
+        nRows = pool.starmap(_countRows, zip(itertools.repeat(self.file_reader), inputFiles))
+        return [0] + list(itertools.accumulate(nRows))[:-1], nRows
+
+    def _getIds(self, inputData, idOffset):
+        """Return the ids for the rows of one input file.
+
+        Use the ``config.id_name`` column if specified, otherwise number the
+        rows consecutively from ``idOffset``.
+
+        Parameters
+        ----------
+        inputData : `numpy.ndarray`
+            The data from one input file.
+        idOffset : `int`
+            The first id reserved for this file.
+
+        Returns
+        -------
+        ids : `numpy.ndarray`
+            The row-matched ids.
+        """
+        if self.config.id_name:
+            return inputData[self.config.id_name]
+        return np.arange(idOffset, idOffset + len(inputData), dtype=np.int64)
+
+    def _getSpillDir(self):
+        """Return the directory to hold the per-pixel spill files of a
+        two-phase ingest.
+        """
+        if self.config.spill_dir:
+            return self.config.spill_dir
+        outputDir = os.path.dirname(next(iter(self.filenames.values())))
+        return os.path.join(outputDir, "ingest_spill")
 
-    def _ingestOneFile(self, filename, fileLocks):
+    def _ingestOneFile(self, filename, idOffset, nRows, fileLocks):
         """Read and process one file, and write its records to the correct
         indexed files, while handling exceptions in a useful way so that they
         don't get swallowed by the multiprocess pool.
@@ -113,19 +427,177 @@ class IngestIndexManager:
         ----------
         filename : `str`
             The file to process.
+        idOffset : `int`
+            The first id reserved for the rows of this file.
+        nRows : `int` or `None`
+            The number of ids reserved for the rows of this file, or `None`
+            if the ids are read from the file.
         fileLocks : `dict` [`int`, `multiprocessing.Lock`]
             A Lock for each HTM pixel; each pixel gets one file written, and
             we need to block when one process is accessing that file.
+
+        Raises
+        ------
+        RuntimeError
+            Raised if the file has more rows than were counted, whose ids
+            would be those reserved for the next file.
+        """
+        idEnd = None if nRows is None else idOffset + nRows
+        # read the file in blocks, to bound the memory used by each worker
+        for inputData in _readBlocks(self.file_reader, filename):
+            if idEnd is not None and idOffset + len(inputData) > idEnd:
+                raise RuntimeError(f"{filename} has more rows than the {nRows} counted by the file "
+                                   "reader; set two_phase or id_name to ingest it.")
+            self._checkColumnTypes(inputData, filename)
+            fluxes = self._getFluxes(inputData)
+            ids = self._getIds(inputData, idOffset)
+            idOffset += len(inputData)
+            matchedPixels = self.indexer.indexPoints(inputData[self.config.ra_name],
+                                                     inputData[self.config.dec_name])
+            pixel_ids = set(matchedPixels)
+            for pixelId in pixel_ids:
+                with fileLocks[pixelId]:
+                    self._doOnePixel(inputData, matchedPixels, pixelId, fluxes, ids)
+        self._updateFileProgress()
+
+    def _scatterOneFile(self, filename, fileIndex, spillDir):
+        """Read one file and write its rows into one spill chunk per HTM
+        pixel that it touches, for each block of rows read from the file.
+
+        Unless ``config.id_name`` is set, the ids written with the rows are
+        their row numbers in the file, to which the gather phase adds the
+        file's id offset.
+
+        Parameters
+        ----------
+        filename : `str`
+            The file to process.
+        fileIndex : `int`
+            Index of ``filename`` in the list of input files; used to name
+            the spill chunks, so that each chunk has a single writer.
+        spillDir : `str`
+            Directory holding one sub-directory of spill chunks per pixel.
+
+        Returns
+        -------
+        nRows : `int`
+            The number of rows in the file.
+        """
+        nRows = 0
+        # read the file in blocks, to bound the memory used by each worker
+        for blockIndex, inputData in enumerate(_readBlocks(self.file_reader, filename)):
+            self._checkColumnTypes(inputData, filename)
+            ids = self._getIds(inputData, nRows)
+            nRows += len(inputData)
+            matchedPixels = self.indexer.indexPoints(inputData[self.config.ra_name],
+                                                     inputData[self.config.dec_name])
+            # a stable sort keeps the input order of the rows within each pixel
+            order = np.argsort(matchedPixels, kind="stable")
+            pixelIds, starts = np.unique(np.asarray(matchedPixels)[order], return_index=True)
+            for pixelId, idx in zip(pixelIds, np.split(order, starts[1:])):
+                pixelDir = os.path.join(spillDir, "%d" % pixelId)
+                os.makedirs(pixelDir, exist_ok=True)
+                path = os.path.join(pixelDir, "%d_%d.npz" % (fileIndex, blockIndex))
+                with open(path + ".tmp", "wb") as f:
+                    np.savez(f, data=self._toPlainArray(inputData[idx]), ids=ids[idx])
+                os.replace(path + ".tmp", path)
+        self._updateFileProgress()
+        return nRows
+
+    def _gatherOnePixel(self, pixelId, spillDir, idOffsets):
+        """Read back all spill chunks for one HTM pixel and write that
+        pixel's output catalog.
+
+        Parameters
+        ----------
+        pixelId : `int`
+            The pixel index we are currently processing.
+        spillDir : `str`
+            Directory holding one sub-directory of spill chunks per pixel.
+        idOffsets : `list` [`int`]
+            The id offset of each input file, added to the ids of its
+            chunks.
+        """
+        pixelDir = os.path.join(spillDir, "%d" % pixelId)
+        # order the chunks by input file and block index, for a reproducible row order
+        chunkIndices = sorted(tuple(int(i) for i in os.path.splitext(name)[0].split("_"))
+                              for name in os.listdir(pixelDir) if name.endswith(".npz"))
+        chunks = []
+        ids = []
+        for fileIndex, blockIndex in chunkIndices:
+            with np.load(os.path.join(pixelDir, "%d_%d.npz" % (fileIndex, blockIndex))) as chunk:
+                chunks.append(chunk["data"])
+                ids.append(chunk["ids"] + idOffsets[fileIndex])
+        # different input files may have different string column widths
+        inputData = numpy.lib.recfunctions.stack_arrays(chunks, usemask=False, autoconvert=True)
+        ids = np.concatenate(ids)
+        subIndexDepth = self.config.dataset_config.sub_index_depth
+        if subIndexDepth is not None:
+            # sort the rows by finer trixel, so that loaders can read only
+            # the rows near their search region
+            subIndexer = esutil.htm.HTM(subIndexDepth)
+            subIds = subIndexer.lookup_id(inputData[self.config.ra_name], inputData[self.config.dec_name])
+            order = np.argsort(subIds, kind="stable")
+            inputData = inputData[order]
+            ids = ids[order]
+            writeSubIndex(self.filenames[pixelId], subIds[order])
+        catalog = afwTable.SimpleCatalog(self.schema)
+        catalog.resize(len(inputData))
+        self.addRefCatMetadata(catalog)
+        self._fillNewRows(catalog, inputData, self._getFluxes(inputData), ids)
+        datasetConfig = self.config.dataset_config
+        self._writeCatalog(catalog, self.filenames[pixelId], datasetConfig.shard_format,
+                           datasetConfig.parquet_row_group_size)
+
+    @staticmethod
+    def _writeCatalog(catalog, filename, shardFormat="fits", rowGroupSize=None):
+        """Write a catalog atomically, so that an interrupted ingest never
+        leaves a partially written file behind.
+
+        Parameters
+        ----------
+        catalog : `lsst.afw.table.SimpleCatalog`
+            The catalog to write.
+        filename : `str`
+            The path to write the catalog to.
+        shardFormat : `str`, optional
+            File format, "fits" or "parquet".
+        rowGroupSize : `int`, optional
+            Maximum number of rows per row group of a Parquet file; by
+            default a single row group is written.
+        """
+        if shardFormat == "parquet":
+            writeParquetShard(catalog, filename, rowGroupSize=rowGroupSize)
+            return
+        tmpFilename = filename + ".tmp"
+        catalog.writeFits(tmpFilename)
+        os.replace(tmpFilename, filename)
+
+    @staticmethod
+    def _toPlainArray(inputData):
+        """Convert the output of a file reader into a plain numpy structured
+        array that can be saved with `numpy.save`.
+
+        Parameters
+        ----------
+        inputData : `numpy.ndarray`
+            The data from one input file; may be a subclass such as
+            `astropy.io.fits.FITS_rec`, whose columns are converted on access.
+
+        Returns
+        -------
+        array : `numpy.ndarray`
+            The same data, as a plain structured array.
+        """
+        names = inputData.dtype.names
+        return np.rec.fromarrays([np.asarray(inputData[name]) for name in names],
+                                 names=names).view(np.ndarray)
+
+    def _updateFileProgress(self):
+        """Increment the count of processed input files, logging each time
+        another percent of the files has been completed.
         """
         global FILE_PROGRESS
-        inputData = self.file_reader.run(filename)
-        fluxes = self._getFluxes(inputData)
-        matchedPixels = self.indexer.indexPoints(inputData[self.config.ra_name],
-                                                 inputData[self.config.dec_name])
-        pixel_ids = set(matchedPixels)
-        for pixelId in pixel_ids:
-            with fileLocks[pixelId]:
-                self._doOnePixel(inputData, matchedPixels, pixelId, fluxes)
         with FILE_PROGRESS.get_lock():
             oldPercent = 100 * FILE_PROGRESS.value / self.nInputFiles
             FILE_PROGRESS.value += 1
@@ -137,7 +609,7 @@ class IngestIndexManager:
                               self.nInputFiles,
                               percent)
 
-    def _doOnePixel(self, inputData, matchedPixels, pixelId, fluxes):
+    def _doOnePixel(self, inputData, matchedPixels, pixelId, fluxes, ids):
         """Process one HTM pixel, appending to an existing catalog or creating
         a new catalog, as needed.
 
@@ -152,43 +624,39 @@ class IngestIndexManager:
         fluxes : `dict` [`str`, `numpy.ndarray`]
             The values that will go into the flux and fluxErr fields in the
             output catalog.
+        ids : `numpy.ndarray`
+            The row-matched ids corresponding to ``inputData``.
         """
         idx = np.where(matchedPixels == pixelId)[0]
         catalog = self.getCatalog(pixelId, self.schema, len(idx))
-        for outputRow, inputRow in zip(catalog[-len(idx):], inputData[idx]):
-            self._fillRecord(outputRow, inputRow)
-
-        global COUNTER
-        with COUNTER.get_lock():
-            self._setIds(inputData[idx], catalog)
-
-        for name, array in fluxes.items():
-            catalog[self.key_map[name]][-len(idx):] = array[idx]
-
-        catalog.writeFits(self.filenames[pixelId])
-
-    def _setIds(self, inputData, catalog):
-        """Fill the `id` field of catalog with a running index, filling the
-        last values up to the length of ``inputData``.
+        self._fillNewRows(catalog, inputData[idx], {name: array[idx] for name, array in fluxes.items()},
+                          ids[idx])
+        datasetConfig = self.config.dataset_config
+        self._writeCatalog(catalog, self.filenames[pixelId], datasetConfig.shard_format,
+                           datasetConfig.parquet_row_group_size)
 
-        Fill with `self.config.id_name` if specified, otherwise use the
-        global running counter value.
+    def _fillNewRows(self, catalog, inputData, fluxes, ids):
+        """Fill the last ``len(inputData)`` rows of a catalog.
 
         Parameters
         ----------
-        inputData : `numpy.ndarray`
-            The input data that is being processed.
         catalog : `lsst.afw.table.SimpleCatalog`
-            The output catalog to fill the ids.
+            The output catalog, with space allocated for the new rows.
+        inputData : `numpy.ndarray`
+            The input data for the new rows.
+        fluxes : `dict` [`str`, `numpy.ndarray`]
+            The values that will go into the flux and fluxErr fields of the
+            new rows.
+        ids : `numpy.ndarray`
+            The ids of the new rows.
         """
-        global COUNTER
         size = len(inputData)
-        if self.config.id_name:
-            catalog['id'][-size:] = inputData[self.config.id_name]
-        else:
-            idEnd = COUNTER.value + size
-            catalog['id'][-size:] = np.arange(COUNTER.value, idEnd)
-            COUNTER.value = idEnd
+        # slicing a contiguous catalog gives a contiguous view of those rows
+        self._fillColumns(catalog[len(catalog) - size:], inputData)
+        catalog['id'][-size:] = ids
+
+        for name, array in fluxes.items():
+            catalog[self.key_map[name]][-size:] = array
 
     def getCatalog(self, pixelId, schema, nNewElements):
         """Get a catalog from disk or create it if it doesn't exist.
@@ -210,7 +678,10 @@ class IngestIndexManager:
         """
         # This is safe, because we lock on this file before getCatalog is called.
         if os.path.isfile(self.filenames[pixelId]):
-            catalog = afwTable.SimpleCatalog.readFits(self.filenames[pixelId])
+            if self.config.dataset_config.shard_format == "parquet":
+                catalog = readParquetShard(self.filenames[pixelId], schema)
+            else:
+                catalog = afwTable.SimpleCatalog.readFits(self.filenames[pixelId])
             catalog.resize(len(catalog) + nNewElements)
             return catalog.copy(deep=True)  # ensure contiguity, so that column-assignment works
         catalog = afwTable.SimpleCatalog(schema)
@@ -238,38 +709,61 @@ class IngestIndexManager:
         """
         return lsst.geom.SpherePoint(row[ra_name], row[dec_name], lsst.geom.degrees)
 
-    def _setCoordErr(self, record, row):
-        """Set coordinate error in a record of an indexed catalog.
+    def _setCoord(self, catalog, inputData):
+        """Set the coordinate columns of an indexed catalog.
+
+        Parameters
+        ----------
+        catalog : `lsst.afw.table.SimpleCatalog`
+            Contiguous rows of the indexed catalog to modify.
+        inputData : `numpy.ndarray`
+            Row-matched data from the catalog being ingested.
+
+        Raises
+        ------
+        ValueError
+            Raised if any declination is outside [-90, 90] degrees.
+        """
+        dec = np.radians(np.asarray(inputData[self.config.dec_name], dtype=np.float64))
+        if np.any(np.abs(dec) > 0.5*np.pi):
+            raise ValueError("Declination outside [-90, 90] degrees in column %s" % self.config.dec_name)
+        ra = np.radians(np.asarray(inputData[self.config.ra_name], dtype=np.float64))
+        # wrap RA into [0, 2pi), as `lsst.geom.SpherePoint` does
+        catalog[self.key_map["coord_ra"]] = np.remainder(ra, 2*np.pi)
+        catalog[self.key_map["coord_dec"]] = dec
+
+    def _setCoordErr(self, catalog, inputData):
+        """Set the coordinate error columns of an indexed catalog.
 
         The errors are read from the specified columns, and installed
         in the appropriate columns of the output.
 
         Parameters
         ----------
-        record : `lsst.afw.table.SimpleRecord`
-            Row from indexed catalog to modify.
-        row : `numpy.ndarray`
-            Row from catalog being ingested.
+        catalog : `lsst.afw.table.SimpleCatalog`
+            Contiguous rows of the indexed catalog to modify.
+        inputData : `numpy.ndarray`
+            Row-matched data from the catalog being ingested.
         """
         if self.config.ra_err_name:  # IngestIndexedReferenceConfig.validate ensures all or none
-            record.set(self.key_map["coord_raErr"], np.radians(row[self.config.ra_err_name]))
-            record.set(self.key_map["coord_decErr"], np.radians(row[self.config.dec_err_name]))
+            catalog[self.key_map["coord_raErr"]] = np.radians(inputData[self.config.ra_err_name])
+            catalog[self.key_map["coord_decErr"]] = np.radians(inputData[self.config.dec_err_name])
 
-    def _setFlags(self, record, row):
-        """Set flags in an output record.
+    def _setFlags(self, catalog, inputData):
+        """Set the flag columns of an indexed catalog.
 
         Parameters
         ----------
-        record : `lsst.afw.table.SimpleRecord`
-            Row from indexed catalog to modify.
-        row : `numpy.ndarray`
-            Row from catalog being ingested.
+        catalog : `lsst.afw.table.SimpleCatalog`
+            Contiguous rows of the indexed catalog to modify.
+        inputData : `numpy.ndarray`
+            Row-matched data from the catalog being ingested.
         """
-        names = record.schema.getNames()
         for flag in self._flags:
-            if flag in names:
+            if flag in self.key_map:
                 attr_name = 'is_{}_name'.format(flag)
-                record.set(self.key_map[flag], bool(row[getattr(self.config, attr_name)]))
+                catalog[self.key_map[flag]] = np.asarray(inputData[getattr(self.config, attr_name)],
+                                                         dtype=bool)
 
     def _getFluxes(self, inputData):
         """Compute the flux fields that will go into the output catalog.
@@ -298,8 +792,8 @@ class IngestIndexManager:
                 result[err_key+'_fluxErr'] = fluxErr
         return result
 
-    def _setProperMotion(self, record, row):
-        """Set proper motion fields in a record of an indexed catalog.
+    def _setProperMotion(self, catalog, inputData):
+        """Set the proper motion columns of an indexed catalog.
 
         The proper motions are read from the specified columns,
         scaled appropriately, and installed in the appropriate
@@ -307,63 +801,105 @@ class IngestIndexManager:
 
         Parameters
         ----------
-        record : `lsst.afw.table.SimpleRecord`
-            Row from indexed catalog to modify.
-        row : structured `numpy.array`
-            Row from catalog being ingested.
+        catalog : `lsst.afw.table.SimpleCatalog`
+            Contiguous rows of the indexed catalog to modify.
+        inputData : `numpy.ndarray`
+            Row-matched data from the catalog being ingested.
         """
         if self.config.pm_ra_name is None:  # IngestIndexedReferenceConfig.validate ensures all or none
             return
         radPerOriginal = np.radians(self.config.pm_scale)/(3600*1000)
-        record.set(self.key_map["pm_ra"], row[self.config.pm_ra_name]*radPerOriginal*lsst.geom.radians)
-        record.set(self.key_map["pm_dec"], row[self.config.pm_dec_name]*radPerOriginal*lsst.geom.radians)
-        record.set(self.key_map["epoch"], self._epochToMjdTai(row[self.config.epoch_name]))
+        catalog[self.key_map["pm_ra"]] = inputData[self.config.pm_ra_name]*radPerOriginal
+        catalog[self.key_map["pm_dec"]] = inputData[self.config.pm_dec_name]*radPerOriginal
+        catalog[self.key_map["epoch"]] = self._epochToMjdTai(inputData[self.config.epoch_name])
         if self.config.pm_ra_err_name is not None:  # pm_dec_err_name also, by validation
-            record.set(self.key_map["pm_raErr"], row[self.config.pm_ra_err_name]*radPerOriginal)
-            record.set(self.key_map["pm_decErr"], row[self.config.pm_dec_err_name]*radPerOriginal)
+            catalog[self.key_map["pm_raErr"]] = inputData[self.config.pm_ra_err_name]*radPerOriginal
+            catalog[self.key_map["pm_decErr"]] = inputData[self.config.pm_dec_err_name]*radPerOriginal
 
     def _epochToMjdTai(self, nativeEpoch):
-        """Convert an epoch in native format to TAI MJD (a float).
+        """Convert epochs in native format to TAI MJD (a float or an array
+        of floats), using a single `astropy.time.Time` conversion.
         """
         return astropy.time.Time(nativeEpoch, format=self.config.epoch_format,
                                  scale=self.config.epoch_scale).tai.mjd
 
-    def _setExtra(self, record, row):
-        """Set extra data fields in a record of an indexed catalog.
+    def _checkColumnTypes(self, inputData, filename):
+        """Check that the extra columns of a block of input data fit the
+        fields of the output schema, which were made from the types of the
+        first block read.
 
         Parameters
         ----------
-        record : `lsst.afw.table.SimpleRecord`
-            Row from indexed catalog to modify.
-        row : structured `numpy.array`
-            Row from catalog being ingested.
+        inputData : `numpy.ndarray`
+            A block of data from the catalog being ingested.
+        filename : `str`
+            The file the block was read from, for the error message.
+
+        Raises
+        ------
+        ValueError
+            Raised if a column cannot be stored in its field without losing
+            information, e.g. a float column in an integer field, or strings
+            longer than the field.
         """
         for extra_col in self.config.extra_col_names:
-            value = row[extra_col]
-            # If data read from a text file contains string like entires,
-            # numpy stores this as its own internal type, a numpy.str_
-            # object. This seems to be a consequence of how numpy stores
-            # string like objects in fixed column arrays. This checks
-            # if any of the values to be added to the catalog are numpy
-            # string types, and if they are, casts them to a python string
-            # which is what the python c++ records expect
-            if isinstance(value, np.str_):
-                value = str(value)
-            record.set(self.key_map[extra_col], value)
-
-    def _fillRecord(self, record, row):
-        """Fill a record in an indexed catalog to be persisted.
+            dtype = inputData.dtype[extra_col]
+            field = self.schema.find(self.key_map[extra_col]).field
+            typeString = field.getTypeString()
+            if typeString == "String":
+                size = field.getSize()
+                fits = dtype.kind in ('U', 'S')
+                # each character takes at most 4 bytes once utf-8 encoded, so
+                # only check the encoded length of columns that may be too long
+                if fits and dtype.itemsize // (4 if dtype.kind == 'U' else 1) > size:
+                    lengths = [len(v.encode() if isinstance(v, str) else v)
+                               for v in inputData[extra_col].tolist()]
+                    fits = max(lengths, default=0) <= size
+            elif typeString == "Flag":
+                fits = dtype.kind == 'b'
+            else:
+                fits = np.can_cast(dtype, _FIELD_DTYPES.get(typeString, dtype), casting="safe")
+            if not fits:
+                raise ValueError(f"Column {extra_col} of {filename} has type {dtype}, which does not fit "
+                                 f"its {typeString} field in the output schema; set the file reader's "
+                                 "column_dtypes config to give it a type wide enough for every row.")
+
+    def _setExtra(self, catalog, inputData):
+        """Set the extra data columns of an indexed catalog.
 
         Parameters
         ----------
-        record : `lsst.afw.table.SimpleRecord`
-            Row from indexed catalog to modify.
-        row : structured `numpy.array`
-            Row from catalog being ingested.
+        catalog : `lsst.afw.table.SimpleCatalog`
+            Contiguous rows of the indexed catalog to modify.
+        inputData : `numpy.ndarray`
+            Row-matched data from the catalog being ingested.
         """
-        record.setCoord(self.computeCoord(row, self.config.ra_name, self.config.dec_name))
+        for extra_col in self.config.extra_col_names:
+            values = inputData[extra_col]
+            key = self.key_map[extra_col]
+            if values.dtype.kind in ('U', 'S'):
+                # afw.table does not provide column access to string fields,
+                # so these have to be set one record at a time. `tolist`
+                # converts numpy.str_ values to the python strings that
+                # the C++ records expect.
+                for record, value in zip(catalog, values.tolist()):
+                    record.set(key, value)
+            else:
+                catalog[key] = values
+
+    def _fillColumns(self, catalog, inputData):
+        """Fill all columns of an indexed catalog to be persisted, except for
+        the ids and fluxes.
 
-        self._setCoordErr(record, row)
-        self._setFlags(record, row)
-        self._setProperMotion(record, row)
-        self._setExtra(record, row)
+        Parameters
+        ----------
+        catalog : `lsst.afw.table.SimpleCatalog`
+            Contiguous rows of the indexed catalog to modify.
+        inputData : `numpy.ndarray`
+            Row-matched data from the catalog being ingested.
+        """
+        self._setCoord(catalog, inputData)
+        self._setCoordErr(catalog, inputData)
+        self._setFlags(catalog, inputData)
+        self._setProperMotion(catalog, inputData)
+        self._setExtra(catalog, inputData)
@@ -23,18 +23,25 @@
 
 __all__ = ["IngestIndexedReferenceConfig", "IngestIndexedReferenceTask", "DatasetConfig"]
 
+import copy
+import functools
+import multiprocessing
 import os.path
 
+import numpy as np
+
 import lsst.pex.config as pexConfig
 import lsst.pipe.base as pipeBase
 import lsst.geom
 import lsst.sphgeom
 import lsst.afw.table as afwTable
 from lsst.daf.base import PropertyList
+from .htmIndexer import AdaptiveHtmIndexer
 from .indexerRegistry import IndexerRegistry
 from .readTextCatalogTask import ReadTextCatalogTask
 from .loadReferenceObjects import LoadReferenceObjectsTask
-from .ingestIndexManager import IngestIndexManager
+from .ingestIndexManager import IngestIndexManager, _readBlocks
+from .parquetShard import PARQUET_EXTENSION
 
 # The most recent Indexed Reference Catalog on-disk format version.
 LATEST_FORMAT_VERSION = 1
@@ -56,6 +63,39 @@ def addRefCatMetadata(catalog):
     catalog.setMetadata(md)
 
 
+def _countPixelsInFile(filename, fileReader, indexer, raName, decName):
+    """Count the objects of an input file in each trixel at the maximum depth
+    of an adaptive HTM indexer.
+
+    Parameters
+    ----------
+    filename : `str`
+        The file to read.
+    fileReader : `lsst.pipe.base.Task`
+        The file reader to use to load the file.
+    indexer : `lsst.meas.algorithms.htmIndexer.AdaptiveHtmIndexer`
+        The indexer.
+    raName, decName : `str`
+        Names of the RA and Dec columns.
+
+    Returns
+    -------
+    pixelIds : `numpy.ndarray` of `int`
+        HTM IDs at the maximum depth of ``indexer``; an ID may appear once
+        per block of rows read.
+    counts : `numpy.ndarray` of `int`
+        Number of objects in each of ``pixelIds``.
+    """
+    pixelIds = [np.array([], dtype=np.int64)]
+    counts = [np.array([], dtype=np.int64)]
+    for inputData in _readBlocks(fileReader, filename):
+        blockPixelIds = indexer.indexPointsAtMaxDepth(inputData[raName], inputData[decName])
+        blockPixelIds, blockCounts = np.unique(blockPixelIds, return_counts=True)
+        pixelIds.append(blockPixelIds)
+        counts.append(blockCounts)
+    return np.concatenate(pixelIds), np.concatenate(counts)
+
+
 class IngestReferenceRunner(pipeBase.TaskRunner):
     """Task runner for the reference catalog ingester
 
@@ -107,6 +147,34 @@ class DatasetConfig(pexConfig.Config):
         default='HTM',
         doc='Name of indexer algoritm to use.  Default is HTM',
     )
+    sub_index_depth = pexConfig.Field(
+        dtype=int,
+        doc="If not None, the rows of each shard are sorted by the ID of the HTM trixel at this depth "
+            "that contains them, and the row range of each such trixel is written to a sidecar file, "
+            "so that loaders can read only the rows near their search region. Should be deeper "
+            "than the shards. Requires two_phase.",
+        optional=True,
+        default=None,
+    )
+    shard_format = pexConfig.ChoiceField(
+        dtype=str,
+        doc="File format of the shards. The master schema is always written as FITS.",
+        allowed={
+            "fits": "afw.table FITS binary tables",
+            "parquet": "Parquet files with one column per schema field, for column pruning and "
+                       "memory-mapped reads; requires pyarrow",
+        },
+        default="fits",
+    )
+    parquet_row_group_size = pexConfig.RangeField(
+        dtype=int,
+        doc="Maximum number of rows in each row group of Parquet shards. Loaders reading only the rows "
+            "near their search region (see sub_index_depth) read only the row groups holding those rows, "
+            "so this should be comparable to the number of rows in a sub-index trixel; smaller groups "
+            "compress less well.",
+        default=10000,
+        min=1,
+    )
 
 
 class IngestIndexedReferenceConfig(pexConfig.Config):
@@ -119,6 +187,23 @@ class IngestIndexedReferenceConfig(pexConfig.Config):
         doc=("Number of python processes to use when ingesting."),
         default=1
     )
+    two_phase = pexConfig.Field(
+        dtype=bool,
+        doc=("Ingest in two phases: first scatter the rows of each input file into per-pixel spill "
+             "files, then gather the spill files of each pixel and write its output file exactly once. "
+             "This avoids re-reading and re-writing an output file for every input file touching it. "
+             "Completed work is recorded in the spill directory, so an interrupted two-phase ingest "
+             "resumes where it stopped when rerun with the same input files. A single-phase ingest "
+             "cannot be resumed, and refuses to run if any output shard already exists."),
+        default=False
+    )
+    spill_dir = pexConfig.Field(
+        dtype=str,
+        doc=("Directory for the per-pixel spill files of a two-phase ingest; if None, use an "
+             "'ingest_spill' directory next to the output files. Removed when the ingest completes, "
+             "and kept after an interrupted ingest so that it can be resumed."),
+        optional=True,
+    )
     file_reader = pexConfig.ConfigurableField(
         target=ReadTextCatalogTask,
         doc='Task to use to read the files.  Default is to expect text files.'
@@ -267,6 +352,9 @@ class IngestIndexedReferenceConfig(pexConfig.Config):
         if (self.pm_ra_name or self.parallax_name) and not self.epoch_name:
             raise ValueError(
                 '"epoch_name" must be specified if "pm_ra/dec_name" or "parallax_name" are specified')
+        if self.dataset_config.sub_index_depth is not None and not self.two_phase:
+            # single-phase ingest appends to the shards, which would unsort them
+            raise ValueError('"dataset_config.sub_index_depth" requires "two_phase"')
 
 
 class IngestIndexedReferenceTask(pipeBase.CmdLineTask):
@@ -324,6 +412,9 @@ class IngestIndexedReferenceTask(pipeBase.CmdLineTask):
             A list of file paths to read.
         """
         schema, key_map = self._saveMasterSchema(inputFiles[0])
+        datasetConfig = self.config.dataset_config
+        if isinstance(self.indexer, AdaptiveHtmIndexer) and self.indexer.splitShardIds.size == 0:
+            datasetConfig = self._makeShardTree(inputFiles)
         # create an HTM we can interrogate about pixel ids
         htm = lsst.sphgeom.HtmPixelization(self.indexer.htm.get_depth())
         filenames = self._getButlerFilenames(htm)
@@ -340,7 +431,39 @@ class IngestIndexedReferenceTask(pipeBase.CmdLineTask):
 
         # write the config that was used to generate the refcat
         dataId = self.indexer.makeDataId(None, self.config.dataset_config.ref_dataset_name)
-        self.butler.put(self.config.dataset_config, 'ref_cat_config', dataId=dataId)
+        self.butler.put(datasetConfig, 'ref_cat_config', dataId=dataId)
+
+    def _makeShardTree(self, inputFiles):
+        """Split the dense trixels of an adaptive HTM indexer.
+
+        The input files are read once to count the objects per trixel at the
+        indexer's maximum depth.
+
+        Parameters
+        ----------
+        inputFiles : `list`
+            A list of file paths to read.
+
+        Returns
+        -------
+        datasetConfig : `DatasetConfig`
+            Copy of the dataset config recording the shard tree, to be
+            persisted with the catalog.
+        """
+        countOneFile = functools.partial(_countPixelsInFile, fileReader=self.file_reader,
+                                         indexer=self.indexer, raName=self.config.ra_name,
+                                         decName=self.config.dec_name)
+        with multiprocessing.Pool(self.config.n_processes) as pool:
+            results = pool.map(countOneFile, inputFiles)
+        pixelIds = np.concatenate([pixelIds for pixelIds, _ in results])
+        counts = np.concatenate([counts for _, counts in results])
+        splitShardIds = self.indexer.makeShardTree(pixelIds, counts)
+        self.log.info("Split %d dense trixels into deeper shards", len(splitShardIds))
+
+        # the task config may be frozen
+        datasetConfig = copy.deepcopy(self.config.dataset_config)
+        datasetConfig.indexer.active.split_shard_ids = splitShardIds.tolist()
+        return datasetConfig
 
     def _saveMasterSchema(self, filename):
         """Generate and save the master catalog schema.
@@ -350,7 +473,8 @@ class IngestIndexedReferenceTask(pipeBase.CmdLineTask):
         filename : `str`
             An input file to read to get the input dtype.
         """
-        arr = self.file_reader.run(filename)
+        # only the first block is needed to get the dtype
+        arr = next(iter(_readBlocks(self.file_reader, filename)))
         schema, key_map = self.makeSchema(arr.dtype)
         dataId = self.indexer.makeDataId('master_schema',
                                          self.config.dataset_config.ref_dataset_name)
@@ -367,8 +491,15 @@ class IngestIndexedReferenceTask(pipeBase.CmdLineTask):
         # path manipulation because butler.get() per pixel will take forever
         dataId = self.indexer.makeDataId(start, self.config.dataset_config.ref_dataset_name)
         path = self.butler.get('ref_cat_filename', dataId=dataId)[0]
-        base = os.path.join(os.path.dirname(path), "%d"+os.path.splitext(path)[1])
-        for pixelId in range(start, end):
+        extension = os.path.splitext(path)[1]
+        if self.config.dataset_config.shard_format == "parquet":
+            extension = PARQUET_EXTENSION
+        base = os.path.join(os.path.dirname(path), "%d"+extension)
+        if isinstance(self.indexer, AdaptiveHtmIndexer):
+            pixelIds = self.indexer.getLeafShardIds()
+        else:
+            pixelIds = range(start, end)
+        for pixelId in pixelIds:
             filenames[pixelId] = base % pixelId
 
         return filenames
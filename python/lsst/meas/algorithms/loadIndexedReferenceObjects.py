@@ -23,13 +23,25 @@
 
 __all__ = ["LoadIndexedReferenceObjectsConfig", "LoadIndexedReferenceObjectsTask"]
 
-from .loadReferenceObjects import hasNanojanskyFluxUnits, convertToNanojansky, getFormatVersionFromRefCat
+import concurrent.futures
+import hashlib
+import os.path
+
+import numpy
+
+from .loadReferenceObjects import hasNanojanskyFluxUnits, getFormatVersionFromRefCat, _FluxConverter
+from .loadReferenceObjects import _getCircleMask, _getUnitVectors, _makeProjectionMapper, _projectCatalog
 from lsst.meas.algorithms import getRefFluxField, LoadReferenceObjectsTask, LoadReferenceObjectsConfig
 import lsst.afw.table as afwTable
 import lsst.geom
 import lsst.pex.config as pexConfig
 import lsst.pipe.base as pipeBase
+import lsst.sphgeom
 from .indexerRegistry import IndexerRegistry
+from .parquetShard import PARQUET_EXTENSION, readParquetShard
+from .shardCache import getSharedShardCache
+from .shardMmapCache import ShardMmapCache, arrayToCatalog
+from .shardSubIndex import readSubIndex, selectRowRanges, readFitsRows
 
 
 class LoadIndexedReferenceObjectsConfig(LoadReferenceObjectsConfig):
@@ -38,6 +50,24 @@ class LoadIndexedReferenceObjectsConfig(LoadReferenceObjectsConfig):
         default='cal_ref_cat',
         doc='Name of the ingested reference dataset'
     )
+    numShardLoadThreads = pexConfig.RangeField(
+        dtype=int,
+        default=1,
+        min=1,
+        doc="Number of threads used to read shards concurrently; with 1, shards are read serially, "
+            "except for those requested in advance with prefetchSkyCircle or prefetchPixelBox, "
+            "which are read in a background thread."
+    )
+    shardCacheDir = pexConfig.Field(
+        dtype=str,
+        default=None,
+        optional=True,
+        doc="If not None, directory of a cache of decoded shards shared by all the processes of a node, "
+            "e.g. on a node-local disk or tmpfs. Each shard is decoded once per node and memory-mapped "
+            "read-only by every process, so that the decoded shards are held once in the page cache "
+            "rather than once per process. Takes precedence over shardCacheMaxBytes. Must be cleared "
+            "if the reference catalog is re-ingested."
+    )
 
 
 class LoadIndexedReferenceObjectsTask(LoadReferenceObjectsTask):
@@ -60,46 +90,174 @@ class LoadIndexedReferenceObjectsTask(LoadReferenceObjectsTask):
         # change the path where the shards are found.
         self.ref_dataset_name = self.config.ref_dataset_name
         self.butler = butler
+        # thread pool for concurrent and prefetched shard reads; created on first use
+        self._executor = None
+        # futures of prefetched shards, keyed by shard ID, envelope and
+        # columns read
+        self._prefetched = {}
+        # empty catalog with the schema of the loaded shards, its schema on
+        # disk, and the converter of old-style fluxes to nJy; read and
+        # checked on first use
+        self._masterCat = None
+        self._masterSchema = None
+        self._fluxConverter = None
+        # identity of the catalog in the shard caches; found on first use
+        self._catalogId = None
+        # node-wide cache of decoded shards
+        self._mmapCache = None
+        if self.config.shardCacheDir is not None:
+            self._mmapCache = ShardMmapCache(self.config.shardCacheDir)
 
     @pipeBase.timeMethod
-    def loadSkyCircle(self, ctrCoord, radius, filterName=None, epoch=None, centroids=False):
-        shardIdList, isOnBoundaryList = self.indexer.getShardIds(ctrCoord, radius)
-        shards = self.getShards(shardIdList)
-        refCat = self.butler.get('ref_cat',
-                                 dataId=self.indexer.makeDataId('master_schema', self.ref_dataset_name),
-                                 immediate=True)
-
-        # load the catalog, one shard at a time
-        for shard, isOnBoundary in zip(shards, isOnBoundaryList):
+    def loadSkyCircle(self, ctrCoord, radius, filterName=None, epoch=None, centroids=False,
+                      columns=None, filterNameList=None):
+        return self.loadSkyCircles([(ctrCoord, radius)], filterName, epoch=epoch, centroids=centroids,
+                                   columns=columns, filterNameList=filterNameList)[0]
+
+    @pipeBase.timeMethod
+    def loadSkyCircles(self, circles, filterName=None, epoch=None, centroids=False, columns=None,
+                       filterNameList=None):
+        """Load reference objects that overlap each of several circular sky
+        regions.
+
+        Each shard touching any of the circles is read once, and the
+        positions of its objects are converted once for all the circles on
+        whose boundary it lies.
+
+        Parameters
+        ----------
+        circles : iterable of `tuple` [`lsst.geom.SpherePoint`, `lsst.geom.Angle`]
+            ICRS center and radius of each search region.
+        filterName, epoch, centroids, columns, filterNameList
+            As for `loadSkyCircle`.
+
+        Returns
+        -------
+        results : `list` of `lsst.pipe.base.Struct`
+            For each circle, in order, a Struct as returned by
+            `loadSkyCircle`.
+        """
+        circles = list(circles)
+        shardUsers, envelopes, masterCat, mapper, readColumns = self._planShardReads(
+            circles, filterName, columns, filterNameList)
+        shardIdList = list(shardUsers)
+        refCats = [masterCat.copy(deep=True) for _ in circles]
+        squaredChordLengths = [(2*numpy.sin(min(radius.asRadians(), numpy.pi)/2))**2
+                               for _, radius in circles]
+
+        # load the catalogs, one shard at a time, as the shards are read
+        shards = self._iterShards(shardIdList, envelopes, readColumns)
+        for shardId, shard in zip(shardIdList, shards):
             if shard is None:
                 continue
-            if isOnBoundary:
-                refCat.extend(self._trimToCircle(shard, ctrCoord, radius))
-            else:
-                refCat.extend(shard)
+            users = shardUsers[shardId]
+            vectors = None
+            if len(shard) > 0 and any(isOnBoundary for _, isOnBoundary in users):
+                if not shard.isContiguous():
+                    shard = shard.copy(deep=True)
+                vectors = _getUnitVectors(shard)
+            for i, isOnBoundary in users:
+                subset = shard
+                if vectors is not None and isOnBoundary:
+                    mask = _getCircleMask(shard, circles[i][0].getVector(), squaredChordLengths[i], vectors)
+                    subset = shard[mask]
+                refCats[i].extend(subset, mapper=mapper)
 
+        self._recordShardCacheStats()
+        # records extended without a mapper are those of the shards, which
+        # are shared with the process-wide shard cache and with the catalogs
+        # of overlapping circles
+        isShared = mapper is None and (len(circles) > 1 or self.config.shardCacheMaxBytes > 0)
+        return [self._finishLoad(refCat, filterName, epoch, centroids, isShared) for refCat in refCats]
+
+    def _planShardReads(self, circles, filterName=None, columns=None, filterNameList=None):
+        """Find the shards, and the parts of them, to read to load several
+        circular sky regions.
+
+        Parameters
+        ----------
+        circles : `list` of `tuple` [`lsst.geom.SpherePoint`, `lsst.geom.Angle`]
+            ICRS center and radius of each search region.
+        filterName, columns, filterNameList
+            As for `loadSkyCircle`.
+
+        Returns
+        -------
+        shardUsers : `dict` [`int`, `list` [`tuple` [`int`, `bool`]]]
+            The index of each circle touching each shard, and whether the
+            shard is on its boundary, keyed by shard ID in order of first
+            use.
+        envelopes : `list` of `numpy.ndarray` or `None`
+            For each shard, the sub-index envelope of the part of it to
+            read, or `None` to read all of it; see `_iterShards`.
+        masterCat : `lsst.afw.table.SimpleCatalog`
+            Empty catalog with the schema of the loaded catalogs.
+        mapper : `lsst.afw.table.SchemaMapper` or `None`
+            Mapper from the schema of the shards to that of ``masterCat``,
+            or `None` if all columns are kept.
+        readColumns : `frozenset` of `str` or `None`
+            Names of the only columns to read; see `_iterShards`.
+        """
+        shardUsers = {}
+        for i, (ctrCoord, radius) in enumerate(circles):
+            shardIdList, isOnBoundaryList = self.indexer.getShardIds(ctrCoord, radius)
+            for shardId, isOnBoundary in zip(shardIdList, isOnBoundaryList):
+                shardUsers.setdefault(shardId, []).append((i, isOnBoundary))
+        # only the rows of boundary shards near the circle need to be read,
+        # if the shards are sorted and sub-indexed; shards touching several
+        # circles are read whole
+        circleEnvelopes = [self._getSubIndexEnvelope(ctrCoord, radius) for ctrCoord, radius in circles]
+        envelopes = []
+        for users in shardUsers.values():
+            isPartial = len(users) == 1 and users[0][1]
+            envelopes.append(circleEnvelopes[users[0][0]] if isPartial else None)
+
+        masterCat = self._getMasterCatalog()
+        # only keep the columns the caller needs
+        mapper = _makeProjectionMapper(masterCat.schema, self.config, filterName, columns, filterNameList)
+        readColumns = None
+        if mapper is not None:
+            masterCat = _projectCatalog(masterCat, mapper)
+            # columnar shards need only have the kept columns read; the
+            # columns of old-style shards are renamed when converted
+            isColumnar = self.dataset_config.shard_format == "parquet" and self._fluxConverter is None
+            if isColumnar or self.config.shardCacheDir is not None:
+                readColumns = frozenset(masterCat.schema.getNames())
+        return shardUsers, envelopes, masterCat, mapper, readColumns
+
+    def _finishLoad(self, refCat, filterName, epoch, centroids, isShared=False):
+        """Correct a loaded reference catalog for proper motion, and add
+        centroid fields and flux aliases.
+
+        Parameters
+        ----------
+        refCat : `lsst.afw.table.SimpleCatalog`
+            The reference objects within one search region.
+        filterName, epoch, centroids
+            As for `loadSkyCircle`.
+        isShared : `bool`, optional
+            Whether the records of ``refCat`` may be shared with the shard
+            cache or with the catalogs of other search regions, in which case
+            the returned catalog holds copies of them.
+
+        Returns
+        -------
+        result : `lsst.pipe.base.Struct`
+            As returned by `loadSkyCircle`.
+        """
         # apply proper motion corrections
         if epoch is not None and "pm_ra" in refCat.schema:
             # check for a catalog in a non-standard format
             if isinstance(refCat.schema["pm_ra"].asKey(), lsst.afw.table.KeyAngle):
+                # proper motions are applied in place, to a contiguous catalog
+                # that must not share records with the shard cache
+                if not refCat.isContiguous() or isShared:
+                    refCat = refCat.copy(deep=True)
+                    isShared = False
                 self.applyProperMotions(refCat, epoch)
             else:
                 self.log.warn("Catalog pm_ra field is not an Angle; not applying proper motion")
 
-        # update version=0 style refcats to have nJy fluxes
-        if self.dataset_config.format_version == 0 or not hasNanojanskyFluxUnits(refCat.schema):
-            self.log.warn("Found version 0 reference catalog with old style units in schema.")
-            self.log.warn("run `meas_algorithms/bin/convert_refcat_to_nJy.py` to convert fluxes to nJy.")
-            self.log.warn("See RFC-575 for more details.")
-            refCat = convertToNanojansky(refCat, self.log)
-        else:
-            # For version >= 1, the version should be in the catalog header,
-            # too, and should be consistent with the version in the config.
-            catVersion = getFormatVersionFromRefCat(refCat)
-            if catVersion != self.dataset_config.format_version:
-                raise RuntimeError(f"Format version in reference catalog ({catVersion}) does not match"
-                                   f" format_version field in config ({self.dataset_config.format_version})")
-
         self._addFluxAliases(refCat.schema)
         fluxField = getRefFluxField(schema=refCat.schema, filterName=filterName)
 
@@ -116,9 +274,11 @@ class LoadIndexedReferenceObjectsTask(LoadReferenceObjectsTask):
             expandedCat = afwTable.SimpleCatalog(mapper.getOutputSchema())
             expandedCat.extend(refCat, mapper=mapper)
             refCat = expandedCat
+            isShared = False
 
-        # make sure catalog is contiguous
-        if not refCat.isContiguous():
+        # make sure catalog is contiguous, and that the caller cannot modify
+        # the shard cache through it
+        if not refCat.isContiguous() or isShared:
             refCat = refCat.copy(True)
 
         # return reference catalog
@@ -138,24 +298,124 @@ class LoadIndexedReferenceObjectsTask(LoadReferenceObjectsTask):
         Returns
         -------
         catalogs : `list` of `lsst.afw.table.SimpleCatalog`
-            A list of reference catalogs, one for each entry in shardIdList.
+            A list of reference catalogs, one for each entry in shardIdList
+            that exists.
         """
         shards = []
-        for shardId in shardIdList:
-            if self.butler.datasetExists('ref_cat',
-                                         dataId=self.indexer.makeDataId(shardId, self.ref_dataset_name)):
-                shards.append(self.butler.get('ref_cat',
-                                              dataId=self.indexer.makeDataId(shardId, self.ref_dataset_name),
-                                              immediate=True))
+        for shard in self._iterShards(shardIdList):
+            if shard is not None:
+                # the caller may modify the records, which must not be
+                # those of the shard cache
+                shards.append(shard.copy(deep=True) if self.config.shardCacheMaxBytes > 0 else shard)
         return shards
 
-    def _trimToCircle(self, refCat, ctrCoord, radius):
-        """Trim a reference catalog to a circular aperture.
+    def prefetchSkyCircle(self, ctrCoord, radius, filterName=None, columns=None, filterNameList=None):
+        """Start reading, in the background, the shards that a later call to
+        `loadSkyCircle` with the same region will need.
+
+        This allows e.g. the shards for the next detector to be read while
+        the current one is being processed. Only the shards of the most
+        recent prefetch are kept, and only a load that reads the same parts
+        and columns of them uses them.
+
+        Parameters
+        ----------
+        ctrCoord : `lsst.geom.SpherePoint`
+            ICRS center of search region.
+        radius : `lsst.geom.Angle`
+            Radius of search region.
+        filterName, columns, filterNameList
+            As for `loadSkyCircle`; they must be those of the later load, so
+            that the same columns are read.
+        """
+        shardUsers, envelopes, _, _, readColumns = self._planShardReads([(ctrCoord, radius)], filterName,
+                                                                        columns, filterNameList)
+        executor = self._getExecutor()
+        prefetched = {}
+        for shardId, envelope in zip(shardUsers, envelopes):
+            key = self._getPrefetchKey(shardId, envelope, readColumns)
+            prefetched[key] = (self._prefetched.get(key) or
+                               executor.submit(self._readShard, shardId, envelope, readColumns))
+        self._prefetched = prefetched
+
+    def prefetchPixelBox(self, bbox, wcs, filterName=None, columns=None, filterNameList=None):
+        """Start reading, in the background, the shards that a later call to
+        `loadPixelBox` with the same region will need.
+
+        Parameters
+        ----------
+        bbox : `lsst.geom.Box2I` or `lsst.geom.Box2D`
+            Bounding box for pixels.
+        wcs : `lsst.afw.geom.SkyWcs`
+            WCS; used to convert pixel positions to sky coordinates.
+        filterName, columns, filterNameList
+            As for `loadPixelBox`.
+        """
+        circle = self._calculateCircle(bbox, wcs)
+        self.prefetchSkyCircle(circle.coord, circle.radius, filterName, columns, filterNameList)
+
+    @staticmethod
+    def _getPrefetchKey(shardId, envelope, columns):
+        """Return the key of a prefetched shard read.
+
+        Parameters
+        ----------
+        shardId : `int`
+            ID of the shard.
+        envelope : `numpy.ndarray` or `None`
+            Sub-index envelope of the part of the shard read.
+        columns : `frozenset` of `str` or `None`
+            Names of the only columns read.
+
+        Returns
+        -------
+        key : `tuple`
+            Key identifying the read.
+        """
+        return (shardId, None if envelope is None else envelope.tobytes(), columns)
+
+    def _iterShards(self, shardIdList, envelopes=None, columns=None):
+        """Iterate over shards by ID, reading them concurrently if configured
+        to, or if they were prefetched.
+
+        Parameters
+        ----------
+        shardIdList : `list` of `int`
+            A list of integer shard ids.
+        envelopes : `list` of `numpy.ndarray` or `None`, optional
+            For each entry in shardIdList, the sub-index envelope of the
+            search region (see `_getSubIndexEnvelope`) to read only part of
+            the shard, or `None` to read all of it.
+        columns : `frozenset` of `str`, optional
+            Names of the only columns to read from Parquet shards or from the
+            node-wide shard cache; the other columns are left at their
+            default values. Ignored for FITS shards read without that cache.
+            By default all columns are read.
+
+        Yields
+        ------
+        catalog : `lsst.afw.table.SimpleCatalog` or `None`
+            The reference catalog for each entry in shardIdList, in order;
+            `None` if that shard does not exist.
+        """
+        if envelopes is None:
+            envelopes = [None]*len(shardIdList)
+        if self.config.numShardLoadThreads == 1 and not self._prefetched:
+            for shardId, envelope in zip(shardIdList, envelopes):
+                yield self._readShard(shardId, envelope, columns)
+            return
+        executor = self._getExecutor()
+        futures = [self._prefetched.pop(self._getPrefetchKey(shardId, envelope, columns), None) or
+                   executor.submit(self._readShard, shardId, envelope, columns)
+                   for shardId, envelope in zip(shardIdList, envelopes)]
+        for future in futures:
+            yield future.result()
+
+    def _getSubIndexEnvelope(self, ctrCoord, radius):
+        """Return the sub-trixels that touch a circular aperture.
 
         Parameters
         ----------
-        refCat : `lsst.afw.table.SimpleCatalog`
-            Reference catalog to be trimmed.
         ctrCoord : `lsst.geom.SpherePoint`
             ICRS center of search region.
         radius : `lsst.geom.Angle`
@@ -163,11 +423,260 @@ class LoadIndexedReferenceObjectsTask(LoadReferenceObjectsTask):
 
         Returns
         -------
-        catalog : `lsst.afw.table.SimpleCatalog`
-            Catalog containing objects that fall in the circular aperture.
-        """
-        tempCat = type(refCat)(refCat.schema)
-        for record in refCat:
-            if record.getCoord().separation(ctrCoord) < radius:
-                tempCat.append(record)
-        return tempCat
+        envelope : `numpy.ndarray` of `int` or `None`
+            Array of shape (N, 2) of sorted [begin, end) ranges of the IDs of
+            the trixels at the sub-index depth that touch the aperture, or
+            `None` if the shards are not sub-indexed.
+        """
+        depth = self.dataset_config.sub_index_depth
+        if depth is None:
+            return None
+        circle = lsst.sphgeom.Circle(ctrCoord.getVector(), lsst.sphgeom.Angle(radius.asRadians()))
+        ranges = [(begin, end) for begin, end in lsst.sphgeom.HtmPixelization(depth).envelope(circle)]
+        return numpy.array(ranges, dtype=numpy.int64).reshape(-1, 2)
+
+    def _readShard(self, shardId, envelope=None, columns=None):
+        """Read one shard, from the process-wide shard cache if it is
+        enabled.
+
+        Parameters
+        ----------
+        shardId : `int`
+            ID of the shard to read.
+        envelope : `numpy.ndarray` or `None`, optional
+            Sub-index envelope of the search region, as returned by
+            `_getSubIndexEnvelope`; if not `None` and the shard has a
+            sub-index, only the rows of the sub-trixels in the envelope are
+            read, bypassing the cache.
+        columns : `frozenset` of `str`, optional
+            Names of the only columns to read from a Parquet shard; see
+            `_iterShards`.
+
+        Returns
+        -------
+        catalog : `lsst.afw.table.SimpleCatalog` or `None`
+            The shard, or `None` if it does not exist. Its records must not
+            be modified.
+        """
+        if self.config.shardCacheDir is not None:
+            return self._readShardFromMmapCache(shardId, envelope, columns)
+        if envelope is not None:
+            path = self._getShardPath(shardId)
+            if path is None:
+                return None
+            subIndex = readSubIndex(path)
+            if subIndex is not None and len(subIndex) > 0:
+                rowRanges = selectRowRanges(subIndex, envelope)
+                nRows = sum(end - start for start, end in rowRanges)
+                # read the whole shard, through the cache, if all its rows are needed
+                if nRows < subIndex[-1, 2]:
+                    if self.dataset_config.shard_format == "parquet":
+                        return self._convertShard(readParquetShard(path, self._getMasterSchema(), columns,
+                                                                   rowRanges))
+                    catalog = readFitsRows(path, rowRanges)
+                    if catalog is not None:
+                        return self._convertShard(catalog)
+        if self.config.shardCacheMaxBytes > 0:
+            cache = getSharedShardCache(self.config.shardCacheMaxBytes)
+            key = self._getCacheKey(shardId)
+            if columns is not None:
+                key += (columns,)
+            # the cache holds converted shards, so that old-style shards are
+            # converted once per process
+            return cache.get(key, lambda: self._convertShard(self._readShardFromButler(shardId, columns)))
+        return self._convertShard(self._readShardFromButler(shardId, columns))
+
+    def _readShardFromButler(self, shardId, columns=None):
+        """Read one whole shard, with the butler for FITS shards.
+
+        Parameters
+        ----------
+        shardId : `int`
+            ID of the shard to read.
+        columns : `frozenset` of `str`, optional
+            Names of the only columns to read from a Parquet shard; see
+            `_iterShards`.
+
+        Returns
+        -------
+        catalog : `lsst.afw.table.SimpleCatalog` or `None`
+            The shard, or `None` if it does not exist.
+        """
+        if self.dataset_config.shard_format == "parquet":
+            path = self._getShardPath(shardId)
+            if path is None:
+                return None
+            return readParquetShard(path, self._getMasterSchema(), columns)
+        dataId = self.indexer.makeDataId(shardId, self.ref_dataset_name)
+        if not self.butler.datasetExists('ref_cat', dataId=dataId):
+            return None
+        return self.butler.get('ref_cat', dataId=dataId, immediate=True)
+
+    def _readShardFromMmapCache(self, shardId, envelope=None, columns=None):
+        """Read one shard from the node-wide cache of decoded shards,
+        decoding and caching it if needed.
+
+        Parameters
+        ----------
+        shardId : `int`
+            ID of the shard to read.
+        envelope : `numpy.ndarray` or `None`, optional
+            Sub-index envelope of the search region; if not `None` and the
+            shard has a sub-index, only the rows of the sub-trixels in the
+            envelope are copied.
+        columns : `frozenset` of `str`, optional
+            Names of the only columns to copy; see `_iterShards`.
+
+        Returns
+        -------
+        catalog : `lsst.afw.table.SimpleCatalog` or `None`
+            The shard, or `None` if it does not exist.
+        """
+        array = self._mmapCache.get(self._getCacheKey(shardId),
+                                    lambda: self._convertShard(self._readShardFromButler(shardId)))
+        if array is None:
+            return None
+        rows = None
+        if envelope is not None:
+            subIndex = readSubIndex(self._getShardPath(shardId))
+            if subIndex is not None and len(subIndex) > 0:
+                rowRanges = selectRowRanges(subIndex, envelope)
+                rows = numpy.concatenate([numpy.arange(start, end, dtype=numpy.int64)
+                                          for start, end in rowRanges] or
+                                         [numpy.array([], dtype=numpy.int64)])
+        return arrayToCatalog(array, self._getMasterCatalog().schema, columns, rows)
+
+    def _getCacheKey(self, shardId):
+        """Return the key of a shard in the shard caches.
+
+        The key identifies the catalog by the directory holding its files,
+        as well as by its dataset name and format version, so that loaders of
+        different catalogs with the same name do not share cached shards.
+
+        Parameters
+        ----------
+        shardId : `int`
+            ID of the shard.
+
+        Returns
+        -------
+        key : `tuple`
+            Key of the shard; its parts are safe to use in file names.
+        """
+        if self._catalogId is None:
+            dataId = self.indexer.makeDataId('master_schema', self.ref_dataset_name)
+            path = self.butler.get('ref_cat_filename', dataId=dataId)[0]
+            directory = os.path.dirname(os.path.realpath(path))
+            self._catalogId = hashlib.sha1(directory.encode()).hexdigest()[:16]
+        return (self.ref_dataset_name, self._catalogId, self.dataset_config.format_version, shardId)
+
+    def _getShardPath(self, shardId):
+        """Return the path of a shard file.
+
+        Parameters
+        ----------
+        shardId : `int`
+            ID of the shard.
+
+        Returns
+        -------
+        path : `str` or `None`
+            Path of the shard file, or `None` if the shard does not exist.
+        """
+        dataId = self.indexer.makeDataId(shardId, self.ref_dataset_name)
+        if self.dataset_config.shard_format == "parquet":
+            # the butler only knows the FITS name of the shards
+            path = self.butler.get('ref_cat_filename', dataId=dataId)[0]
+            path = os.path.splitext(path)[0] + PARQUET_EXTENSION
+            return path if os.path.exists(path) else None
+        if not self.butler.datasetExists('ref_cat', dataId=dataId):
+            return None
+        return self.butler.get('ref_cat_filename', dataId=dataId)[0]
+
+    def _getMasterSchema(self):
+        """Return the schema of the shards on disk.
+        """
+        self._getMasterCatalog()
+        return self._masterSchema
+
+    def _getMasterCatalog(self):
+        """Return an empty catalog with the schema of the loaded shards,
+        reading and checking the master schema on first use.
+
+        The format version and flux units are checked once per loader; the
+        shards of old-style catalogs are converted to nJy as they are read,
+        so the returned catalog has the converted schema.
+
+        Returns
+        -------
+        masterCat : `lsst.afw.table.SimpleCatalog`
+            The catalog; it must not be modified.
+
+        Raises
+        ------
+        RuntimeError
+            Raised if the format version of a new-style catalog does not
+            match that of the dataset config.
+        """
+        if self._masterCat is None:
+            dataId = self.indexer.makeDataId('master_schema', self.ref_dataset_name)
+            masterCat = self.butler.get('ref_cat', dataId=dataId, immediate=True)
+            self._masterSchema = masterCat.schema
+            # update version=0 style refcats to have nJy fluxes
+            if self.dataset_config.format_version == 0 or not hasNanojanskyFluxUnits(masterCat.schema):
+                self.log.warn("Found version 0 reference catalog with old style units in schema.")
+                self.log.warn("run `meas_algorithms/bin/convert_refcat_to_nJy.py` to convert fluxes to nJy.")
+                self.log.warn("See RFC-575 for more details.")
+                self._fluxConverter = _FluxConverter(masterCat.schema)
+                masterCat = self._fluxConverter(masterCat)
+            else:
+                # For version >= 1, the version should be in the catalog header,
+                # too, and should be consistent with the version in the config.
+                catVersion = getFormatVersionFromRefCat(masterCat)
+                if catVersion != self.dataset_config.format_version:
+                    raise RuntimeError(f"Format version in reference catalog ({catVersion}) does not match"
+                                       f" format_version field in config "
+                                       f"({self.dataset_config.format_version})")
+            self._masterCat = masterCat
+        return self._masterCat
+
+    def _convertShard(self, catalog):
+        """Convert the fluxes of a shard read from disk to nJy, if the
+        reference catalog has old-style fluxes.
+
+        Parameters
+        ----------
+        catalog : `lsst.afw.table.SimpleCatalog` or `None`
+            The shard, or `None` if it does not exist.
+
+        Returns
+        -------
+        catalog : `lsst.afw.table.SimpleCatalog` or `None`
+            ``catalog``, or a converted copy of it.
+        """
+        self._getMasterCatalog()
+        if self._fluxConverter is None:
+            return catalog
+        return self._fluxConverter(catalog)
+
+    def _recordShardCacheStats(self):
+        """Record the counters of the shard caches in the task metadata.
+        """
+        if self.config.shardCacheMaxBytes > 0:
+            cache = getSharedShardCache(self.config.shardCacheMaxBytes)
+            self.metadata.set("shardCacheHits", cache.hits)
+            self.metadata.set("shardCacheMisses", cache.misses)
+            self.metadata.set("shardCacheEvictions", cache.evictions)
+            self.metadata.set("shardCacheBytes", cache.nBytes)
+        if self._mmapCache is not None:
+            self.metadata.set("shardMmapCacheHits", self._mmapCache.hits)
+            self.metadata.set("shardMmapCacheMisses", self._mmapCache.misses)
+
+    def _getExecutor(self):
+        """Return the thread pool used to read shards, creating it if
+        needed.
+        """
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.config.numShardLoadThreads)
+        return self._executor
@@ -27,6 +27,7 @@ __all__ = ["getRefFluxField", "getRefFluxKeys", "LoadReferenceObjectsTask", "Loa
 import abc
 import itertools
 
+import astropy.coordinates
 import astropy.time
 import astropy.units
 import numpy
@@ -41,6 +42,7 @@ import lsst.log
 from lsst import geom
 from lsst import sphgeom
 from lsst.daf.base import PropertyList
+from .shardCache import getSharedShardCache
 
 
 def isOldFluxField(name, units):
@@ -110,13 +112,41 @@ def convertToNanojansky(catalog, log, doConvert=True):
     release of late calendar year 2019.
     Use `meas_algorithms/bin/convert_to_nJy.py` to update your reference catalog.
     """
+    mapper, input_fields, output_fields = _makeNanojanskyMapper(catalog.schema)
+    fluxFieldsStr = '; '.join("(%s, '%s')" % (field.getName(), field.getUnits()) for field in input_fields)
+
+    if doConvert:
+        output = _applyNanojanskyMapper(catalog, mapper, output_fields)
+        log.info(f"Converted refcat flux fields to nJy (name, units): {fluxFieldsStr}")
+        return output
+    else:
+        log.info(f"Found old-style refcat flux fields (name, units): {fluxFieldsStr}")
+        return None
+
+
+def _makeNanojanskyMapper(schema):
+    """Make a schema mapper that converts the old-style flux fields of a
+    reference catalog to nJy.
+
+    Parameters
+    ----------
+    schema : `lsst.afw.table.Schema`
+        Schema of the old-style catalog.
+
+    Returns
+    -------
+    mapper : `lsst.afw.table.SchemaMapper`
+        Mapper from ``schema`` to the converted schema.
+    input_fields, output_fields : `list` of `lsst.afw.table.Field`
+        The old-style flux fields and the corresponding converted fields.
+    """
     # Do not share the AliasMap: for refcats, that gets created when the
     # catalog is read from disk and should not be propagated.
-    mapper = lsst.afw.table.SchemaMapper(catalog.schema, shareAliasMap=False)
+    mapper = lsst.afw.table.SchemaMapper(schema, shareAliasMap=False)
     mapper.addMinimalSchema(lsst.afw.table.SimpleTable.makeMinimalSchema())
     input_fields = []
     output_fields = []
-    for field in catalog.schema:
+    for field in schema:
         oldName = field.field.getName()
         oldUnits = field.field.getUnits()
         if isOldFluxField(oldName, oldUnits):
@@ -132,20 +162,356 @@ def convertToNanojansky(catalog, log, doConvert=True):
             output_fields.append(newField)
         else:
             mapper.addMapping(field.getKey())
+    return mapper, input_fields, output_fields
 
-    fluxFieldsStr = '; '.join("(%s, '%s')" % (field.getName(), field.getUnits()) for field in input_fields)
 
-    if doConvert:
-        newSchema = mapper.getOutputSchema()
-        output = lsst.afw.table.SimpleCatalog(newSchema)
-        output.extend(catalog, mapper=mapper)
-        for field in output_fields:
-            output[field.getName()] *= 1e9
-        log.info(f"Converted refcat flux fields to nJy (name, units): {fluxFieldsStr}")
+def _applyNanojanskyMapper(catalog, mapper, output_fields):
+    """Copy an old-style reference catalog with its fluxes converted to nJy.
+
+    Parameters
+    ----------
+    catalog : `lsst.afw.table.SimpleCatalog`
+        The catalog to convert.
+    mapper : `lsst.afw.table.SchemaMapper`
+        Mapper from the schema of ``catalog``, as returned by
+        `_makeNanojanskyMapper`.
+    output_fields : `list` of `lsst.afw.table.Field`
+        The converted flux fields, as returned by `_makeNanojanskyMapper`.
+
+    Returns
+    -------
+    output : `lsst.afw.table.SimpleCatalog`
+        The converted catalog.
+    """
+    output = lsst.afw.table.SimpleCatalog(mapper.getOutputSchema())
+    output.extend(catalog, mapper=mapper)
+    for field in output_fields:
+        output[field.getName()] *= 1e9
+    return output
+
+
+def _isOldStyleRefCat(refCat):
+    """Return whether a reference catalog read from disk has old-style
+    (format version 0, Jy) fluxes.
+    """
+    version = getFormatVersionFromRefCat(refCat)
+    return not hasNanojanskyFluxUnits(refCat.schema) or version is None or version < 1
+
+
+def _getRepositoryId(butler):
+    """Return a key identifying the repository and collections read by a
+    gen 3 butler, or `None` if they cannot be identified.
+
+    Parameters
+    ----------
+    butler : `lsst.daf.butler.Butler`
+        The butler.
+
+    Returns
+    -------
+    repositoryId : `tuple` or `None`
+        The datastore root and the collections of ``butler``.
+    """
+    root = getattr(getattr(butler, "datastore", None), "root", None)
+    if root is None:
+        return None
+    collections = getattr(butler, "collections", None)
+    if collections is None:
+        collections = getattr(butler, "collection", None)
+    if isinstance(collections, (list, set, frozenset)):
+        collections = tuple(sorted(str(collection) for collection in collections))
+    return (str(root), collections)
+
+
+class _FluxConverter:
+    """Convert the shards of an old-style reference catalog to nJy, reusing
+    one schema mapper for all of them.
+
+    The converted catalogs are marked as format version 1, so that they are
+    not converted again if they are read back from a shard cache.
+
+    Parameters
+    ----------
+    schema : `lsst.afw.table.Schema`
+        Schema of the old-style shards.
+    """
+    def __init__(self, schema):
+        self.mapper, _, self.outputFields = _makeNanojanskyMapper(schema)
+
+    def __call__(self, catalog):
+        """Return a converted copy of a shard, or `None` if ``catalog`` is
+        `None`.
+        """
+        if catalog is None:
+            return None
+        output = _applyNanojanskyMapper(catalog, self.mapper, self.outputFields)
+        metadata = PropertyList()
+        metadata.set("REFCAT_FORMAT_VERSION", 1)
+        output.setMetadata(metadata)
         return output
-    else:
-        log.info(f"Found old-style refcat flux fields (name, units): {fluxFieldsStr}")
+
+    @property
+    def schema(self):
+        """Schema of the converted shards (`lsst.afw.table.Schema`)."""
+        return self.mapper.getOutputSchema()
+
+
+def _getUnitVectors(refCat):
+    """Compute the unit vectors of the positions of a reference catalog.
+
+    Parameters
+    ----------
+    refCat : `lsst.afw.table.SimpleCatalog`
+        Contiguous reference catalog.
+
+    Returns
+    -------
+    vectors : `numpy.ndarray`
+        Array of shape (3, len(refCat)) with the x, y, z components of the
+        unit vectors.
+    """
+    return _raDecToVectors(refCat["coord_ra"], refCat["coord_dec"])
+
+
+def _raDecToVectors(ra, dec):
+    """Convert arrays of ICRS coordinates to unit vectors.
+
+    Parameters
+    ----------
+    ra, dec : `numpy.ndarray`
+        Right ascension and declination (rad).
+
+    Returns
+    -------
+    vectors : `numpy.ndarray`
+        Array of shape (3, N) with the x, y, z components of the unit vectors.
+    """
+    cosDec = numpy.cos(dec)
+    return numpy.array([cosDec*numpy.cos(ra), cosDec*numpy.sin(ra), numpy.sin(dec)])
+
+
+def _vectorsToRaDec(vectors):
+    """Convert an array of vectors to ICRS coordinates.
+
+    Parameters
+    ----------
+    vectors : `numpy.ndarray`
+        Array of shape (3, N) with the x, y, z components of the vectors,
+        which need not be normalized.
+
+    Returns
+    -------
+    ra, dec : `numpy.ndarray`
+        Right ascension, in [0, 2pi), and declination (rad).
+    """
+    x, y, z = vectors
+    ra = numpy.arctan2(y, x) % (2*numpy.pi)
+    dec = numpy.arctan2(z, numpy.hypot(x, y))
+    return ra, dec
+
+
+def _offsetCoords(ra, dec, bearing, amount):
+    """Move arrays of ICRS coordinates along great circles.
+
+    This is the array equivalent of `lsst.geom.SpherePoint.offset`.
+
+    Parameters
+    ----------
+    ra, dec : `numpy.ndarray`
+        Right ascension and declination (rad) of the starting points.
+    bearing : `numpy.ndarray`
+        Direction in which to move each point, measured from East towards
+        North (rad).
+    amount : `numpy.ndarray`
+        Distance by which to move each point along its great circle (rad).
+
+    Returns
+    -------
+    ra, dec : `numpy.ndarray`
+        Right ascension, in [0, 2pi), and declination (rad) of the moved
+        points.
+    """
+    sinRa, cosRa = numpy.sin(ra), numpy.cos(ra)
+    sinDec, cosDec = numpy.sin(dec), numpy.cos(dec)
+    position = numpy.array([cosDec*cosRa, cosDec*sinRa, sinDec])
+    east = numpy.array([-sinRa, cosRa, numpy.zeros_like(ra)])
+    north = numpy.array([-sinDec*cosRa, -sinDec*sinRa, cosDec])
+    direction = east*numpy.cos(bearing) + north*numpy.sin(bearing)
+    return _vectorsToRaDec(position*numpy.cos(amount) + direction*numpy.sin(amount))
+
+
+def _getCircleMask(refCat, center, squaredChordLength, vectors=None):
+    """Return which objects of a reference catalog lie strictly within a
+    circle.
+
+    Parameters
+    ----------
+    refCat : `lsst.afw.table.SimpleCatalog`
+        Contiguous reference catalog.
+    center : `lsst.sphgeom.Vector3d`
+        Unit vector of the center of the circle.
+    squaredChordLength : `float`
+        Squared chord length of the radius of the circle.
+    vectors : `numpy.ndarray`, optional
+        Unit vectors of the objects, as returned by `_getUnitVectors`, if
+        already computed.
+
+    Returns
+    -------
+    mask : `numpy.ndarray` of `bool`
+        True for the objects within the circle.
+    """
+    if vectors is None:
+        vectors = _getUnitVectors(refCat)
+    center = numpy.array([center.x(), center.y(), center.z()])
+    # the squared chord length is computed from the differences, which
+    # is more precise than from the dot product for small circles
+    return ((vectors - center[:, numpy.newaxis])**2).sum(axis=0) < squaredChordLength
+
+
+def _getRegionMask(refCat, region, vectors=None):
+    """Return which objects of a reference catalog lie within a region.
+
+    Circles, convex polygons and boxes are tested for all objects at once;
+    other regions are tested one object at a time.
+
+    Parameters
+    ----------
+    refCat : `lsst.afw.table.SimpleCatalog`
+        Contiguous reference catalog.
+    region : `lsst.sphgeom.Region`
+        Region to test against.
+    vectors : `numpy.ndarray`, optional
+        Unit vectors of the objects, as returned by `_getUnitVectors`, if
+        already computed.
+
+    Returns
+    -------
+    mask : `numpy.ndarray` of `bool`
+        True for the objects within ``region``.
+    """
+    if isinstance(region, sphgeom.Box):
+        if region.isEmpty():
+            return numpy.zeros(len(refCat), dtype=bool)
+        dec = refCat["coord_dec"]
+        lat = region.getLat()
+        mask = (dec >= lat.getA().asRadians()) & (dec <= lat.getB().asRadians())
+        if not region.getLon().isFull():
+            ra = refCat["coord_ra"] % (2*numpy.pi)
+            lonA = region.getLon().getA().asRadians()
+            lonB = region.getLon().getB().asRadians()
+            if lonA <= lonB:
+                mask &= (ra >= lonA) & (ra <= lonB)
+            else:
+                # the longitude interval wraps around 0
+                mask &= (ra >= lonA) | (ra <= lonB)
+        return mask
+    if isinstance(region, sphgeom.Circle):
+        return _getCircleMask(refCat, region.getCenter(), region.getSquaredChordLength(), vectors)
+    if vectors is None:
+        vectors = _getUnitVectors(refCat)
+    if isinstance(region, sphgeom.ConvexPolygon):
+        # a point is inside a polygon with counter-clockwise vertices if it
+        # is on the left of (or on) every edge
+        vertices = numpy.array([[v.x(), v.y(), v.z()] for v in region.getVertices()])
+        edgeNormals = numpy.cross(vertices, numpy.roll(vertices, -1, axis=0))
+        return (edgeNormals.dot(vectors) >= 0).all(axis=0)
+    return numpy.array([region.contains(sphgeom.UnitVector3d(*v)) for v in vectors.T], dtype=bool)
+
+
+# Fields kept by column-projected loads in addition to the requested ones,
+# so that positions and their errors can still be corrected for proper motion
+_PROJECTION_ASTROMETRY_FIELDS = ("coord_raErr", "coord_decErr", "coord_ra_dec_Cov",
+                                 "epoch", "pm_ra", "pm_dec", "pm_raErr", "pm_decErr", "pm_ra_dec_Cov",
+                                 "pm_flag", "parallax", "parallaxErr", "parallax_flag")
+
+
+def _makeProjectionMapper(schema, config, filterName=None, columns=None, filterNameList=None):
+    """Make a schema mapper that keeps only the columns of a reference
+    catalog needed by the caller.
+
+    The minimal schema, the astrometric fields (coordinate errors, proper
+    motion and parallax) and the fluxes of the reference filters used by the
+    flux aliases of ``config`` and by ``filterName`` are always kept.
+
+    Parameters
+    ----------
+    schema : `lsst.afw.table.Schema`
+        Schema of the reference catalog shards.
+    config : `LoadReferenceObjectsConfig`
+        Configuration of the loader.
+    filterName : `str`, optional
+        Name of the camera filter whose flux field will be looked up.
+    columns : iterable of `str`, optional
+        Names of additional fields to keep.
+    filterNameList : iterable of `str`, optional
+        Names of additional reference filters whose flux and flux error
+        fields to keep.
+
+    Returns
+    -------
+    mapper : `lsst.afw.table.SchemaMapper` or `None`
+        Mapper from ``schema`` to the projected schema, or `None` if
+        ``columns`` and ``filterNameList`` are both `None`, in which case all
+        columns are loaded.
+
+    Raises
+    ------
+    RuntimeError
+        If a requested column or reference filter is not in ``schema``.
+    """
+    if columns is None and filterNameList is None:
         return None
+    refFilterNames = list(filterNameList or [])
+    if config.defaultFilter:
+        refFilterNames.append(config.defaultFilter)
+    refFilterNames.extend(config.filterMap.values())
+    if filterName:
+        refFilterNames.append(config.filterMap.get(filterName, filterName))
+
+    names = set(_PROJECTION_ASTROMETRY_FIELDS)
+    for refFilterName in refFilterNames:
+        fluxName = refFilterName + "_flux"
+        if fluxName not in schema:
+            raise RuntimeError("Unknown reference filter %s" % (fluxName,))
+        names.update((fluxName, fluxName + "Err"))
+    for name in columns or []:
+        if name not in schema:
+            raise RuntimeError("Unknown reference catalog column %s" % (name,))
+        names.add(name)
+
+    minimalSchema = afwTable.SimpleTable.makeMinimalSchema()
+    mapper = afwTable.SchemaMapper(schema)
+    mapper.addMinimalSchema(minimalSchema, True)
+    for item in schema:
+        name = item.field.getName()
+        if name in names and name not in minimalSchema:
+            mapper.addMapping(item.key)
+    return mapper
+
+
+def _projectCatalog(catalog, mapper):
+    """Copy a reference catalog to a catalog with a projected schema.
+
+    Parameters
+    ----------
+    catalog : `lsst.afw.table.SimpleCatalog`
+        Catalog to copy.
+    mapper : `lsst.afw.table.SchemaMapper`
+        Mapper from the schema of ``catalog``, as returned by
+        `_makeProjectionMapper`.
+
+    Returns
+    -------
+    projected : `lsst.afw.table.SimpleCatalog`
+        Contiguous copy of ``catalog`` with the output schema of ``mapper``
+        and the metadata of ``catalog``.
+    """
+    projected = afwTable.SimpleCatalog(mapper.getOutputSchema())
+    projected.setMetadata(catalog.getMetadata())
+    projected.reserve(len(catalog))
+    projected.extend(catalog, mapper=mapper)
+    return projected
 
 
 class _FilterCatalog:
@@ -169,10 +535,10 @@ class _FilterCatalog:
         initialize this class, then all the entries in the catalog must be
         within the region and so the whole catalog is returned.
 
-        If the catalog region is not entirely contained, then the location for
-        each record is tested against the region used to initialize the class.
-        Records which fall inside this region are added to a new catalog, and
-        this catalog is then returned.
+        If the catalog region is not entirely contained, then the locations of
+        the records are tested against the region used to initialize the
+        class, and the subset of records which fall inside this region is
+        returned.
 
         Parameters
         ---------
@@ -185,11 +551,11 @@ class _FilterCatalog:
             # no filtering needed, region completely contains refcat
             return refCat
 
-        filteredRefCat = type(refCat)(refCat.table)
-        for record in refCat:
-            if self.region.contains(record.getCoord().getVector()):
-                filteredRefCat.append(record)
-        return filteredRefCat
+        if len(refCat) == 0:
+            return refCat
+        if not refCat.isContiguous():
+            refCat = refCat.copy(deep=True)
+        return refCat[_getRegionMask(refCat, self.region)]
 
 
 class ReferenceObjectLoader:
@@ -221,6 +587,18 @@ class ReferenceObjectLoader:
         self.butler = butler
         self.log = log or lsst.log.Log.getDefaultLogger()
         self.config = config
+        # whether the reference catalogs have old-style fluxes, decided from
+        # the first catalog read, their format version, and the converter of
+        # their fluxes to nJy
+        self._isOldStyle = None
+        self._formatVersion = None
+        self._fluxConverter = None
+        # identity of the catalogs in the process-wide shard cache; if the
+        # repository cannot be identified, the cached catalogs are only
+        # shared by the loads of this loader
+        self._repositoryId = _getRepositoryId(butler)
+        if self._repositoryId is None:
+            self._repositoryId = object()
 
     @staticmethod
     def _makeBoxRegion(BBox, wcs, BBoxPadding):
@@ -252,7 +630,8 @@ class ReferenceObjectLoader:
 
         return innerSkyRegion, outerSkyRegion, innerSphCorners, outerSphCorners
 
-    def loadPixelBox(self, bbox, wcs, filterName=None, epoch=None, photoCalib=None, bboxPadding=100):
+    def loadPixelBox(self, bbox, wcs, filterName=None, epoch=None, photoCalib=None, bboxPadding=100,
+                     columns=None, filterNameList=None):
         """Load reference objects that are within a pixel-based rectangular region
 
         This algorithm works by creating a spherical box whose corners correspond
@@ -288,6 +667,12 @@ class ReferenceObjectLoader:
             used to determine if the reference catalog for a sky patch will be loaded from
             the data store, this function will filter out objects which lie within the
             padded region but fall outside the input bounding box region.
+        columns : iterable of `str`, optional
+            Names of fields to load in addition to the minimal and
+            astrometric fields; see `loadRegion`.
+        filterNameList : iterable of `str`, optional
+            Names of reference filters whose fluxes to load; see
+            `loadRegion`.
 
         Returns
         -------
@@ -321,9 +706,11 @@ class ReferenceObjectLoader:
                 if bbox.contains(geom.Point2I(pixCoords)):
                     filteredRefCat.append(record)
             return filteredRefCat
-        return self.loadRegion(outerSkyRegion, filtFunc=_filterFunction, epoch=epoch, filterName=filterName)
+        return self.loadRegion(outerSkyRegion, filtFunc=_filterFunction, epoch=epoch, filterName=filterName,
+                               columns=columns, filterNameList=filterNameList)
 
-    def loadRegion(self, region, filtFunc=None, filterName=None, epoch=None):
+    def loadRegion(self, region, filtFunc=None, filterName=None, epoch=None, columns=None,
+                   filterNameList=None):
         """ Load reference objects within a specified region
 
         This function loads the DataIds used to construct an instance of this class
@@ -348,6 +735,14 @@ class ReferenceObjectLoader:
         epoch : `astropy.time.Time` (optional)
             Epoch to which to correct proper motion and parallax,
             or None to not apply such corrections.
+        columns : iterable of `str`, optional
+            Names of fields to load in addition to the minimal schema, the
+            astrometric fields and the fluxes used by ``filterName`` and by
+            the flux aliases of the config. If this and ``filterNameList``
+            are both `None` (the default) all fields are loaded.
+        filterNameList : iterable of `str`, optional
+            Names of reference filters whose flux and flux error fields to
+            load in addition to those described for ``columns``.
 
         Returns
         -------
@@ -370,54 +765,169 @@ class ReferenceObjectLoader:
         if filtFunc is None:
             filtFunc = _FilterCatalog(region)
         # filter out all the regions supplied by the constructor that do not overlap
-        overlapList = []
-        for dataId in self.dataIds:
-            # SphGeom supports some objects intersecting others, but is not symmetric,
-            # try the intersect operation in both directions
-            try:
-                intersects = dataId.region.intersects(region)
-            except TypeError:
-                intersects = region.intersects(dataId.region)
-
-            if intersects:
-                overlapList.append(dataId)
+        overlapList = [dataId for dataId in self.dataIds if self._intersects(dataId.region, region)]
 
         if len(overlapList) == 0:
             raise pexExceptions.RuntimeError("No reference tables could be found for input region")
 
-        firstCat = self.butler.get('ref_cat', overlapList[0])
-        refCat = filtFunc(firstCat, overlapList[0].region)
+        firstCat = self._getRefCat(overlapList[0])
+        # drop the columns the caller does not need before filtering
+        mapper = _makeProjectionMapper(firstCat.schema, self.config, filterName, columns, filterNameList)
+
+        def project(catalog):
+            return catalog if mapper is None else _projectCatalog(catalog, mapper)
+
+        refCat = filtFunc(project(firstCat), overlapList[0].region)
         trimmedAmount = len(firstCat) - len(refCat)
 
         # Load in the remaining catalogs
         for dataId in overlapList[1:]:
-            tmpCat = self.butler.get('ref_cat', dataId)
+            tmpCat = self._getRefCat(dataId)
 
             if tmpCat.schema != firstCat.schema:
                 raise pexExceptions.TypeError("Reference catalogs have mismatching schemas")
 
-            filteredCat = filtFunc(tmpCat, dataId.region)
+            filteredCat = filtFunc(project(tmpCat), dataId.region)
             refCat.extend(filteredCat)
             trimmedAmount += len(tmpCat) - len(filteredCat)
 
         self.log.debug(f"Trimmed {trimmedAmount} out of region objects, leaving {len(refCat)}")
         self.log.info(f"Loaded {len(refCat)} reference objects")
+        return self._finishRefCat(refCat, filterName, epoch)
+
+    def loadRegions(self, regions, filterName=None, epoch=None, columns=None, filterNameList=None):
+        """Load reference objects within each of several regions.
+
+        This gives the same catalogs as calling `loadRegion` with its default
+        filter function for each region, but each reference catalog
+        overlapping any of the regions is read only once, and the positions
+        of its objects are converted once for all the regions.
+
+        Parameters
+        ----------
+        regions : iterable of `lsst.sphgeom.Region`
+            The spatial regions for which reference objects are to be loaded.
+        filterName : `str`
+            Name of camera filter, or None or blank for the default filter
+        epoch : `astropy.time.Time` (optional)
+            Epoch to which to correct proper motion and parallax,
+            or None to not apply such corrections.
+        columns : iterable of `str`, optional
+            Names of fields to load in addition to the minimal and
+            astrometric fields; see `loadRegion`.
+        filterNameList : iterable of `str`, optional
+            Names of reference filters whose fluxes to load; see
+            `loadRegion`.
+
+        Returns
+        -------
+        results : `list` of `lsst.pipe.base.Struct`
+            For each region, in order, the result of `loadRegion` for that
+            region.
 
+        Raises
+        ------
+        `lsst.pex.exception.RuntimeError`
+            Raised if no reference catalogs could be found for one of the
+            regions
+
+        `lsst.pex.exception.TypeError`
+            Raised if the loaded reference catalogs do not have matching schemas
+        """
+        regions = list(regions)
+        # the regions overlapping each reference catalog, and whether they
+        # contain it entirely
+        overlaps = []
+        found = [False]*len(regions)
+        for dataId in self.dataIds:
+            users = [(i, dataId.region.isWithin(region)) for i, region in enumerate(regions)
+                     if self._intersects(dataId.region, region)]
+            if users:
+                overlaps.append((dataId, users))
+                for i, _ in users:
+                    found[i] = True
+        if not all(found):
+            raise pexExceptions.RuntimeError("No reference tables could be found for input region")
+        self.log.info(f"Loading reference objects for {len(regions)} regions from {len(overlaps)} "
+                      "reference catalogs")
+
+        firstSchema = None
+        mapper = None
+        subsets = [[] for _ in regions]
+        for dataId, users in overlaps:
+            refCat = self._getRefCat(dataId)
+            if firstSchema is None:
+                firstSchema = refCat.schema
+                mapper = _makeProjectionMapper(firstSchema, self.config, filterName, columns,
+                                               filterNameList)
+            elif refCat.schema != firstSchema:
+                raise pexExceptions.TypeError("Reference catalogs have mismatching schemas")
+            if mapper is not None:
+                refCat = _projectCatalog(refCat, mapper)
+            elif not refCat.isContiguous():
+                refCat = refCat.copy(deep=True)
+            vectors = None
+            if len(refCat) > 0 and not all(isWithin for _, isWithin in users):
+                vectors = _getUnitVectors(refCat)
+            for i, isWithin in users:
+                if isWithin or len(refCat) == 0:
+                    subsets[i].append(refCat)
+                else:
+                    subsets[i].append(refCat[_getRegionMask(refCat, regions[i], vectors)])
+
+        results = []
+        for regionSubsets in subsets:
+            # deep copies, so that the catalogs of overlapping regions do not
+            # share records
+            refCat = type(regionSubsets[0])(regionSubsets[0].table.clone())
+            for subset in regionSubsets:
+                refCat.extend(subset, deep=True)
+            self.log.info(f"Loaded {len(refCat)} reference objects")
+            results.append(self._finishRefCat(refCat, filterName, epoch))
+        return results
+
+    @staticmethod
+    def _intersects(dataIdRegion, region):
+        """Return whether the region of a reference catalog intersects a
+        region.
+        """
+        # SphGeom supports some objects intersecting others, but is not symmetric,
+        # try the intersect operation in both directions
+        try:
+            return dataIdRegion.intersects(region)
+        except TypeError:
+            return region.intersects(dataIdRegion)
+
+    def _finishRefCat(self, refCat, filterName, epoch):
+        """Correct a loaded reference catalog for proper motion, and add
+        centroid fields and flux aliases.
+
+        Parameters
+        ----------
+        refCat : `lsst.afw.table.SimpleCatalog`
+            The reference objects within the loaded region.
+        filterName : `str`
+            Name of camera filter, or None or blank for the default filter
+        epoch : `astropy.time.Time` or `None`
+            Epoch to which to correct proper motion and parallax,
+            or None to not apply such corrections.
+
+        Returns
+        -------
+        result : `lsst.pipe.base.Struct`
+            As returned by `loadRegion`.
+        """
         if epoch is not None and "pm_ra" in refCat.schema:
             # check for a catalog in a non-standard format
             if isinstance(refCat.schema["pm_ra"].asKey(), lsst.afw.table.KeyAngle):
-                applyProperMotionsImpl(self.log, refCat, epoch)
+                # proper motions are applied in place, to a contiguous catalog
+                # that must not share records with the shard cache
+                if not refCat.isContiguous() or self.config.shardCacheMaxBytes > 0:
+                    refCat = refCat.copy(deep=True)
+                applyProperMotionsImpl(self.log, refCat, epoch, applyParallax=self.config.applyParallax)
             else:
                 self.log.warn("Catalog pm_ra field is not an Angle; not applying proper motion")
 
-        # Verify the schema is in the correct units and has the correct version; automatically convert
-        # it with a warning if this is not the case.
-        if not hasNanojanskyFluxUnits(refCat.schema) or not getFormatVersionFromRefCat(refCat) >= 1:
-            self.log.warn("Found version 0 reference catalog with old style units in schema.")
-            self.log.warn("run `meas_algorithms/bin/convert_refcat_to_nJy.py` to convert fluxes to nJy.")
-            self.log.warn("See RFC-575 for more details.")
-            refCat = convertToNanojansky(refCat, self.log)
-
         expandedCat = self.remapReferenceCatalogSchema(refCat, position=True)
 
         # Add flux aliases
@@ -430,7 +940,86 @@ class ReferenceObjectLoader:
         fluxField = getRefFluxField(schema=expandedCat.schema, filterName=filterName)
         return pipeBase.Struct(refCat=expandedCat, fluxField=fluxField)
 
-    def loadSkyCircle(self, ctrCoord, radius, filterName=None, epoch=None):
+    def _getRefCat(self, dataId):
+        """Get one reference catalog, from the process-wide shard cache if it
+        is enabled.
+
+        Parameters
+        ----------
+        dataId : `lsst.daf.butler.DataId`
+            Data ID of the reference catalog.
+
+        Returns
+        -------
+        refCat : `lsst.afw.table.SimpleCatalog`
+            The reference catalog, with its fluxes converted to nJy if
+            needed; its records must not be modified.
+        """
+        if self.config.shardCacheMaxBytes > 0:
+            cache = getSharedShardCache(self.config.shardCacheMaxBytes)
+            if self._formatVersion is None:
+                # the format version, which is part of the cache keys, is
+                # read from the first catalog
+                refCat = self._convertRefCat(self.butler.get('ref_cat', dataId))
+                cache.put(self._getCacheKey(dataId), refCat)
+                return refCat.copy(deep=False)
+            # the cache holds converted catalogs, so that old-style catalogs
+            # are converted once per process
+            return cache.get(self._getCacheKey(dataId),
+                             lambda: self._convertRefCat(self.butler.get('ref_cat', dataId)))
+        return self._convertRefCat(self.butler.get('ref_cat', dataId))
+
+    def _getCacheKey(self, dataId):
+        """Return the key of a reference catalog in the process-wide shard
+        cache.
+
+        The key identifies the repository and collections, the dataset and
+        the format version, so that loaders of different catalogs with the
+        same data IDs do not share cached catalogs.
+
+        Parameters
+        ----------
+        dataId : `lsst.daf.butler.DataId` or `lsst.daf.butler.DatasetRef`
+            Data ID or dataset reference of the reference catalog.
+
+        Returns
+        -------
+        key : `tuple`
+            The cache key.
+        """
+        datasetType = getattr(dataId, "datasetType", None)
+        datasetTypeName = getattr(datasetType, "name", datasetType)
+        return ('ref_cat', self._repositoryId, datasetTypeName, getattr(dataId, "id", None), dataId,
+                self._formatVersion)
+
+    def _convertRefCat(self, refCat):
+        """Convert the fluxes of a reference catalog read from disk to nJy,
+        if the reference catalogs have old-style fluxes.
+
+        Parameters
+        ----------
+        refCat : `lsst.afw.table.SimpleCatalog`
+            The reference catalog.
+
+        Returns
+        -------
+        refCat : `lsst.afw.table.SimpleCatalog`
+            ``refCat``, or a converted copy of it.
+        """
+        if self._isOldStyle is None:
+            # Verify the schema is in the correct units and has the correct version; automatically
+            # convert it with a warning if this is not the case.
+            self._isOldStyle = _isOldStyleRefCat(refCat)
+            self._formatVersion = 0 if self._isOldStyle else getFormatVersionFromRefCat(refCat)
+            if self._isOldStyle:
+                self.log.warn("Found version 0 reference catalog with old style units in schema.")
+                self.log.warn("run `meas_algorithms/bin/convert_refcat_to_nJy.py` to convert fluxes to nJy.")
+                self.log.warn("See RFC-575 for more details.")
+                self._fluxConverter = _FluxConverter(refCat.schema)
+        return self._fluxConverter(refCat) if self._isOldStyle else refCat
+
+    def loadSkyCircle(self, ctrCoord, radius, filterName=None, epoch=None, columns=None,
+                      filterNameList=None):
         """Load reference objects that lie within a circular region on the sky
 
         This method constructs a circular region from an input center and angular radius,
@@ -449,6 +1038,12 @@ class ReferenceObjectLoader:
         epoch : `astropy.time.Time` (optional)
             Epoch to which to correct proper motion and parallax,
             or None to not apply such corrections.
+        columns : iterable of `str`, optional
+            Names of fields to load in addition to the minimal and
+            astrometric fields; see `loadRegion`.
+        filterNameList : iterable of `str`, optional
+            Names of reference filters whose fluxes to load; see
+            `loadRegion`.
 
         Returns
         -------
@@ -467,7 +1062,8 @@ class ReferenceObjectLoader:
         centerVector = ctrCoord.getVector()
         sphRadius = sphgeom.Angle(radius.asRadians())
         circularRegion = sphgeom.Circle(centerVector, sphRadius)
-        return self.loadRegion(circularRegion, filterName=filterName, epoch=None)
+        return self.loadRegion(circularRegion, filterName=filterName, epoch=None, columns=columns,
+                               filterNameList=filterNameList)
 
     def joinMatchListWithCatalog(self, matchCat, sourceCat):
         """Relink an unpersisted match list to sources and reference
@@ -496,6 +1092,27 @@ class ReferenceObjectLoader:
         """
         return joinMatchListWithCatalogImpl(self, matchCat, sourceCat)
 
+    def joinMatchListsWithCatalog(self, matchCats, sourceCats):
+        """Relink many unpersisted match lists to sources and reference
+        objects, loading the reference objects of overlapping regions
+        together.
+
+        Parameters
+        ----------
+        matchCats : iterable of `lsst.afw.table.BaseCatalog`
+            Unpersisted packed match lists, each with match metadata as
+            described for `joinMatchListWithCatalog`.
+        sourceCats : iterable of `lsst.afw.table.SourceCatalog`
+            The source catalog of each match list. The catalogs are not
+            modified.
+
+        Returns
+        -------
+        matchLists : `list` of `lsst.afw.table.ReferenceMatchVector`
+            The match list of each match catalog, in order.
+        """
+        return joinMatchListsWithCatalogImpl(self, matchCats, sourceCats)
+
     @classmethod
     def getMetadataBox(cls, bbox, wcs, filterName=None, photoCalib=None, epoch=None, bboxPadding=100):
         """Return metadata about the load
@@ -785,6 +1402,20 @@ class LoadReferenceObjectsConfig(pexConfig.Config):
         dtype=bool,
         default=False,
     )
+    applyParallax = pexConfig.Field(
+        doc="Correct positions for parallax, as seen from the geocenter at the requested epoch, "
+            "when correcting for proper motion? Requires the parallax field.",
+        dtype=bool,
+        default=False,
+    )
+    shardCacheMaxBytes = pexConfig.RangeField(
+        doc="Size (bytes) of the least-recently-used cache of decoded reference catalog shards, "
+            "shared by all loaders in a process; 0 disables the cache. The cache is keyed by repository, "
+            "dataset and format version, so loaders of different catalogs do not share shards.",
+        dtype=int,
+        default=0,
+        min=0,
+    )
 
 # The following comment block adds a link to this task from the Task Documentation page.
 ## @addtogroup LSST_task_documentation
@@ -898,7 +1529,8 @@ class LoadReferenceObjectsTask(pipeBase.Task, metaclass=abc.ABCMeta):
         self.butler = butler
 
     @pipeBase.timeMethod
-    def loadPixelBox(self, bbox, wcs, filterName=None, photoCalib=None, epoch=None):
+    def loadPixelBox(self, bbox, wcs, filterName=None, photoCalib=None, epoch=None, columns=None,
+                     filterNameList=None):
         """Load reference objects that overlap a rectangular pixel region.
 
         Parameters
@@ -917,6 +1549,12 @@ class LoadReferenceObjectsTask(pipeBase.Task, metaclass=abc.ABCMeta):
         epoch : `astropy.time.Time` (optional)
             Epoch to which to correct proper motion and parallax,
             or None to not apply such corrections.
+        columns : iterable of `str` (optional)
+            Names of fields to load in addition to the minimal and
+            astrometric fields; see `loadSkyCircle`.
+        filterNameList : iterable of `str` (optional)
+            Names of reference filters whose fluxes to load; see
+            `loadSkyCircle`.
 
         Returns
         -------
@@ -942,24 +1580,128 @@ class LoadReferenceObjectsTask(pipeBase.Task, metaclass=abc.ABCMeta):
         # find objects in circle
         self.log.info("Loading reference objects using center %s and radius %s deg" %
                       (circle.coord, circle.radius.asDegrees()))
-        loadRes = self.loadSkyCircle(circle.coord, circle.radius, filterName, centroids=True)
+        # only pass the projection arguments if they are used, to support
+        # subclasses whose loadSkyCircle does not accept them
+        projection = {}
+        if columns is not None:
+            projection["columns"] = columns
+        if filterNameList is not None:
+            projection["filterNameList"] = filterNameList
+        loadRes = self.loadSkyCircle(circle.coord, circle.radius, filterName, centroids=True, **projection)
+        return self._trimLoadResult(loadRes, circle.bbox, wcs)
+
+    @pipeBase.timeMethod
+    def loadPixelBoxes(self, bboxes, wcsList, filterName=None, epoch=None, columns=None,
+                       filterNameList=None):
+        """Load reference objects that overlap each of several rectangular
+        pixel regions, e.g. the detectors of a visit.
+
+        The sky circles enclosing the boxes are loaded together with
+        `loadSkyCircles`, so that subclasses that support it read each
+        reference catalog shard only once.
+
+        Parameters
+        ----------
+        bboxes : iterable of `lsst.geom.Box2I` or `lsst.geom.Box2D`
+            Bounding boxes for pixels.
+        wcsList : iterable of `lsst.afw.geom.SkyWcs`
+            WCS of each box; used to convert pixel positions to sky
+            coordinates and vice-versa.
+        filterName : `str`
+            Name of filter, or `None` or `""` for the default filter.
+        epoch : `astropy.time.Time` (optional)
+            Epoch to which to correct proper motion and parallax,
+            or None to not apply such corrections.
+        columns : iterable of `str` (optional)
+            Names of fields to load in addition to the minimal and
+            astrometric fields; see `loadSkyCircle`.
+        filterNameList : iterable of `str` (optional)
+            Names of reference filters whose fluxes to load; see
+            `loadSkyCircle`.
+
+        Returns
+        -------
+        results : `list` of `lsst.pipe.base.Struct`
+            For each box, in order, a Struct as returned by `loadPixelBox`.
+        """
+        wcsList = list(wcsList)
+        circles = [self._calculateCircle(bbox, wcs) for bbox, wcs in zip(bboxes, wcsList)]
+        self.log.info("Loading reference objects for %d pixel boxes", len(circles))
+        loadResList = self.loadSkyCircles([(circle.coord, circle.radius) for circle in circles],
+                                          filterName, epoch=epoch, centroids=True, columns=columns,
+                                          filterNameList=filterNameList)
+        return [self._trimLoadResult(loadRes, circle.bbox, wcs)
+                for loadRes, circle, wcs in zip(loadResList, circles, wcsList)]
+
+    def loadSkyCircles(self, circles, filterName=None, epoch=None, centroids=False, columns=None,
+                       filterNameList=None):
+        """Load reference objects that overlap each of several circular sky
+        regions.
+
+        This implementation calls `loadSkyCircle` once per circle;
+        subclasses may override it to read the data shared by the circles
+        only once.
+
+        Parameters
+        ----------
+        circles : iterable of `tuple` [`lsst.geom.SpherePoint`, `lsst.geom.Angle`]
+            ICRS center and radius of each search region.
+        filterName, epoch, centroids, columns, filterNameList
+            As for `loadSkyCircle`.
+
+        Returns
+        -------
+        results : `list` of `lsst.pipe.base.Struct`
+            For each circle, in order, a Struct as returned by
+            `loadSkyCircle`.
+        """
+        # only pass the projection arguments if they are used, to support
+        # subclasses whose loadSkyCircle does not accept them
+        projection = {}
+        if columns is not None:
+            projection["columns"] = columns
+        if filterNameList is not None:
+            projection["filterNameList"] = filterNameList
+        return [self.loadSkyCircle(ctrCoord, radius, filterName, epoch=epoch, centroids=centroids,
+                                   **projection)
+                for ctrCoord, radius in circles]
+
+    def _trimLoadResult(self, loadRes, bbox, wcs):
+        """Trim the result of `loadSkyCircle` to a pixel bounding box.
+
+        Parameters
+        ----------
+        loadRes : `lsst.pipe.base.Struct`
+            Result of `loadSkyCircle`, with centroid fields; its ``refCat``
+            is replaced.
+        bbox : `lsst.geom.Box2D`
+            Pixel region.
+        wcs : `lsst.afw.geom.SkyWcs`
+            WCS; used to convert sky coordinates to pixel positions.
+
+        Returns
+        -------
+        loadRes : `lsst.pipe.base.Struct`
+            ``loadRes``, with the objects outside ``bbox`` removed.
+        """
         refCat = loadRes.refCat
         numFound = len(refCat)
 
         # trim objects outside bbox
-        refCat = self._trimToBBox(refCat=refCat, bbox=circle.bbox, wcs=wcs)
+        refCat = self._trimToBBox(refCat=refCat, bbox=bbox, wcs=wcs)
         numTrimmed = numFound - len(refCat)
         self.log.debug("trimmed %d out-of-bbox objects, leaving %d", numTrimmed, len(refCat))
         self.log.info("Loaded %d reference objects", len(refCat))
 
         # make sure catalog is contiguous
         if not refCat.isContiguous():
-            loadRes.refCat = refCat.copy(deep=True)
-
+            refCat = refCat.copy(deep=True)
+        loadRes.refCat = refCat
         return loadRes
 
     @abc.abstractmethod
-    def loadSkyCircle(self, ctrCoord, radius, filterName=None, epoch=None, centroids=False):
+    def loadSkyCircle(self, ctrCoord, radius, filterName=None, epoch=None, centroids=False,
+                      columns=None, filterNameList=None):
         """Load reference objects that overlap a circular sky region.
 
         Parameters
@@ -978,6 +1720,16 @@ class LoadReferenceObjectsTask(pipeBase.Task, metaclass=abc.ABCMeta):
         centroids : `bool` (optional)
             Add centroid fields to the loaded Schema. ``loadPixelBox`` expects
             these fields to exist.
+        columns : iterable of `str` (optional)
+            Names of fields to load in addition to the minimal schema, the
+            astrometric fields (coordinate errors, proper motion and
+            parallax) and the fluxes used by ``filterName`` and by the flux
+            aliases of the config. If this and ``filterNameList`` are both
+            `None` (the default) all fields are loaded. Subclasses that do not
+            support column projection need not accept this argument.
+        filterNameList : iterable of `str` (optional)
+            Names of reference filters whose flux and flux error fields to
+            load in addition to those described for ``columns``.
 
         Returns
         -------
@@ -1362,6 +2114,27 @@ class LoadReferenceObjectsTask(pipeBase.Task, metaclass=abc.ABCMeta):
         """
         return joinMatchListWithCatalogImpl(self, matchCat, sourceCat)
 
+    def joinMatchListsWithCatalog(self, matchCats, sourceCats):
+        """Relink many unpersisted match lists to sources and reference
+        objects, loading the reference objects of overlapping regions
+        together.
+
+        Parameters
+        ----------
+        matchCats : iterable of `lsst.afw.table.BaseCatalog`
+            Unpersisted packed match lists, each with match metadata as
+            described for `joinMatchListWithCatalog`.
+        sourceCats : iterable of `lsst.afw.table.SourceCatalog`
+            The source catalog of each match list. The catalogs are not
+            modified.
+
+        Returns
+        -------
+        matchLists : `list` of `lsst.afw.table.ReferenceMatchVector`
+            The match list of each match catalog, in order.
+        """
+        return joinMatchListsWithCatalogImpl(self, matchCats, sourceCats)
+
     def applyProperMotions(self, catalog, epoch):
         """Apply proper motion correction to a reference catalog.
 
@@ -1393,7 +2166,7 @@ class LoadReferenceObjectsTask(pipeBase.Task, metaclass=abc.ABCMeta):
                 raise RuntimeError("Proper motion correction required but not available from catalog")
             self.log.warn("Proper motion correction not available from catalog")
             return
-        applyProperMotionsImpl(self.log, catalog, epoch)
+        applyProperMotionsImpl(self.log, catalog, epoch, applyParallax=self.config.applyParallax)
 
 
 def joinMatchListWithCatalogImpl(refObjLoader, matchCat, sourceCat):
@@ -1423,6 +2196,130 @@ def joinMatchListWithCatalogImpl(refObjLoader, matchCat, sourceCat):
     matchList : `lsst.afw.table.ReferenceMatchVector`
         Match list.
     """
+    request = _parseMatchMetadata(matchCat)
+    if request.circle is not None:
+        # This is a circle style metadata, call loadSkyCircle
+        refCat = refObjLoader.loadSkyCircle(*request.circle, request.filterName, epoch=request.epoch).refCat
+    else:
+        refCat = refObjLoader.loadRegion(request.region, filterName=request.filterName,
+                                         epoch=request.epoch).refCat
+
+    refCat.sort()
+    sourceCat.sort()
+    return afwTable.unpackMatches(matchCat, refCat, sourceCat)
+
+
+def joinMatchListsWithCatalogImpl(refObjLoader, matchCats, sourceCats):
+    """Relink many unpersisted match lists to sources and reference
+    objects.
+
+    This gives the same match lists as calling `joinMatchListWithCatalogImpl`
+    for each match catalog, but the reference objects of all the match
+    catalogs with the same filter and epoch are loaded together, so that
+    overlapping regions are read once and identical regions are loaded
+    once. Records are then looked up by ID in hash tables built once per
+    loaded region and per source catalog, rather than by sorting the
+    catalogs.
+
+    Parameters
+    ----------
+    refObjLoader
+        Reference object loader to use in getting reference objects; its
+        ``loadSkyCircles`` or ``loadRegions`` method is used if it has one.
+    matchCats : iterable of `lsst.afw.table.BaseCatalog`
+        Unpersisted packed match lists, each with match metadata as
+        described for `joinMatchListWithCatalogImpl`.
+    sourceCats : iterable of `lsst.afw.table.SourceCatalog`
+        The source catalog of each match list; the same catalog may be
+        given for several match lists. The catalogs are not modified.
+
+    Returns
+    -------
+    matchLists : `list` of `lsst.afw.table.ReferenceMatchVector`
+        The match list of each match catalog, in order.
+    """
+    matchCats = list(matchCats)
+    sourceCats = list(sourceCats)
+    requests = [_parseMatchMetadata(matchCat) for matchCat in matchCats]
+
+    # the distinct regions to load, grouped by filter and epoch
+    groups = {}
+    for request in requests:
+        regions = groups.setdefault((request.filterName, request.epoch), {})
+        regions.setdefault(request.key, request)
+    refIndices = {}
+    for (filterName, epoch), regions in groups.items():
+        circles = [request for request in regions.values() if request.circle is not None]
+        boxes = [request for request in regions.values() if request.circle is None]
+        if circles:
+            if hasattr(refObjLoader, "loadSkyCircles"):
+                results = refObjLoader.loadSkyCircles([request.circle for request in circles], filterName,
+                                                      epoch=epoch)
+            else:
+                results = [refObjLoader.loadSkyCircle(*request.circle, filterName, epoch=epoch)
+                           for request in circles]
+            for request, result in zip(circles, results):
+                refIndices[(filterName, epoch, request.key)] = _IdIndex(result.refCat)
+        if boxes:
+            if hasattr(refObjLoader, "loadRegions"):
+                results = refObjLoader.loadRegions([request.region for request in boxes],
+                                                   filterName=filterName, epoch=epoch)
+            else:
+                results = [refObjLoader.loadRegion(request.region, filterName=filterName, epoch=epoch)
+                           for request in boxes]
+            for request, result in zip(boxes, results):
+                refIndices[(filterName, epoch, request.key)] = _IdIndex(result.refCat)
+
+    sourceIndices = {}
+    matchLists = []
+    for matchCat, sourceCat, request in zip(matchCats, sourceCats, requests):
+        if id(sourceCat) not in sourceIndices:
+            sourceIndices[id(sourceCat)] = _IdIndex(sourceCat)
+        refIndex = refIndices[(request.filterName, request.epoch, request.key)]
+        sourceIndex = sourceIndices[id(sourceCat)]
+        matchList = afwTable.ReferenceMatchVector()
+        for refId, sourceId, distance in zip(_getColumn(matchCat, "first"), _getColumn(matchCat, "second"),
+                                             _getColumn(matchCat, "distance")):
+            matchList.append(afwTable.ReferenceMatch(refIndex.find(refId), sourceIndex.find(sourceId),
+                                                     distance))
+        matchLists.append(matchList)
+    return matchLists
+
+
+def _parseMatchMetadata(matchCat):
+    """Read the reference region of a packed match list from its metadata.
+
+    Parameters
+    ----------
+    matchCat : `lsst.afw.table.BaseCatalog`
+        Unpersisted packed match list with match metadata.
+
+    Returns
+    -------
+    request : `lsst.pipe.base.Struct`
+        A struct with fields:
+
+        ``filterName``
+            Name of the camera filter (`str`).
+        ``epoch``
+            Epoch of the reference objects, or `None`.
+        ``circle``
+            ICRS center and radius of the region (`tuple` [
+            `lsst.geom.SpherePoint`, `lsst.geom.Angle`]), or `None` for
+            box style metadata.
+        ``region``
+            Outer region of box style metadata (`lsst.sphgeom.ConvexPolygon`)
+            or `None`.
+        ``key``
+            Hashable key of the region, equal for match lists with the
+            same region.
+
+    Raises
+    ------
+    ValueError
+        Raised if the metadata are not of version 1, or do not describe a
+        region.
+    """
     matchmeta = matchCat.table.getMetadata()
     version = matchmeta.getInt('SMATCHV')
     if version != 1:
@@ -1432,37 +2329,68 @@ def joinMatchListWithCatalogImpl(refObjLoader, matchCat, sourceCat):
         epoch = matchmeta.getDouble('EPOCH')
     except (pexExcept.NotFoundError, pexExcept.TypeError):
         epoch = None  # Not present, or not correct type means it's not set
+    circle = None
+    region = None
     if 'RADIUS' in matchmeta:
-        # This is a circle style metadata, call loadSkyCircle
-        ctrCoord = lsst.geom.SpherePoint(matchmeta.getDouble('RA'),
-                                         matchmeta.getDouble('DEC'), lsst.geom.degrees)
-        rad = matchmeta.getDouble('RADIUS') * lsst.geom.degrees
-        refCat = refObjLoader.loadSkyCircle(ctrCoord, rad, filterName, epoch=epoch).refCat
+        key = tuple(matchmeta.getDouble(name) for name in ('RA', 'DEC', 'RADIUS'))
+        ctrCoord = lsst.geom.SpherePoint(key[0], key[1], lsst.geom.degrees)
+        circle = (ctrCoord, key[2] * lsst.geom.degrees)
     elif "INNER_UPPER_LEFT_RA" in matchmeta:
         # This is the sky box type (only triggers in the LoadReferenceObject class, not task)
         # Only the outer box is required to be loaded to get the maximum region, all filtering
-        # will be done by the unpackMatches function, and no spatial filtering needs to be done
+        # will be done when unpacking the matches, and no spatial filtering needs to be done
         # by the refObjLoader
         box = []
+        key = ()
         for place in ("UPPER_LEFT", "UPPER_RIGHT", "LOWER_LEFT", "LOWER_RIGHT"):
-            coord = lsst.geom.SpherePoint(matchmeta.getDouble(f"OUTER_{place}_RA"),
-                                          matchmeta.getDouble(f"OUTER_{place}_DEC"),
-                                          lsst.geom.degrees).getVector()
-            box.append(coord)
-        outerBox = sphgeom.ConvexPolygon(box)
-        refCat = refObjLoader.loadRegion(outerBox, filterName=filterName, epoch=epoch).refCat
+            ra = matchmeta.getDouble(f"OUTER_{place}_RA")
+            dec = matchmeta.getDouble(f"OUTER_{place}_DEC")
+            box.append(lsst.geom.SpherePoint(ra, dec, lsst.geom.degrees).getVector())
+            key += (ra, dec)
+        region = sphgeom.ConvexPolygon(box)
+    else:
+        raise ValueError("Match metadata describe neither a circle nor a box")
+    return pipeBase.Struct(filterName=filterName, epoch=epoch, circle=circle, region=region, key=key)
 
-    refCat.sort()
-    sourceCat.sort()
-    return afwTable.unpackMatches(matchCat, refCat, sourceCat)
+
+def _getColumn(catalog, name):
+    """Return a column of a catalog as an array, even if the catalog is not
+    contiguous.
+    """
+    key = catalog.schema[name].asKey()
+    if catalog.isContiguous():
+        return catalog[key]
+    return numpy.array([record.get(key) for record in catalog])
+
+
+class _IdIndex:
+    """A hash table of the records of a catalog, keyed by ID.
+
+    Parameters
+    ----------
+    catalog : `lsst.afw.table.SimpleCatalog` or `lsst.afw.table.SourceCatalog`
+        The catalog to index. It must not be modified while the index is in
+        use.
+    """
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self._rows = {recordId: row for row, recordId in enumerate(_getColumn(catalog, "id").tolist())}
+
+    def find(self, recordId):
+        """Return the record with an ID, or `None` if there is none.
+        """
+        row = self._rows.get(int(recordId))
+        return None if row is None else self.catalog[row]
 
 
-def applyProperMotionsImpl(log, catalog, epoch):
+def applyProperMotionsImpl(log, catalog, epoch, applyParallax=False):
     """Apply proper motion correction to a reference catalog.
 
     Adjust position and position error in the ``catalog``
     for proper motion to the specified ``epoch``,
     modifying the catalong in place.
+    Optionally also correct the positions for parallax, as seen
+    from the geocenter at ``epoch``.
 
     Parameters
     ----------
@@ -1481,9 +2409,13 @@ def applyProperMotionsImpl(log, catalog, epoch):
             North positive)
         - ``pm_decErr`` : Error in ``pm_dec`` (rad/yr), optional.
         - ``epoch`` : Mean epoch of object (an astropy.time.Time)
+        - ``parallax`` : Parallax (rad), required if ``applyParallax``.
     epoch : `astropy.time.Time` (optional)
         Epoch to which to correct proper motion and parallax,
         or None to not apply such corrections.
+    applyParallax : `bool`, optional
+        Correct positions for parallax? Objects with a non-finite
+        parallax are not corrected.
     """
     if "epoch" not in catalog.schema or "pm_ra" not in catalog.schema or "pm_dec" not in catalog.schema:
         log.warn("Proper motion correction not available from catalog")
@@ -1494,7 +2426,6 @@ def applyProperMotionsImpl(log, catalog, epoch):
     log.debug("Correcting reference catalog for proper motion to %r", epoch)
     # Use `epoch.tai` to make sure the time difference is in TAI
     timeDiffsYears = (epoch.tai - catEpoch).to(astropy.units.yr).value
-    coordKey = catalog.table.getCoordKey()
     # Compute the offset of each object due to proper motion
     # as components of the arc of a great circle along RA and Dec
     pmRaRad = catalog["pm_ra"]
@@ -1510,10 +2441,15 @@ def applyProperMotionsImpl(log, catalog, epoch):
     # needlessly large errors for short duration
     offsetBearingsRad = numpy.arctan2(pmDecRad*1e6, pmRaRad*1e6)
     offsetAmountsRad = numpy.hypot(offsetsRaRad, offsetsDecRad)
-    for record, bearingRad, amountRad in zip(catalog, offsetBearingsRad, offsetAmountsRad):
-        record.set(coordKey,
-                   record.get(coordKey).offset(bearing=bearingRad*lsst.geom.radians,
-                                               amount=amountRad*lsst.geom.radians))
+    ra, dec = _offsetCoords(catalog["coord_ra"], catalog["coord_dec"], offsetBearingsRad, offsetAmountsRad)
+    if applyParallax:
+        if "parallax" not in catalog.schema:
+            log.warn("Parallax correction not available from catalog")
+        else:
+            log.debug("Correcting reference catalog for parallax at %r", epoch)
+            ra, dec = _applyParallax(ra, dec, catalog["parallax"], epoch)
+    catalog["coord_ra"] = ra
+    catalog["coord_dec"] = dec
     # Increase error in RA and Dec based on error in proper motion
     if "coord_raErr" in catalog.schema:
         catalog["coord_raErr"] = numpy.hypot(catalog["coord_raErr"],
@@ -1521,3 +2457,31 @@ def applyProperMotionsImpl(log, catalog, epoch):
     if "coord_decErr" in catalog.schema:
         catalog["coord_decErr"] = numpy.hypot(catalog["coord_decErr"],
                                               catalog["pm_decErr"]*timeDiffsYears)
+
+
+def _applyParallax(ra, dec, parallax, epoch):
+    """Correct arrays of barycentric ICRS coordinates for parallax, as seen
+    from the geocenter.
+
+    Parameters
+    ----------
+    ra, dec : `numpy.ndarray`
+        Barycentric right ascension and declination (rad).
+    parallax : `numpy.ndarray`
+        Parallax (rad); objects with a non-finite parallax are not moved.
+    epoch : `astropy.time.Time`
+        Epoch at which to compute the position of the Earth.
+
+    Returns
+    -------
+    ra, dec : `numpy.ndarray`
+        Geocentric right ascension, in [0, 2pi), and declination (rad).
+    """
+    earth = astropy.coordinates.get_body_barycentric("earth", epoch.tdb)
+    earthAu = earth.xyz.to(astropy.units.au).value
+    parallax = numpy.where(numpy.isfinite(parallax), parallax, 0.0)
+    # the distance of each object is 1/parallax AU, so in units of its
+    # distance its position relative to the Earth is its unit vector
+    # minus parallax times the position of the Earth in AU
+    vectors = _raDecToVectors(ra, dec) - parallax*earthAu[:, numpy.newaxis]
+    return _vectorsToRaDec(vectors)
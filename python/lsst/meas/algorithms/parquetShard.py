@@ -0,0 +1,168 @@
+# This file is part of meas_algorithms.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Reference catalog shards stored as Parquet files.
+
+Each field of the shard's `lsst.afw.table.Schema` is stored as one Parquet
+column of the same name (angles in radians, flags as booleans), and the
+scalar entries of the catalog metadata are stored as JSON in the Parquet
+key-value metadata. The schema itself is not stored: readers use the
+reference catalog's master schema.
+
+This requires ``pyarrow``, which is only imported when a Parquet shard is
+read or written.
+"""
+
+__all__ = ["PARQUET_EXTENSION", "writeParquetShard", "readParquetShard"]
+
+import json
+import os
+
+import numpy
+
+import lsst.afw.table as afwTable
+from lsst.daf.base import PropertyList
+
+# Extension of Parquet shard files, which replaces the ".fits" of the
+# butler's shard filenames
+PARQUET_EXTENSION = ".parq"
+
+# Key of the catalog metadata in the Parquet key-value metadata
+_METADATA_KEY = b"afw_metadata"
+
+
+def _importPyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet reference catalog shards require pyarrow: %s" % (e,)) from e
+    return pyarrow, pyarrow.parquet
+
+
+def writeParquetShard(catalog, filename, rowGroupSize=None, compression="zstd"):
+    """Write a reference catalog shard as a Parquet file, atomically.
+
+    Parameters
+    ----------
+    catalog : `lsst.afw.table.SimpleCatalog`
+        Contiguous catalog to write.
+    filename : `str`
+        Path of the Parquet file.
+    rowGroupSize : `int`, optional
+        Maximum number of rows per row group; by default a single row group
+        is written.
+    compression : `str`, optional
+        Parquet compression codec.
+
+    Raises
+    ------
+    TypeError
+        Raised if the schema has array fields, which are not supported.
+    """
+    pyarrow, parquet = _importPyarrow()
+    columns = {}
+    for item in catalog.schema:
+        field = item.field
+        typeString = field.getTypeString()
+        if typeString.startswith("Array"):
+            raise TypeError("Array field %s is not supported in Parquet shards" % (field.getName(),))
+        if typeString == "String":
+            columns[field.getName()] = [record.get(item.key) for record in catalog]
+        else:
+            columns[field.getName()] = catalog[item.key]
+    table = pyarrow.table(columns)
+    metadata = catalog.getMetadata()
+    if metadata is not None:
+        values = {name: metadata.getScalar(name) for name in metadata.names()}
+        table = table.replace_schema_metadata({_METADATA_KEY: json.dumps(values).encode()})
+    tmpFilename = filename + ".tmp"
+    parquet.write_table(table, tmpFilename, row_group_size=rowGroupSize, compression=compression)
+    os.replace(tmpFilename, filename)
+
+
+def readParquetShard(filename, schema, columns=None, rowRanges=None):
+    """Read a reference catalog shard from a Parquet file.
+
+    Only the requested columns, and the row groups holding the requested
+    rows, are read and decoded. The file is memory-mapped, and each column
+    is copied once, from the Arrow buffers into the catalog.
+
+    Parameters
+    ----------
+    filename : `str`
+        Path of the Parquet file.
+    schema : `lsst.afw.table.Schema`
+        Schema of the catalog to make, normally the master schema of the
+        reference catalog.
+    columns : iterable of `str`, optional
+        Names of the fields of ``schema`` to read; the other fields are left
+        at their default values. By default all fields are read.
+    rowRanges : `list` of `tuple` [`int`, `int`], optional
+        Sorted [first, one-past-last) ranges of rows to read; by default
+        all rows are read.
+
+    Returns
+    -------
+    catalog : `lsst.afw.table.SimpleCatalog`
+        Contiguous catalog with ``schema``.
+    """
+    pyarrow, parquet = _importPyarrow()
+    parquetFile = parquet.ParquetFile(filename, memory_map=True)
+    items = [item for item in schema if columns is None or item.field.getName() in columns]
+    names = [item.field.getName() for item in items]
+    if rowRanges is None:
+        table = parquetFile.read(columns=names)
+        rows = None
+    else:
+        # read only the row groups that hold the requested rows
+        groupSizes = [parquetFile.metadata.row_group(i).num_rows
+                      for i in range(parquetFile.metadata.num_row_groups)]
+        groupStarts = numpy.concatenate([[0], numpy.cumsum(groupSizes)]).astype(numpy.int64)
+        rows = numpy.concatenate([numpy.arange(start, end, dtype=numpy.int64)
+                                  for start, end in rowRanges] or [numpy.array([], dtype=numpy.int64)])
+        rowGroups = numpy.searchsorted(groupStarts, rows, side="right") - 1
+        groups = numpy.unique(rowGroups)
+        table = parquetFile.read_row_groups(groups.tolist(), columns=names)
+        # convert the row numbers to positions in the concatenated row groups
+        readSizes = groupStarts[groups + 1] - groupStarts[groups]
+        readStarts = numpy.concatenate([[0], numpy.cumsum(readSizes)[:-1]]).astype(numpy.int64)
+        position = numpy.searchsorted(groups, rowGroups)
+        rows = rows - groupStarts[rowGroups] + readStarts[position]
+
+    catalog = afwTable.SimpleCatalog(schema)
+    catalog.resize(table.num_rows if rows is None else len(rows))
+    for item, name in zip(items, names):
+        values = table.column(name).to_numpy()
+        if rows is not None:
+            values = values[rows]
+        if item.field.getTypeString() == "String":
+            for record, value in zip(catalog, values):
+                record.set(item.key, value)
+        else:
+            catalog[item.key] = values
+
+    metadata = PropertyList()
+    if table.schema.metadata and _METADATA_KEY in table.schema.metadata:
+        for name, value in json.loads(table.schema.metadata[_METADATA_KEY]).items():
+            metadata.set(name, value)
+    catalog.setMetadata(metadata)
+    return catalog
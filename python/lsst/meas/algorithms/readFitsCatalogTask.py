@@ -42,6 +42,12 @@ class ReadFitsCatalogConfig(pexConfig.Config):
         itemtype=str,
         default={},
     )
+    block_size = pexConfig.RangeField(
+        dtype=int,
+        default=1000000,
+        min=1,
+        doc="Maximum number of rows in each block returned by readBlocks.",
+    )
 
 ## @addtogroup LSST_task_documentation
 ## @{
@@ -99,20 +105,53 @@ class ReadFitsCatalogTask(pipeBase.Task):
         @return a numpy structured array containing the specified columns
         """
         with fits.open(filename) as f:
-            hdu = f[self.config.hdu]
-            if hdu.data is None:
-                raise RuntimeError("No data found in %s HDU %s" % (filename, self.config.hdu))
-            if hdu.is_image:
-                raise RuntimeError("%s HDU %s is an image" % (filename, self.config.hdu))
-
-            if not self.config.column_map:
-                # take the data as it is
-                return hdu.data
-
-            missingnames = set(self.config.column_map.keys()) - set(hdu.columns.names)
-            if missingnames:
-                raise RuntimeError("Columns %s in column_map were not found in %s" % (missingnames, filename))
-
-            for inname, outname in self.config.column_map.items():
-                hdu.columns[inname].name = outname
+            return self._getData(f, filename)
+
+    def readBlocks(self, filename):
+        """Read an object catalog from the specified FITS file in blocks of
+        at most ``config.block_size`` rows
+
+        The file is memory-mapped, and each block is copied out of the mapping,
+        so that memory use does not scale with the size of the file.
+
+        @param[in] filename  path to FITS file
+        @return a generator of numpy structured arrays containing the specified columns
+        """
+        with fits.open(filename, memmap=True) as f:
+            data = self._getData(f, filename)
+            for start in range(0, len(data), self.config.block_size):
+                yield data[start:start + self.config.block_size].copy()
+
+    def _getData(self, hduList, filename):
+        """Get the binary table data from an open FITS file, renaming columns
+        as specified by ``config.column_map``
+
+        @param[in] hduList  the opened FITS file
+        @param[in] filename  path to FITS file, for error messages
+        @return a numpy structured array containing the specified columns
+        """
+        hdu = hduList[self.config.hdu]
+        if hdu.data is None:
+            raise RuntimeError("No data found in %s HDU %s" % (filename, self.config.hdu))
+        if hdu.is_image:
+            raise RuntimeError("%s HDU %s is an image" % (filename, self.config.hdu))
+
+        if not self.config.column_map:
+            # take the data as it is
             return hdu.data
+
+        missingnames = set(self.config.column_map.keys()) - set(hdu.columns.names)
+        if missingnames:
+            raise RuntimeError("Columns %s in column_map were not found in %s" % (missingnames, filename))
+
+        for inname, outname in self.config.column_map.items():
+            hdu.columns[inname].name = outname
+        return hdu.data
+
+    def getRowCount(self, filename):
+        """Return the number of rows in a FITS table, read from its header
+
+        @param[in] filename  path to FITS file
+        @return the number of rows in the binary table
+        """
+        return fits.getheader(filename, self.config.hdu)['NAXIS2']
@@ -23,7 +23,14 @@
 
 __all__ = ["ReadTextCatalogConfig", "ReadTextCatalogTask"]
 
+import bz2
+import gzip
+import itertools
+import lzma
+import os.path
+
 import numpy as np
+from astropy.io.ascii import convert_numpy
 from astropy.table import Table
 
 import lsst.pex.config as pexConfig
@@ -54,6 +61,21 @@ class ReadTextCatalogConfig(pexConfig.Config):
         doc=("Format of files to read, from the astropy.table I/O list here:"
              "http://docs.astropy.org/en/stable/io/unified.html#built-in-table-readers-writers")
     )
+    block_size = pexConfig.RangeField(
+        dtype=int,
+        default=1000000,
+        min=1,
+        doc="Maximum number of rows in each block returned by readBlocks."
+    )
+    column_dtypes = pexConfig.DictField(
+        keytype=str,
+        itemtype=str,
+        default={},
+        doc="Mapping of column name: numpy dtype (e.g. 'f8' or 'U32') to read the column as, instead "
+            "of the type inferred from the data. The ingested schema is made from the first block read "
+            "by readBlocks, so set this for columns whose first rows are narrower than the rest, "
+            "e.g. integers in a float column or short strings."
+    )
 
 ## @addtogroup LSST_task_documentation
 ## @{
@@ -112,6 +134,9 @@ class ReadTextCatalogTask(pipeBase.Task):
     _DefaultName = 'readCatalog'
     ConfigClass = ReadTextCatalogConfig
 
+    # openers for the compressed formats that astropy.table reads transparently
+    _openers = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+
     def run(self, filename):
         """Read an object catalog from the specified text file
 
@@ -128,6 +153,146 @@ class ReadTextCatalogTask(pipeBase.Task):
             kwargs['header_start'] = self.config.header_lines
 
         # return a numpy array for backwards compatibility with other readers
-        return np.array(Table.read(filename, format=self.config.format,
-                                   delimiter=self.config.delimiter,
-                                   **kwargs).as_array())
+        return self._setColumnDtypes(np.array(Table.read(filename, format=self.config.format,
+                                                         delimiter=self.config.delimiter,
+                                                         **kwargs).as_array()))
+
+    def readBlocks(self, filename):
+        """Read an object catalog from the specified text file in blocks of
+        at most ``config.block_size`` rows, so that memory use does not scale
+        with the size of the file
+
+        Column types are inferred from the first block (which is what the
+        ingested schema is made from), unless set by ``config.column_dtypes``.
+        Later blocks are parsed as those types where they can be; a column of
+        a later block that holds wider strings, or non-integer values in an
+        integer column, is widened (with a warning), so later blocks may
+        have wider types than the first; the ingest refuses blocks whose
+        columns no longer fit the schema made from the first.
+
+        @param[in] filename  path to text file
+        @return a generator of numpy structured arrays containing the specified columns
+        @throw ValueError if a later block has different columns than the first, or a
+            column whose type cannot be widened to hold both blocks (e.g. strings in
+            a numeric column; set ``config.column_dtypes`` to avoid that)
+        """
+        kwargs = {}
+        if self.config.colnames:
+            kwargs['names'] = self.config.colnames
+            kwargs['data_start'] = 0
+        else:
+            kwargs['header_start'] = 0
+
+        opener = self._openers.get(os.path.splitext(filename)[1], open)
+        with opener(filename, 'rt', encoding='utf-8') as f:
+            for _ in itertools.islice(f, self.config.header_lines):
+                pass
+            header = [] if self.config.colnames else list(itertools.islice(f, 1))
+            dtype = None
+            firstLine = self.config.header_lines + len(header)
+            while True:
+                lines = list(itertools.islice(f, self.config.block_size))
+                if not lines:
+                    return
+                if dtype is None:
+                    block = self._setColumnDtypes(np.array(Table.read(header + lines,
+                                                                      format=self.config.format,
+                                                                      delimiter=self.config.delimiter,
+                                                                      **kwargs).as_array()))
+                    dtype = block.dtype
+                    converters = {name: [convert_numpy(dtype[name].type)] for name in dtype.names}
+                else:
+                    block = self._readBlock(header + lines, dtype, converters, kwargs,
+                                            "%s, lines %d-%d" % (filename, firstLine + 1,
+                                                                 firstLine + len(lines)))
+                firstLine += len(lines)
+                yield block
+
+    def _readBlock(self, lines, dtype, converters, kwargs, where):
+        """Parse a block of lines as the given dtype, widening the columns
+        that do not fit it
+
+        @param[in] lines  lines of text to parse, including any header line
+        @param[in] dtype  numpy dtype of the first block
+        @param[in] converters  astropy converters for the types of ``dtype``
+        @param[in] kwargs  other keyword arguments for astropy.table.Table.read
+        @param[in] where  description of the lines, for messages
+        @return a numpy structured array of type ``dtype``, or of a wider type
+        @throw ValueError if the lines do not have the columns of ``dtype``, or a
+            column cannot be widened to hold both its type in ``dtype`` and its values
+        """
+        try:
+            table = Table.read(lines, format=self.config.format, delimiter=self.config.delimiter,
+                               converters=converters, **kwargs)
+        except ValueError:
+            # some values do not parse as the types of the first block;
+            # infer the types of this block instead
+            table = Table.read(lines, format=self.config.format, delimiter=self.config.delimiter,
+                               **kwargs)
+        block = self._setColumnDtypes(np.array(table.as_array()))
+        if block.dtype.names != dtype.names:
+            raise ValueError("Columns %s of %s do not match the columns %s of the first block" %
+                             (block.dtype.names, where, dtype.names))
+        columnTypes = []
+        for name in dtype.names:
+            columnType = self._widenType(dtype[name], block.dtype[name])
+            if columnType is None:
+                raise ValueError("Column %s of %s has type %s, which cannot be combined with the type %s "
+                                 "of the first block; set column_dtypes" %
+                                 (name, where, block.dtype[name], dtype[name]))
+            if columnType != dtype[name]:
+                self.log.warn("Column %s of %s has type %s, wider than the type %s of the first block; "
+                              "the ingest will refuse it unless column_dtypes is set",
+                              name, where, block.dtype[name], dtype[name])
+            columnTypes.append((name, columnType))
+        return block.astype(columnTypes)
+
+    @staticmethod
+    def _widenType(firstType, blockType):
+        """Return the narrowest type that holds the values of a column in
+        the first block and in a later block
+
+        @param[in] firstType  numpy dtype of the column in the first block
+        @param[in] blockType  numpy dtype of the column in the later block
+        @return the combined numpy dtype, or None if a numeric and a string
+            type are combined
+        """
+        isNumeric = [t.kind in 'biuf' for t in (firstType, blockType)]
+        isString = [t.kind in 'US' for t in (firstType, blockType)]
+        if not (all(isNumeric) or all(isString)):
+            return None
+        return np.promote_types(firstType, blockType)
+
+    def _setColumnDtypes(self, array):
+        """Convert the columns listed in ``config.column_dtypes`` to their types
+
+        @param[in] array  numpy structured array, as read
+        @return ``array``, or a copy with the configured column types
+        @throw KeyError if ``config.column_dtypes`` names a missing column
+        """
+        if not self.config.column_dtypes:
+            return array
+        missing = set(self.config.column_dtypes) - set(array.dtype.names)
+        if missing:
+            raise KeyError("Columns %s in column_dtypes were not found" % (sorted(missing),))
+        return array.astype([(name, self.config.column_dtypes.get(name, array.dtype[name]))
+                             for name in array.dtype.names])
+
+    def getRowCount(self, filename):
+        """Return the number of rows in a text file, without parsing it.
+
+        The rows are counted as `readBlocks` reads them: after the skipped
+        header lines and the column name line (if ``config.colnames`` is
+        empty), each line that is not blank or a comment starting with "#"
+        is a row. The whole file is still read (and decompressed) to count
+        its lines, so this costs a large fraction of reading the file.
+
+        @param[in] filename  path to text file
+        @return the number of rows in the file
+        """
+        opener = self._openers.get(os.path.splitext(filename)[1], open)
+        nSkipped = self.config.header_lines + (0 if self.config.colnames else 1)
+        with opener(filename, 'rb') as f:
+            for _ in itertools.islice(f, nSkipped):
+                pass
+            return sum(1 for line in f if line.strip() and not line.lstrip().startswith(b'#'))
@@ -0,0 +1,158 @@
+# This file is part of meas_algorithms.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["ShardCache", "getSharedShardCache"]
+
+import collections
+import threading
+
+
+class ShardCache:
+    """A least-recently-used cache of decoded reference catalog shards,
+    limited by the total size of the cached catalogs.
+
+    Shards that do not exist are cached as `None`, so that their absence does
+    not need to be checked again.
+
+    Parameters
+    ----------
+    maxBytes : `int`
+        Maximum total size of the cached catalogs, in bytes.
+    """
+    def __init__(self, maxBytes):
+        self.maxBytes = maxBytes
+        self.nBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def getSize(catalog):
+        """Return the size of a catalog, in bytes.
+
+        Parameters
+        ----------
+        catalog : `lsst.afw.table.SimpleCatalog` or `None`
+            The catalog to measure.
+
+        Returns
+        -------
+        size : `int`
+            The size of the records of ``catalog``.
+        """
+        if catalog is None:
+            return 0
+        return len(catalog)*catalog.schema.getRecordSize()
+
+    def get(self, key, read):
+        """Get a shard from the cache, reading and caching it if needed.
+
+        Parameters
+        ----------
+        key : `tuple`
+            Key identifying the shard, e.g. (dataset name, catalog
+            identity, format version, pixel id).
+        read : callable
+            Called with no arguments to read the shard on a cache miss;
+            returns a `lsst.afw.table.SimpleCatalog`, or `None` if the shard
+            does not exist.
+
+        Returns
+        -------
+        catalog : `lsst.afw.table.SimpleCatalog` or `None`
+            A shallow copy of the cached shard: the container may be
+            modified, but its records are shared with the cache and must not
+            be.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._copy(self._entries[key])
+            self.misses += 1
+        # read outside the lock, so that other threads are not blocked
+        catalog = read()
+        self.put(key, catalog)
+        return self._copy(catalog)
+
+    def put(self, key, catalog):
+        """Add a shard to the cache, evicting the least recently used shards
+        as needed to stay within ``maxBytes``.
+
+        Parameters
+        ----------
+        key : `tuple`
+            Key identifying the shard.
+        catalog : `lsst.afw.table.SimpleCatalog` or `None`
+            The shard, or `None` if it does not exist.
+        """
+        size = self.getSize(catalog)
+        if size > self.maxBytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.nBytes -= self.getSize(self._entries.pop(key))
+            self._entries[key] = catalog
+            self.nBytes += size
+            while self.nBytes > self.maxBytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nBytes -= self.getSize(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all shards from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.nBytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _copy(catalog):
+        return None if catalog is None else catalog.copy(deep=False)
+
+
+_sharedShardCache = ShardCache(0)
+
+
+def getSharedShardCache(maxBytes):
+    """Return the shard cache shared by all reference object loaders in this
+    process.
+
+    Parameters
+    ----------
+    maxBytes : `int`
+        Requested size of the cache, in bytes; the cache is enlarged if it is
+        smaller than this, so it has the largest size requested by any
+        loader.
+
+    Returns
+    -------
+    cache : `ShardCache`
+        The process-wide cache.
+    """
+    if maxBytes > _sharedShardCache.maxBytes:
+        _sharedShardCache.maxBytes = maxBytes
+    return _sharedShardCache
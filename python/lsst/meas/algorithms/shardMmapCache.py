@@ -0,0 +1,195 @@
+# This file is part of meas_algorithms.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["ShardMmapCache", "catalogToArray", "arrayToCatalog"]
+
+import fcntl
+import os
+import threading
+
+import numpy
+
+import lsst.afw.table as afwTable
+
+
+def catalogToArray(catalog):
+    """Convert a catalog to a numpy structured array with one field per
+    schema field.
+
+    Angles are stored in radians and flags as booleans.
+
+    Parameters
+    ----------
+    catalog : `lsst.afw.table.SimpleCatalog`
+        Contiguous catalog to convert.
+
+    Returns
+    -------
+    array : `numpy.ndarray`
+        Structured array with one row per record of ``catalog``.
+
+    Raises
+    ------
+    TypeError
+        Raised if the schema has array fields, which are not supported.
+    """
+    names = []
+    columns = []
+    for item in catalog.schema:
+        field = item.field
+        typeString = field.getTypeString()
+        if typeString.startswith("Array"):
+            raise TypeError("Array field %s is not supported in the shard mmap cache" % (field.getName(),))
+        names.append(field.getName())
+        if typeString == "String":
+            columns.append(numpy.array([record.get(item.key).encode() for record in catalog],
+                                       dtype="S%d" % max(field.getSize(), 1)))
+        else:
+            columns.append(numpy.asarray(catalog[item.key]))
+    if not names:
+        return numpy.zeros(len(catalog), dtype=[])
+    return numpy.rec.fromarrays(columns, names=names).view(numpy.ndarray)
+
+
+def arrayToCatalog(array, schema, columns=None, rows=None):
+    """Copy some rows and columns of a structured array to a catalog.
+
+    Parameters
+    ----------
+    array : `numpy.ndarray`
+        Structured array, as returned by `catalogToArray`; may be
+        memory-mapped.
+    schema : `lsst.afw.table.Schema`
+        Schema of the catalog to make.
+    columns : iterable of `str`, optional
+        Names of the only fields of ``schema`` to copy; the other fields are
+        left at their default values. By default all fields are copied.
+    rows : `numpy.ndarray` of `int`, optional
+        Indices of the rows to copy; by default all rows are copied.
+
+    Returns
+    -------
+    catalog : `lsst.afw.table.SimpleCatalog`
+        Contiguous catalog with ``schema``.
+    """
+    catalog = afwTable.SimpleCatalog(schema)
+    catalog.resize(len(array) if rows is None else len(rows))
+    for item in schema:
+        name = item.field.getName()
+        if columns is not None and name not in columns:
+            continue
+        values = array[name] if rows is None else array[name][rows]
+        if item.field.getTypeString() == "String":
+            for record, value in zip(catalog, values):
+                record.set(item.key, value.decode())
+        else:
+            catalog[item.key] = values
+    return catalog
+
+
+class ShardMmapCache:
+    """A cache of decoded reference catalog shards in a directory shared by
+    all the processes of a node.
+
+    Each shard is decoded once per node, by whichever process first needs
+    it, and saved as a numpy structured array. Processes then memory-map
+    these files read-only, so the decoded columns are held once, in the
+    operating system's page cache, however many processes use them; each
+    process only copies the rows and columns it returns.
+
+    Parameters
+    ----------
+    directory : `str`
+        Directory holding the cache files; created if needed. The files are
+        never invalidated, so the directory must be cleared if a reference
+        catalog is re-ingested.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def getPath(self, key):
+        """Return the path of the cache file of a shard.
+
+        Parameters
+        ----------
+        key : `tuple`
+            Key identifying the shard, e.g. (dataset name, catalog
+            identity, format version, pixel id).
+
+        Returns
+        -------
+        path : `str`
+            Path of the cache file.
+        """
+        return os.path.join(self.directory, "_".join(str(part) for part in key) + ".npy")
+
+    def get(self, key, read):
+        """Memory-map a cached shard, decoding and caching it if needed.
+
+        Parameters
+        ----------
+        key : `tuple`
+            Key identifying the shard.
+        read : callable
+            Called with no arguments to read the shard if it is not cached;
+            returns a `lsst.afw.table.SimpleCatalog`, or `None` if the shard
+            does not exist.
+
+        Returns
+        -------
+        array : `numpy.ndarray` or `None`
+            Read-only memory-mapped structured array holding the shard, as
+            returned by `catalogToArray`, or `None` if the shard does not
+            exist.
+        """
+        path = self.getPath(key)
+        missingPath = path + ".missing"
+        if not os.path.exists(path) and not os.path.exists(missingPath):
+            # only one process of the node decodes each shard; the others
+            # wait for it, then map its file
+            with open(path + ".lock", "w") as lockFile:
+                fcntl.flock(lockFile, fcntl.LOCK_EX)
+                if not os.path.exists(path) and not os.path.exists(missingPath):
+                    with self._lock:
+                        self.misses += 1
+                    self._write(path, missingPath, read())
+        else:
+            with self._lock:
+                self.hits += 1
+        if os.path.exists(missingPath):
+            return None
+        return numpy.load(path, mmap_mode="r")
+
+    @staticmethod
+    def _write(path, missingPath, catalog):
+        """Write the cache file of a shard atomically.
+        """
+        if catalog is None:
+            open(missingPath, "w").close()
+            return
+        tmpPath = "%s.%d.%d.tmp" % (path, os.getpid(), threading.get_ident())
+        with open(tmpPath, "wb") as f:
+            numpy.save(f, catalogToArray(catalog))
+        os.replace(tmpPath, path)
@@ -0,0 +1,182 @@
+# This file is part of meas_algorithms.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Sub-indexes of reference catalog shards.
+
+A shard whose rows are sorted by the ID of a finer HTM trixel has a sidecar
+file holding, for each of those sub-trixels, its ID and the range of rows it
+occupies. A loader can then read only the rows of the sub-trixels that touch
+its search region.
+"""
+
+__all__ = ["getSubIndexPath", "makeSubIndex", "writeSubIndex", "readSubIndex", "selectRowRanges",
+           "readFitsRows"]
+
+import os
+
+import astropy.io.fits
+import numpy
+
+import lsst.afw.fits
+import lsst.afw.table as afwTable
+
+
+def getSubIndexPath(path):
+    """Return the path of the sub-index of a shard.
+
+    Parameters
+    ----------
+    path : `str`
+        Path of the shard FITS file.
+
+    Returns
+    -------
+    subIndexPath : `str`
+        Path of the sidecar file holding the sub-index.
+    """
+    return os.path.splitext(path)[0] + "_subindex.npy"
+
+
+def makeSubIndex(subIds):
+    """Make the sub-index of a sorted shard.
+
+    Parameters
+    ----------
+    subIds : `numpy.ndarray` of `int`
+        Sorted sub-trixel ID of each row of the shard.
+
+    Returns
+    -------
+    subIndex : `numpy.ndarray` of `int`
+        Array of shape (N, 3) with, for each sub-trixel holding rows, its ID
+        and the first and one-past-last rows it occupies.
+    """
+    subIds = numpy.asarray(subIds, dtype=numpy.int64)
+    uniqueIds, starts = numpy.unique(subIds, return_index=True)
+    ends = numpy.append(starts[1:], len(subIds))
+    return numpy.stack([uniqueIds, starts, ends], axis=1).astype(numpy.int64).reshape(-1, 3)
+
+
+def writeSubIndex(path, subIds):
+    """Write the sub-index of a sorted shard atomically.
+
+    Parameters
+    ----------
+    path : `str`
+        Path of the shard FITS file.
+    subIds : `numpy.ndarray` of `int`
+        Sorted sub-trixel ID of each row of the shard.
+    """
+    subIndexPath = getSubIndexPath(path)
+    with open(subIndexPath + ".tmp", "wb") as f:
+        numpy.save(f, makeSubIndex(subIds))
+    os.replace(subIndexPath + ".tmp", subIndexPath)
+
+
+def readSubIndex(path):
+    """Read the sub-index of a shard.
+
+    Parameters
+    ----------
+    path : `str`
+        Path of the shard FITS file.
+
+    Returns
+    -------
+    subIndex : `numpy.ndarray` of `int` or `None`
+        The sub-index, as returned by `makeSubIndex`, or `None` if the shard
+        has no sub-index.
+    """
+    subIndexPath = getSubIndexPath(path)
+    if not os.path.exists(subIndexPath):
+        return None
+    return numpy.load(subIndexPath)
+
+
+def selectRowRanges(subIndex, envelope):
+    """Select the rows of the sub-trixels that overlap a region.
+
+    Parameters
+    ----------
+    subIndex : `numpy.ndarray` of `int`
+        Sub-index of a shard, as returned by `makeSubIndex`.
+    envelope : `numpy.ndarray` of `int`
+        Array of shape (M, 2) of sorted, disjoint [begin, end) ranges of
+        sub-trixel IDs that overlap the region, e.g. from
+        `lsst.sphgeom.HtmPixelization.envelope`.
+
+    Returns
+    -------
+    rowRanges : `list` of `tuple` [`int`, `int`]
+        Sorted, merged [first, one-past-last) row ranges.
+    """
+    if len(envelope) == 0:
+        return []
+    index = numpy.searchsorted(envelope[:, 0], subIndex[:, 0], side="right") - 1
+    inside = (index >= 0) & (subIndex[:, 0] < envelope[numpy.maximum(index, 0), 1])
+    rowRanges = []
+    for start, end in subIndex[inside, 1:].tolist():
+        if rowRanges and rowRanges[-1][1] == start:
+            rowRanges[-1] = (rowRanges[-1][0], end)
+        else:
+            rowRanges.append((start, end))
+    return rowRanges
+
+
+def readFitsRows(path, rowRanges):
+    """Read some rows of a catalog FITS file.
+
+    Only the header and the requested rows of the binary table are read; they
+    are assembled into an in-memory FITS file that afw reads as usual, so the
+    schema, flags and metadata are the same as for a full read.
+
+    Parameters
+    ----------
+    path : `str`
+        Path of the catalog FITS file, as written by afw.
+    rowRanges : `list` of `tuple` [`int`, `int`]
+        Sorted [first, one-past-last) ranges of rows to read.
+
+    Returns
+    -------
+    catalog : `lsst.afw.table.SimpleCatalog` or `None`
+        The requested rows, or `None` if the table has a heap (variable
+        length columns), in which case the rows cannot be read separately.
+    """
+    with astropy.io.fits.open(path, lazy_load_hdus=True) as hduList:
+        header = hduList[1].header.copy()
+        fileInfo = hduList.fileinfo(1)
+    if header.get("PCOUNT", 0) != 0:
+        return None
+    rowSize = header["NAXIS1"]
+    with open(path, "rb") as f:
+        primary = f.read(fileInfo["hdrLoc"])
+        chunks = []
+        for start, end in rowRanges:
+            f.seek(fileInfo["datLoc"] + start*rowSize)
+            chunks.append(f.read((end - start)*rowSize))
+    data = b"".join(chunks)
+    header["NAXIS2"] = len(data)//rowSize
+    padding = b"\0"*(-len(data) % 2880)
+    fitsBytes = primary + header.tostring().encode("ascii") + data + padding
+    manager = lsst.afw.fits.MemFileManager(len(fitsBytes))
+    manager.setData(fitsBytes, len(fitsBytes))
+    return afwTable.SimpleCatalog.readFits(manager)
@@ -1,12 +1,14 @@
 
 __all__ = ["SkyObjectsConfig", "SkyObjectsTask", "generateSkyObjects"]
 
+import numpy as np
+
 from lsst.pex.config import Config, Field, ListField
 from lsst.pipe.base import Task
 
 import lsst.afw.detection
 import lsst.afw.geom
-import lsst.afw.math
+import lsst.afw.image
 
 
 class SkyObjectsConfig(Config):
@@ -18,7 +20,8 @@ class SkyObjectsConfig(Config):
     sourceRadius = Field(dtype=float, default=8, doc="Radius, in pixels, of sky objects")
     nSources = Field(dtype=int, default=100, doc="Try to add this many sky objects")
     nTrialSources = Field(dtype=int, default=None, optional=True,
-                          doc="Maximum number of trial sky object positions\n"
+                          doc="Maximum number of trial sky object positions, drawn from those clear of "
+                              "the avoided pixels\n"
                               "(default: nSkySources*nTrialSkySourcesMultiplier)")
     nTrialSourcesMultiplier = Field(dtype=int, default=5,
                                     doc="Set nTrialSkySources to\n"
@@ -33,9 +36,11 @@ def generateSkyObjects(mask, seed, config):
     through the provided `mask` (in which objects are typically flagged
     as `DETECTED`).
 
-    The algorithm for determining sky objects is random trial and error:
-    we try up to `nTrialSkySources` random positions to find `nSources`
-    sky objects.
+    The pixels to avoid are dilated by the sky object circle, in one pass
+    over the mask, to give the centers at which a sky object would not
+    overlap them. Up to `nTrialSkySources` random positions are drawn
+    from these free centers in bulk, and are kept, in order, if they don't
+    overlap a sky object already kept, until `nSources` are found.
 
     Parameters
     ----------
@@ -56,37 +61,68 @@ def generateSkyObjects(mask, seed, config):
     if config.nSources <= 0:
         return []
 
-    skySourceRadius = config.sourceRadius
+    skySourceRadius = int(config.sourceRadius)
     nSkySources = config.nSources
     nTrialSkySources = config.nTrialSources
     if nTrialSkySources is None:
         nTrialSkySources = config.nTrialSourcesMultiplier*nSkySources
 
     box = mask.getBBox()
-    box.grow(-(int(skySourceRadius) + 1))  # Avoid objects partially off the image
-    xMin, yMin = box.getMin()
-    xMax, yMax = box.getMax()
+    box.grow(-(skySourceRadius + 1))  # Avoid objects partially off the image
+    if box.isEmpty():
+        return []
 
     avoid = lsst.afw.geom.SpanSet.fromMask(mask, mask.getPlaneBitMask(config.avoidMask))
     if config.growMask > 0:
         avoid = avoid.dilated(config.growMask)
 
-    rng = lsst.afw.math.Random(seed=seed)
+    # A sky object overlaps the avoided pixels if and only if its center is
+    # in the avoided pixels dilated by its circle
+    blocked = lsst.afw.image.Mask(box)
+    blocked.set(0)
+    avoid.dilated(skySourceRadius).clippedTo(box).setMask(blocked, 1)
+    free = blocked.array == 0
+    rowCounts = free.sum(axis=1)
+    rowEnds = np.cumsum(rowCounts)
+    numFree = rowEnds[-1]
+    if numFree == 0:
+        return []
 
+    # Two sky objects overlap if and only if the offset between their
+    # centers is in their circle dilated by their circle
+    exclusion = lsst.afw.geom.SpanSet.fromShape(skySourceRadius).dilated(skySourceRadius)
+    exclusionY, exclusionX = exclusion.indices()
+    exclusionY = np.asarray(exclusionY)
+    exclusionX = np.asarray(exclusionX)
+    occupied = np.zeros_like(free)
+
+    rng = np.random.RandomState(seed)
+    height, width = free.shape
+    x0, y0 = box.getMin()
     skyFootprints = []
-    for _ in range(nTrialSkySources):
-        if len(skyFootprints) == nSkySources:
-            break
-
-        x = int(rng.flat(xMin, xMax))
-        y = int(rng.flat(yMin, yMax))
-        spans = lsst.afw.geom.SpanSet.fromShape(int(skySourceRadius), offset=(x, y))
-        if spans.overlaps(avoid):
-            continue
-
-        fp = lsst.afw.detection.Footprint(spans, mask.getBBox())
-        fp.addPeak(x, y, 0)
-        skyFootprints.append(fp)
+    nTrials = 0
+    while len(skyFootprints) < nSkySources and nTrials < nTrialSkySources:
+        nDraws = min(nTrialSkySources - nTrials, 2*(nSkySources - len(skyFootprints)))
+        nTrials += nDraws
+        draws = rng.randint(numFree, size=nDraws)
+        rows = np.searchsorted(rowEnds, draws, side="right")
+        for row, index in zip(rows, draws - (rowEnds[rows] - rowCounts[rows])):
+            col = np.flatnonzero(free[row])[index]
+            if occupied[row, col]:
+                continue
+            yy = row + exclusionY
+            xx = col + exclusionX
+            inside = (yy >= 0) & (yy < height) & (xx >= 0) & (xx < width)
+            occupied[yy[inside], xx[inside]] = True
+
+            x = int(col + x0)
+            y = int(row + y0)
+            spans = lsst.afw.geom.SpanSet.fromShape(skySourceRadius, offset=(x, y))
+            fp = lsst.afw.detection.Footprint(spans, mask.getBBox())
+            fp.addPeak(x, y, 0)
+            skyFootprints.append(fp)
+            if len(skyFootprints) == nSkySources:
+                break
 
     return skyFootprints
 
@@ -101,9 +137,10 @@ class SkyObjectsTask(Task):
         through the provided `mask` (in which objects are typically flagged
         as `DETECTED`).
 
-        The algorithm for determining sky objects is random trial and error:
-        we try up to `nTrialSkySources` random positions to find `nSources`
-        sky objects.
+        Sky objects are placed at random among the positions where they
+        don't overlap the pixels to avoid or each other; up to
+        `nTrialSkySources` positions are tried to find `nSources` sky
+        objects.
 
         Parameters
         ----------
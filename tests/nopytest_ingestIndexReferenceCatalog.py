@@ -68,6 +68,116 @@ class TestIngestReferenceCatalogParallel(ingestIndexTestBase.IngestIndexCatalogT
         self.checkAllRowsInRefcat(loader, skyCatalog1)
         self.checkAllRowsInRefcat(loader, skyCatalog2)
 
+    def testIngestTwoFilesTwoCoresTwoPhase(self):
+        """Test a two-phase (scatter then gather) parallel ingest."""
+        inPath1 = tempfile.mkdtemp()
+        skyCatalogFile1, _, skyCatalog1 = self.makeSkyCatalog(inPath1, idStart=25, seed=123)
+        inPath2 = tempfile.mkdtemp()
+        skyCatalogFile2, _, skyCatalog2 = self.makeSkyCatalog(inPath2, idStart=5432, seed=11)
+        config = self.makeConfig(withRaDecErr=True, withMagErr=True, withPm=True, withPmErr=True)
+        config.dataset_config.indexer.active.depth = 2
+        config.file_reader.format = 'ascii.commented_header'
+        config.n_processes = 2
+        config.id_name = 'id'
+        config.two_phase = True
+        outpath = os.path.join(self.outPath, "output_multifile_two_phase")
+        IngestIndexedReferenceTask.parseAndRun(
+            args=[self.input_dir, "--output", outpath,
+                  skyCatalogFile1, skyCatalogFile2], config=config)
+
+        # the spill files are removed once the ingest completes
+        refcatDir = os.path.join(outpath, "ref_cats", config.dataset_config.ref_dataset_name)
+        self.assertFalse(os.path.exists(os.path.join(refcatDir, "ingest_spill")))
+
+        butler = dafPersist.Butler(outpath)
+        loader = LoadIndexedReferenceObjectsTask(butler=butler, config=LoadIndexedReferenceObjectsConfig())
+        self.checkAllRowsInRefcat(loader, skyCatalog1)
+        self.checkAllRowsInRefcat(loader, skyCatalog2)
+
+    def testIngestTwoPhaseResume(self):
+        """Test that an interrupted two-phase ingest, rerun with the same
+        inputs, gives the same shards as an uninterrupted ingest, and that
+        it refuses to resume with reordered inputs.
+        """
+        inPath1 = tempfile.mkdtemp()
+        skyCatalogFile1, _, _ = self.makeSkyCatalog(inPath1, idStart=25, seed=123)
+        inPath2 = tempfile.mkdtemp()
+        skyCatalogFile2, _, _ = self.makeSkyCatalog(inPath2, idStart=5432, seed=11)
+        config = self.makeConfig(withRaDecErr=True, withMagErr=True)
+        config.dataset_config.indexer.active.depth = 2
+        config.file_reader.format = 'ascii.commented_header'
+        config.n_processes = 2
+        # ids are numbered from the offset of each file
+        config.id_name = None
+        config.two_phase = True
+        inputFiles = [skyCatalogFile1, skyCatalogFile2]
+
+        def ingest(outpath, inputFiles):
+            IngestIndexedReferenceTask.parseAndRun(
+                args=[self.input_dir, "--output", outpath, "--doraise"] + inputFiles, config=config)
+            return os.path.join(outpath, "ref_cats", config.dataset_config.ref_dataset_name)
+
+        expectedDir = ingest(os.path.join(self.outPath, "output_two_phase_once"), inputFiles)
+
+        scatterOneFile = IngestIndexManager._scatterOneFile
+
+        def scatterFirstFile(self, filename, fileIndex, spillDir):
+            if fileIndex > 0:
+                raise RuntimeError("Interrupted")
+            return scatterOneFile(self, filename, fileIndex, spillDir)
+
+        outpath = os.path.join(self.outPath, "output_two_phase_resumed")
+        with unittest.mock.patch.object(IngestIndexManager, "_scatterOneFile", scatterFirstFile):
+            with self.assertRaises(RuntimeError):
+                ingest(outpath, inputFiles)
+        with self.assertRaises(RuntimeError):
+            ingest(outpath, inputFiles[::-1])
+        refcatDir = ingest(outpath, inputFiles)
+
+        shards = sorted(name for name in os.listdir(expectedDir) if name.endswith(".fits"))
+        self.assertEqual(sorted(name for name in os.listdir(refcatDir) if name.endswith(".fits")), shards)
+        ids = []
+        for name in shards:
+            expected = lsst.afw.table.SimpleCatalog.readFits(os.path.join(expectedDir, name))
+            catalog = lsst.afw.table.SimpleCatalog.readFits(os.path.join(refcatDir, name))
+            np.testing.assert_equal(catalog['id'], expected['id'])
+            self.assertFloatsEqual(catalog['coord_ra'], expected['coord_ra'])
+            self.assertFloatsEqual(catalog['coord_dec'], expected['coord_dec'])
+            ids.extend(catalog['id'])
+        # the rows are counted as they are scattered, so the ids are consecutive
+        self.assertEqual(sorted(ids), list(range(len(ids))))
+
+    def testIngestSinglePhaseIds(self):
+        """Test that a single-phase ingest without an id column numbers the
+        rows consecutively, with the same ids as a two-phase ingest.
+        """
+        inPath1 = tempfile.mkdtemp()
+        skyCatalogFile1, _, _ = self.makeSkyCatalog(inPath1, idStart=25, seed=123)
+        inPath2 = tempfile.mkdtemp()
+        skyCatalogFile2, _, _ = self.makeSkyCatalog(inPath2, idStart=5432, seed=11)
+        config = self.makeConfig(withRaDecErr=True, withMagErr=True)
+        config.dataset_config.indexer.active.depth = 2
+        config.file_reader.format = 'ascii.commented_header'
+        config.n_processes = 2
+        config.id_name = None
+
+        def ingest(outpath, twoPhase):
+            config.two_phase = twoPhase
+            IngestIndexedReferenceTask.parseAndRun(
+                args=[self.input_dir, "--output", outpath, "--doraise", skyCatalogFile1, skyCatalogFile2],
+                config=config)
+            refcatDir = os.path.join(outpath, "ref_cats", config.dataset_config.ref_dataset_name)
+            ids = {}
+            for name in os.listdir(refcatDir):
+                if name.endswith(".fits") and name != "master_schema.fits":
+                    catalog = lsst.afw.table.SimpleCatalog.readFits(os.path.join(refcatDir, name))
+                    ids.update(zip(zip(catalog['coord_ra'], catalog['coord_dec']), catalog['id']))
+            return ids
+
+        ids = ingest(os.path.join(self.outPath, "output_single_phase_ids"), False)
+        self.assertEqual(sorted(ids.values()), list(range(len(ids))))
+        self.assertEqual(ingest(os.path.join(self.outPath, "output_two_phase_ids"), True), ids)
+
 
 class TestIngestIndexManager(ingestIndexTestBase.IngestIndexCatalogTestBase,
                              lsst.utils.tests.TestCase):
@@ -140,7 +250,7 @@ class TestIngestIndexManager(ingestIndexTestBase.IngestIndexCatalogTestBase,
         catalog = self._createFakeCatalog(nOld=nOld, nNew=nNew)
         self.worker.getCatalog = unittest.mock.Mock(self.worker.getCatalog, return_value=catalog)
 
-        self.worker._doOnePixel(self.fakeInput, self.matchedPixels, pixelId, {})
+        self.worker._doOnePixel(self.fakeInput, self.matchedPixels, pixelId, {}, self.fakeInput['id'])
         newcat = lsst.afw.table.SimpleCatalog.readFits(self.filenames[pixelId])
 
         # check that the "pre" catalog is unchanged, exactly
@@ -163,7 +273,7 @@ class TestIngestIndexManager(ingestIndexTestBase.IngestIndexCatalogTestBase,
         catalog = self._createFakeCatalog(nOld=nOld, nNew=nNew)
         self.worker.getCatalog = unittest.mock.Mock(self.worker.getCatalog, return_value=catalog)
 
-        self.worker._doOnePixel(self.fakeInput, self.matchedPixels, pixelId, {})
+        self.worker._doOnePixel(self.fakeInput, self.matchedPixels, pixelId, {}, self.fakeInput['id'])
         newcat = lsst.afw.table.SimpleCatalog.readFits(self.filenames[pixelId])
 
         # check that the new catalog elements are set correctly
@@ -172,6 +282,82 @@ class TestIngestIndexManager(ingestIndexTestBase.IngestIndexCatalogTestBase,
         self.assertFloatsAlmostEqual(newcat['coord_ra'], newElements['ra_icrs']*np.pi/180)
         self.assertFloatsAlmostEqual(newcat['coord_dec'], newElements['dec_icrs']*np.pi/180)
 
+    def test_fillColumns(self):
+        """Test that the columnar fill sets coordinates and their errors."""
+        catalog = self._createFakeCatalog(nOld=0, nNew=len(self.fakeInput))
+        self.worker._fillColumns(catalog, self.fakeInput)
+
+        self.assertFloatsAlmostEqual(catalog['coord_ra'], np.radians(self.fakeInput['ra_icrs']))
+        self.assertFloatsAlmostEqual(catalog['coord_dec'], np.radians(self.fakeInput['dec_icrs']))
+        self.assertFloatsAlmostEqual(catalog['coord_raErr'], np.radians(self.fakeInput['ra_err']))
+        self.assertFloatsAlmostEqual(catalog['coord_decErr'], np.radians(self.fakeInput['dec_err']))
+        for record, row in zip(catalog, self.fakeInput):
+            self.assertSpherePointsAlmostEqual(
+                record.getCoord(), self.worker.computeCoord(row, 'ra_icrs', 'dec_icrs'))
+
+    def test_getIds(self):
+        """Test that ids are numbered from the reserved offset when there is
+        no id column, independently of any other file.
+        """
+        np.testing.assert_equal(self.worker._getIds(self.fakeInput, 0), self.fakeInput['id'])
+        self.config.id_name = None
+        np.testing.assert_equal(self.worker._getIds(self.fakeInput, 100), np.arange(100, 105))
+        np.testing.assert_equal(self.worker._getIds(self.fakeInput[:2], 100), np.arange(100, 102))
+
+    def test_checkColumnTypes(self):
+        """Test that blocks whose extra columns do not fit the schema made
+        from the first block are refused, instead of being truncated.
+        """
+        self.config.extra_col_names = ['count', 'name']
+        dtype = [('id', '<f8'), ('count', '<i8'), ('name', '<U3')]
+        schema, key_map = IngestIndexedReferenceTask(self.config).makeSchema(dtype)
+        worker = IngestIndexManager(self.filenames, self.config, self.fileReader, self.indexer,
+                                    schema, key_map, self.htm.universe()[0], addRefCatMetadata, self.log)
+        block = np.array([(1, 30, 'abc')], dtype=[('id', '<f8'), ('count', '<i4'), ('name', '<U5')])
+        worker._checkColumnTypes(block, "fits.csv")
+        block = np.array([(1, 30.5, 'abc')], dtype=[('id', '<f8'), ('count', '<f8'), ('name', '<U3')])
+        with self.assertRaisesRegex(ValueError, "column_dtypes"):
+            worker._checkColumnTypes(block, "float.csv")
+        # the string field holds the 12 bytes of the first block's <U3 column
+        name = 'abcdefghijklm'
+        block = np.array([(1, 30, name)], dtype=[('id', '<f8'), ('count', '<i8'), ('name', '<U13')])
+        with self.assertRaisesRegex(ValueError, "column_dtypes"):
+            worker._checkColumnTypes(block, "long.csv")
+
+    def test_manifest(self):
+        """Test that the two-phase ingest manifest round-trips, ignoring a
+        partially written last line.
+        """
+        manifestPath = os.path.join(self.path, "manifest.txt")
+        self.assertEqual(self.worker._readManifest(manifestPath), (None, {}, set()))
+        digest = self.worker._getInputsDigest(["/some/input.csv", "/other/input.csv"])
+        self.worker._appendManifest(manifestPath, "inputs", digest)
+        self.worker._appendManifest(manifestPath, "file", "12\t/some/input.csv")
+        self.worker._appendManifest(manifestPath, "pixel", 3)
+        with open(manifestPath, "a") as f:
+            f.write("pixel\t4")
+        self.assertEqual(self.worker._readManifest(manifestPath), (digest, {"/some/input.csv": 12}, {3}))
+        # the digest depends on the order of the input files
+        self.assertNotEqual(self.worker._getInputsDigest(["/other/input.csv", "/some/input.csv"]), digest)
+
+    def test_writeCatalog(self):
+        """Test that catalogs are written without leaving temporary files."""
+        catalog = self._createFakeCatalog(nOld=5)
+        self.worker._writeCatalog(catalog, self.filenames[1])
+        np.testing.assert_equal(lsst.afw.table.SimpleCatalog.readFits(self.filenames[1])['id'], catalog['id'])
+        self.assertEqual(os.listdir(self.path), [os.path.basename(self.filenames[1])])
+
+    def test_refuseExistingOutputs(self):
+        """Test that a single-phase ingest refuses to append to existing
+        output files.
+        """
+        self.assertEqual(self.worker._findExistingOutputs(), [])
+        self._createFakeCatalog(nOld=5).writeFits(self.filenames[2])
+        self.assertEqual(self.worker._findExistingOutputs(), [self.filenames[2]])
+        self.config.two_phase = False
+        with self.assertRaises(RuntimeError):
+            self.worker.run([os.path.join(self.path, "unread.csv")])
+
     def test_getCatalog(self):
         """Test that getCatalog returns a properly expanded new catalog."""
         pixelId = 3
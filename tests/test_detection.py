@@ -21,9 +21,11 @@
 # see <https://www.lsstcorp.org/LegalNotices/>.
 #
 import unittest
+import unittest.mock
 import numpy as np
 
 import lsst.geom
+import lsst.afw.detection as afwDet
 import lsst.afw.table as afwTable
 import lsst.afw.image as afwImage
 from lsst.meas.algorithms import SourceDetectionTask
@@ -127,6 +129,79 @@ class DetectionTestCase(lsst.utils.tests.TestCase):
         checkExposure(original, False, True)
         checkExposure(original, True, True)
 
+    def testSmoothingEngines(self):
+        """Test that the smoothing engines agree with the separable
+        convolution"""
+        bbox = lsst.geom.Box2I(lsst.geom.Point2I(256, 100), lsst.geom.Extent2I(128, 127))
+        coordList = self.makeCoordList(bbox=bbox, numX=5, numY=5, minCounts=5000, maxCounts=50000,
+                                       sigma=1.5)
+        original = plantSources(bbox=bbox, kwid=11, sky=2000, coordList=coordList, addPoissonNoise=True)
+        original.mask.array[10, 20] = original.mask.getPlaneBitMask("BAD")
+
+        def convolve(smoothingEngine, doSmoothVariance=True):
+            config = SourceDetectionTask.ConfigClass()
+            config.reEstimateBackground = False
+            config.smoothingEngine = smoothingEngine
+            config.doSmoothVariance = doSmoothVariance
+            task = SourceDetectionTask(config=config, schema=afwTable.SourceTable.makeMinimalSchema())
+            exposure = original.clone()
+            middle = task.convolveImage(exposure.maskedImage, task.getPsf(exposure, sigma=2.2)).middle
+            exposure = original.clone()
+            exposure.image -= 2000
+            return middle, task.detectFootprints(exposure, sigma=2.2)
+
+        expected, expectedResults = convolve("separable")
+        for smoothingEngine in ("fft", "recursive"):
+            middle, results = convolve(smoothingEngine)
+            self.assertImagesEqual(middle.mask, expected.mask)
+            self.assertEqual(results.numPos, expectedResults.numPos)
+            if smoothingEngine == "fft":
+                self.assertImagesAlmostEqual(middle.image, expected.image, rtol=1e-5)
+                self.assertImagesAlmostEqual(middle.variance, expected.variance, rtol=1e-5)
+            else:
+                self.assertFloatsAlmostEqual(middle.image.array, expected.image.array, rtol=1e-3)
+                self.assertFloatsAlmostEqual(middle.variance.array, expected.variance.array, rtol=1e-3)
+
+        for smoothingEngine in ("separable", "fft", "recursive"):
+            middle, _ = convolve(smoothingEngine, doSmoothVariance=False)
+            self.assertImagesEqual(middle.mask, expected.mask)
+            unsmoothed = original.maskedImage.Factory(original.maskedImage, middle.getBBox(), afwImage.PARENT)
+            self.assertImagesEqual(middle.variance, unsmoothed.variance)
+
+    def testUpdatePeaks(self):
+        """Test that peaks are replaced by those detected in the image"""
+        bbox = lsst.geom.Box2I(lsst.geom.Point2I(256, 100), lsst.geom.Extent2I(128, 127))
+        image = afwImage.MaskedImageF(bbox)
+        image.mask.set(0)
+        image.variance.set(1.0)
+        yy, xx = np.mgrid[:bbox.getHeight(), :bbox.getWidth()]
+        blobs = [(30, 30, 100.0), (38, 30, 60.0), (90, 90, 100.0), (97, 90, 80.0)]
+        image.image.array[:] = sum(amplitude*np.exp(-0.5*((xx - x)**2 + (yy - y)**2)/2.0**2)
+                                   for x, y, amplitude in blobs)
+
+        config = SourceDetectionTask.ConfigClass()
+        config.thresholdType = "value"
+        task = SourceDetectionTask(config=config)
+        fpSet = afwDet.FootprintSet(image, afwDet.Threshold(1.0), "", 1)
+        self.assertEqual([len(fp.getPeaks()) for fp in fpSet.getFootprints()], [2, 2])
+
+        # Only the brighter blob of the second footprint is above threshold
+        # in the image after subtracting a background from it
+        image.image.array[60:, :] -= 78.0
+        task.updatePeaks(fpSet, image, afwDet.Threshold(5.0))
+        first, second = fpSet.getFootprints()
+        self.assertEqual([peak.getI() for peak in first.getPeaks()],
+                         [lsst.geom.Point2I(256 + 30, 100 + 30), lsst.geom.Point2I(256 + 38, 100 + 30)])
+        self.assertEqual([peak.getI() for peak in second.getPeaks()], [lsst.geom.Point2I(256 + 90, 100 + 90)])
+
+        # Without new peaks, the brightest old peak is kept; only the first
+        # footprint has peaks to update, so only its part of the image is
+        # searched for new ones
+        with unittest.mock.patch.object(afwDet, "FootprintSet", wraps=afwDet.FootprintSet) as mockFpSet:
+            task.updatePeaks(fpSet, image, afwDet.Threshold(1000.0))
+        self.assertEqual(mockFpSet.call_args[0][0].getBBox(), first.getBBox())
+        self.assertEqual([len(fp.getPeaks()) for fp in fpSet.getFootprints()], [1, 1])
+
 
 class TestMemory(lsst.utils.tests.MemoryTestCase):
     pass
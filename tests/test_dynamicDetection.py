@@ -80,6 +80,22 @@ class DynamicDetectionTest(lsst.utils.tests.TestCase):
         self.exposure.maskedImage.variance /= factor
         self.check(1.0/np.sqrt(factor))
 
+    def testReuse(self):
+        """Reusing the smoothed image and sky objects for the background
+        tweak should give nearly the same background as starting again"""
+        images = {}
+        for reuse in (False, True):
+            self.config.doReuseConvolvedImage = reuse
+            self.config.doReuseSkyObjects = reuse
+            exposure = self.exposure.clone()
+            task = DynamicDetectionTask(config=self.config, schema=SourceTable.makeMinimalSchema())
+            results = task.detectFootprints(exposure, expId=12345)
+            self.assertEqual(len(results.background), 1)  # the tweak
+            images[reuse] = exposure.image.array
+        difference = images[True] - images[False]
+        self.assertFloatsAlmostEqual(difference, difference.flat[0], atol=1.0e-2)
+        self.assertLess(abs(difference.flat[0]), 0.1*np.sqrt(12345.6))
+
     def testNoSources(self):
         self.config.skyObjects.nSources = self.config.minNumSources - 1
         self.check(1.0)
@@ -21,20 +21,27 @@
 # see <https://www.lsstcorp.org/LegalNotices/>.
 #
 
+import importlib.util
 import os
+import shutil
+import tempfile
 import unittest
+import unittest.mock
 from collections import Counter
 
 import astropy.time
 import numpy as np
 
 import lsst.geom
+import lsst.sphgeom
 import lsst.afw.table as afwTable
 import lsst.afw.geom as afwGeom
 import lsst.daf.persistence as dafPersist
 from lsst.meas.algorithms import (IngestIndexedReferenceTask, LoadIndexedReferenceObjectsTask,
-                                  LoadIndexedReferenceObjectsConfig, getRefFluxField)
+                                  LoadIndexedReferenceObjectsConfig, LoadReferenceObjectsConfig,
+                                  ReferenceObjectLoader, getRefFluxField)
 from lsst.meas.algorithms.loadReferenceObjects import hasNanojanskyFluxUnits
+from lsst.meas.algorithms.shardCache import ShardCache, getSharedShardCache
 import lsst.utils
 
 import ingestIndexTestBase
@@ -58,6 +65,25 @@ class HtmIndexTestCase(ingestIndexTestBase.IngestIndexCatalogTestBase, lsst.util
                 numWithSources += 1
         self.assertGreater(numWithSources, 0)
 
+    def testGetShardIds(self):
+        """Test that getShardIds finds every shard touching a circle, and only
+        classifies shards as not on the boundary if they are inside it.
+        """
+        pixelization = lsst.sphgeom.HtmPixelization(self.depth)
+        pointShardIds = self.indexer.indexPoints(self.skyCatalog['ra_icrs'], self.skyCatalog['dec_icrs'])
+        for tupl, idList in self.compCats.items():
+            cent = ingestIndexTestBase.make_coord(*tupl)
+            shardIds, isOnBoundary = self.indexer.getShardIds(cent, self.searchRadius)
+            self.assertEqual(len(shardIds), len(isOnBoundary))
+            self.assertEqual(len(set(shardIds)), len(shardIds))
+            inCircle = np.isin(self.skyCatalog['id'], idList)
+            self.assertTrue(set(pointShardIds[inCircle]) <= set(shardIds))
+            for shardId, onBoundary in zip(shardIds, isOnBoundary):
+                if not onBoundary:
+                    for vertex in pixelization.triangle(shardId).getVertices():
+                        separation = cent.separation(lsst.geom.SpherePoint(vertex))
+                        self.assertLessEqual(separation.asRadians(), self.searchRadius.asRadians())
+
     def testAgainstPersisted(self):
         shardId = 2222
         dataset_name = IngestIndexedReferenceTask.ConfigClass().dataset_config.ref_dataset_name
@@ -216,6 +242,156 @@ class HtmIndexTestCase(ingestIndexTestBase.IngestIndexCatalogTestBase, lsst.util
         loader = LoadIndexedReferenceObjectsTask(butler=butler, config=loaderConfig2)
         self.checkAllRowsInRefcat(loader, self.skyCatalog)
 
+    def testIngestAdaptive(self):
+        """Test ingesting with the adaptive HTM indexer, which splits dense
+        trixels into deeper shards.
+        """
+        config = self.makeConfig(withRaDecErr=True, withMagErr=True, withPm=True, withPmErr=True)
+        config.dataset_config.indexer.name = "ADAPTIVE_HTM"
+        config.dataset_config.indexer.active.depth = self.depth - 1
+        config.dataset_config.indexer.active.max_depth = self.depth + 2
+        config.dataset_config.indexer.active.max_rows = len(self.skyCatalog)//20
+        config.id_name = 'id'
+        config.pm_scale = 1000.0
+        config.file_reader.format = 'ascii.commented_header'
+        IngestIndexedReferenceTask.parseAndRun(
+            args=[self.input_dir, "--output", self.outPath+"/output_adaptive",
+                  self.skyCatalogFile],
+            config=config)
+        loader = LoadIndexedReferenceObjectsTask(butler=dafPersist.Butler(self.outPath+"/output_adaptive"))
+        indexerConfig = loader.dataset_config.indexer.active
+        self.assertGreater(len(indexerConfig.split_shard_ids), 0)
+        self.checkAllRowsInRefcat(loader, self.skyCatalog)
+
+        # every object is in a leaf of the shard tree, and the leaves are
+        # at several depths
+        indexer = loader.indexer
+        shardIds = indexer.indexPoints(self.skyCatalog['ra_icrs'], self.skyCatalog['dec_icrs'])
+        leafIds = set(indexer.getLeafShardIds())
+        self.assertTrue(set(shardIds) <= leafIds)
+        self.assertGreater(len({indexer._getDepth(shardId) for shardId in shardIds}), 1)
+        counts = Counter(shardIds)
+        for shardId, count in counts.items():
+            if indexer._getDepth(shardId) < indexerConfig.max_depth:
+                self.assertLessEqual(count, indexerConfig.max_rows)
+
+        # mixed-depth shards cover a search circle exactly once
+        for tupl, idList in self.compCats.items():
+            cent = ingestIndexTestBase.make_coord(*tupl)
+            lcat = loader.loadSkyCircle(cent, self.searchRadius, filterName='a')
+            self.assertEqual(Counter(lcat.refCat['id']), Counter(idList))
+
+    def testIngestSubIndexed(self):
+        """Test ingesting with shards sorted by a finer HTM depth, and loading
+        only the rows near small search circles.
+        """
+        config = self.makeConfig(withRaDecErr=True, withMagErr=True, withPm=True, withPmErr=True)
+        config.dataset_config.indexer.active.depth = self.depth
+        config.dataset_config.sub_index_depth = self.depth + 4
+        config.two_phase = True
+        config.id_name = 'id'
+        config.pm_scale = 1000.0
+        config.file_reader.format = 'ascii.commented_header'
+        IngestIndexedReferenceTask.parseAndRun(
+            args=[self.input_dir, "--output", self.outPath+"/output_subindexed",
+                  self.skyCatalogFile],
+            config=config)
+        loader = LoadIndexedReferenceObjectsTask(butler=dafPersist.Butler(self.outPath+"/output_subindexed"))
+        self.assertEqual(loader.dataset_config.sub_index_depth, self.depth + 4)
+        self.checkAllRowsInRefcat(loader, self.skyCatalog)
+        for tupl, idList in self.compCats.items():
+            cent = ingestIndexTestBase.make_coord(*tupl)
+            lcat = loader.loadSkyCircle(cent, self.searchRadius, filterName='a')
+            self.assertEqual(Counter(lcat.refCat['id']), Counter(idList))
+
+        # a small circle only reads part of its shard
+        row = self.skyCatalog[0]
+        center = lsst.geom.SpherePoint(row['ra_icrs'], row['dec_icrs'], lsst.geom.degrees)
+        radius = 2*lsst.geom.arcseconds
+        shardIds, _ = loader.indexer.getShardIds(center, radius)
+        envelope = loader._getSubIndexEnvelope(center, radius)
+        for shardId in shardIds:
+            full = loader._readShard(shardId)
+            if full is None:
+                continue
+            part = loader._readShard(shardId, envelope)
+            self.assertLessEqual(len(part), len(full))
+            self.assertTrue(set(part['id']) <= set(full['id']))
+            if row['id'] in full['id']:
+                self.assertIn(row['id'], part['id'])
+                if len(full) > 20:
+                    self.assertLess(len(part), len(full))
+
+    @unittest.skipIf(importlib.util.find_spec("pyarrow") is None, "pyarrow is not available")
+    def testIngestParquet(self):
+        """Test ingesting to Parquet shards, and loading all or some of their
+        columns.
+        """
+        config = self.makeConfig(withRaDecErr=True, withMagErr=True, withPm=True, withPmErr=True)
+        config.dataset_config.indexer.active.depth = self.depth
+        config.dataset_config.shard_format = "parquet"
+        config.id_name = 'id'
+        config.pm_scale = 1000.0
+        config.file_reader.format = 'ascii.commented_header'
+        IngestIndexedReferenceTask.parseAndRun(
+            args=[self.input_dir, "--output", self.outPath+"/output_parquet",
+                  self.skyCatalogFile],
+            config=config)
+        loader = LoadIndexedReferenceObjectsTask(butler=dafPersist.Butler(self.outPath+"/output_parquet"))
+        self.assertEqual(loader.dataset_config.shard_format, "parquet")
+        self.checkAllRowsInRefcat(loader, self.skyCatalog)
+        for tupl, idList in self.compCats.items():
+            cent = ingestIndexTestBase.make_coord(*tupl)
+            lcat = loader.loadSkyCircle(cent, self.searchRadius, filterName='a')
+            self.assertEqual(Counter(lcat.refCat['id']), Counter(idList))
+            projected = loader.loadSkyCircle(cent, self.searchRadius, filterName='a', columns=[])
+            self.assertEqual(list(projected.refCat['id']), list(lcat.refCat['id']))
+            self.assertFloatsEqual(projected.refCat['a_flux'], lcat.refCat['a_flux'])
+            self.assertNotIn('b_flux', projected.refCat.schema)
+
+    @unittest.skipIf(importlib.util.find_spec("pyarrow") is None, "pyarrow is not available")
+    def testIngestParquetSubIndexed(self):
+        """Test that loading a small circle from sub-indexed Parquet shards
+        reads only some of their row groups.
+        """
+        import pyarrow.parquet
+
+        config = self.makeConfig(withRaDecErr=True, withMagErr=True)
+        config.dataset_config.indexer.active.depth = self.depth
+        config.dataset_config.sub_index_depth = self.depth + 4
+        config.dataset_config.shard_format = "parquet"
+        config.dataset_config.parquet_row_group_size = 10
+        config.two_phase = True
+        config.id_name = 'id'
+        config.file_reader.format = 'ascii.commented_header'
+        outPath = self.outPath + "/output_parquet_subindexed"
+        IngestIndexedReferenceTask.parseAndRun(args=[self.input_dir, "--output", outPath,
+                                                     self.skyCatalogFile], config=config)
+        loader = LoadIndexedReferenceObjectsTask(butler=dafPersist.Butler(outPath))
+        self.checkAllRowsInRefcat(loader, self.skyCatalog)
+
+        row = self.skyCatalog[0]
+        center = lsst.geom.SpherePoint(row['ra_icrs'], row['dec_icrs'], lsst.geom.degrees)
+        radius = 2*lsst.geom.arcseconds
+        shardIds, _ = loader.indexer.getShardIds(center, radius)
+        envelope = loader._getSubIndexEnvelope(center, radius)
+        readRowGroups = pyarrow.parquet.ParquetFile.read_row_groups
+        numChecked = 0
+        for shardId in shardIds:
+            full = loader._readShard(shardId)
+            if full is None or row['id'] not in full['id']:
+                continue
+            numRowGroups = pyarrow.parquet.ParquetFile(loader._getShardPath(shardId)).metadata.num_row_groups
+            self.assertGreater(numRowGroups, 1)
+            with unittest.mock.patch.object(pyarrow.parquet.ParquetFile, "read_row_groups", autospec=True,
+                                            side_effect=readRowGroups) as mockRead:
+                part = loader._readShard(shardId, envelope)
+            self.assertIn(row['id'], part['id'])
+            self.assertEqual(mockRead.call_count, 1)
+            self.assertLess(len(mockRead.call_args[0][1]), numRowGroups)
+            numChecked += 1
+        self.assertEqual(numChecked, 1)
+
     def testLoadIndexedReferenceConfig(self):
         """Make sure LoadIndexedReferenceConfig has needed fields."""
         """
@@ -245,6 +421,218 @@ class HtmIndexTestCase(ingestIndexTestBase.IngestIndexCatalogTestBase, lsst.util
             else:
                 self.assertEqual(len(idList), 0)
 
+    def testLoadSkyCircleThreaded(self):
+        """Test loadSkyCircle reading shards with a thread pool and with
+        prefetching, which must not change the loaded catalogs.
+        """
+        config = LoadIndexedReferenceObjectsConfig()
+        config.numShardLoadThreads = 4
+        loader = LoadIndexedReferenceObjectsTask(butler=self.testButler, config=config)
+        for tupl, idList in self.compCats.items():
+            cent = ingestIndexTestBase.make_coord(*tupl)
+            lcat = loader.loadSkyCircle(cent, self.searchRadius, filterName='a')
+            self.assertEqual(Counter(lcat.refCat['id']), Counter(idList))
+
+        loader = LoadIndexedReferenceObjectsTask(butler=self.testButler)
+        for tupl, idList in self.compCats.items():
+            cent = ingestIndexTestBase.make_coord(*tupl)
+            loader.prefetchSkyCircle(cent, self.searchRadius)
+            lcat = loader.loadSkyCircle(cent, self.searchRadius, filterName='a')
+            self.assertEqual(Counter(lcat.refCat['id']), Counter(idList))
+            self.assertEqual(loader._prefetched, {})
+            # the prefetched reads are only used by a load of the same columns
+            loader.prefetchSkyCircle(cent, self.searchRadius, filterName='a', columns=[])
+            projected = loader.loadSkyCircle(cent, self.searchRadius, filterName='a', columns=[])
+            self.assertEqual(Counter(projected.refCat['id']), Counter(idList))
+            self.assertEqual(loader._prefetched, {})
+
+    def testGetShards(self):
+        """Test that getShards returns the shards that exist, in order."""
+        loader = LoadIndexedReferenceObjectsTask(butler=self.testButler)
+        cent = ingestIndexTestBase.make_coord(*next(iter(self.compCats)))
+        shardIdList, _ = loader.indexer.getShardIds(cent, self.searchRadius)
+        shards = [shard for shard in loader._iterShards(shardIdList) if shard is not None]
+        self.assertGreater(len(shards), 0)
+        # a shard ID that is not a valid trixel has no shard
+        result = loader.getShards(list(shardIdList) + [0])
+        self.assertEqual(len(result), len(shards))
+        for shard, expected in zip(result, shards):
+            self.assertEqual(list(shard['id']), list(expected['id']))
+
+    def testLoadSkyCircleProjected(self):
+        """Test loadSkyCircle and loadPixelBox loading only some columns."""
+        loader = LoadIndexedReferenceObjectsTask(butler=self.testButler)
+        for tupl, idList in self.compCats.items():
+            cent = ingestIndexTestBase.make_coord(*tupl)
+            full = loader.loadSkyCircle(cent, self.searchRadius, filterName='a').refCat
+            lcat = loader.loadSkyCircle(cent, self.searchRadius, filterName='a', filterNameList=[])
+            self.assertTrue(lcat.refCat.isContiguous())
+            self.assertEqual(Counter(lcat.refCat['id']), Counter(idList))
+            self.assertEqual(lcat.fluxField, 'a_flux')
+            self.assertIn('a_fluxErr', lcat.refCat.schema)
+            self.assertIn('pm_ra', lcat.refCat.schema)
+            self.assertNotIn('b_flux', lcat.refCat.schema)
+            self.assertLess(lcat.refCat.schema.getRecordSize(), full.schema.getRecordSize())
+            if len(full) > 0:
+                self.assertFloatsEqual(lcat.refCat['coord_ra'], full['coord_ra'])
+                self.assertFloatsEqual(lcat.refCat['a_flux'], full['a_flux'])
+
+            lcat = loader.loadSkyCircle(cent, self.searchRadius, filterName='a', columns=['b_flux'])
+            self.assertIn('b_flux', lcat.refCat.schema)
+            self.assertNotIn('b_fluxErr', lcat.refCat.schema)
+
+        with self.assertRaises(RuntimeError):
+            loader.loadSkyCircle(cent, self.searchRadius, filterName='a', columns=['notAColumn'])
+
+        bbox = lsst.geom.Box2I(lsst.geom.Point2I(30, -5), lsst.geom.Extent2I(1000, 1004))
+        pixel_scale = 2*self.searchRadius/max(bbox.getHeight(), bbox.getWidth())
+        wcs = afwGeom.makeSkyWcs(crval=cent, crpix=bbox.getCenter(),
+                                 cdMatrix=afwGeom.makeCdMatrix(scale=pixel_scale))
+        full = loader.loadPixelBox(bbox=bbox, wcs=wcs, filterName='a').refCat
+        lcat = loader.loadPixelBox(bbox=bbox, wcs=wcs, filterName='a', filterNameList=[]).refCat
+        self.assertEqual(list(lcat['id']), list(full['id']))
+        self.assertIn('centroid_x', lcat.schema)
+        self.assertNotIn('b_flux', lcat.schema)
+
+    def testLoadSkyCircleCached(self):
+        """Test loadSkyCircle with the shard cache enabled: repeated loads
+        must hit the cache and give the same catalogs, and proper motions
+        must not be applied to the cached shards.
+        """
+        cache = getSharedShardCache(0)
+        self.addCleanup(cache.clear)
+        cache.clear()
+        config = LoadIndexedReferenceObjectsConfig()
+        config.shardCacheMaxBytes = 1 << 30
+        loader = LoadIndexedReferenceObjectsTask(butler=self.testButler, config=config)
+        epoch = astropy.time.Time(50000, format='mjd', scale='tai')
+        for _ in range(2):
+            for tupl, idList in self.compCats.items():
+                cent = ingestIndexTestBase.make_coord(*tupl)
+                lcat = loader.loadSkyCircle(cent, self.searchRadius, filterName='a')
+                self.assertEqual(Counter(lcat.refCat['id']), Counter(idList))
+                pmCat = loader.loadSkyCircle(cent, self.searchRadius, filterName='a', epoch=epoch)
+                self.assertEqual(Counter(pmCat.refCat['id']), Counter(idList))
+                unchanged = loader.loadSkyCircle(cent, self.searchRadius, filterName='a')
+                self.assertFloatsEqual(unchanged.refCat['coord_ra'], lcat.refCat['coord_ra'])
+        self.assertGreater(loader.metadata.getScalar("shardCacheHits"), 0)
+        self.assertGreater(loader.metadata.getScalar("shardCacheMisses"), 0)
+
+    def testLoadSkyCircleCachedCopy(self):
+        """Test that modifying a catalog loaded with the shard cache enabled
+        does not modify the cached shards.
+        """
+        cache = getSharedShardCache(0)
+        self.addCleanup(cache.clear)
+        cache.clear()
+        config = LoadIndexedReferenceObjectsConfig()
+        config.shardCacheMaxBytes = 1 << 30
+        loader = LoadIndexedReferenceObjectsTask(butler=self.testButler, config=config)
+        for tupl, idList in self.compCats.items():
+            cent = ingestIndexTestBase.make_coord(*tupl)
+            lcat = loader.loadSkyCircle(cent, self.searchRadius, filterName='a', centroids=False)
+            expected = lcat.refCat['a_flux'].copy()
+            lcat.refCat['a_flux'][:] = -1.0
+            reloaded = loader.loadSkyCircle(cent, self.searchRadius, filterName='a', centroids=False)
+            self.assertFloatsEqual(reloaded.refCat['a_flux'], expected)
+            circles = [(cent, self.searchRadius)]*2
+            first, second = loader.loadSkyCircles(circles, filterName='a')
+            first.refCat['a_flux'][:] = -1.0
+            self.assertFloatsEqual(second.refCat['a_flux'], expected)
+        self.assertGreater(loader.metadata.getScalar("shardCacheHits"), 0)
+
+    def testLoadSkyCircleMmapCache(self):
+        """Test loadSkyCircle with the node-wide shard cache: a second loader
+        must map the shards decoded by the first, and give the same catalogs.
+        """
+        cacheDir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cacheDir, True)
+        config = LoadIndexedReferenceObjectsConfig()
+        config.shardCacheDir = cacheDir
+        for i in range(2):
+            loader = LoadIndexedReferenceObjectsTask(butler=self.testButler, config=config)
+            for tupl, idList in self.compCats.items():
+                cent = ingestIndexTestBase.make_coord(*tupl)
+                lcat = loader.loadSkyCircle(cent, self.searchRadius, filterName='a')
+                self.assertEqual(Counter(lcat.refCat['id']), Counter(idList))
+                projected = loader.loadSkyCircle(cent, self.searchRadius, filterName='a', columns=[])
+                self.assertEqual(list(projected.refCat['id']), list(lcat.refCat['id']))
+                self.assertFloatsEqual(projected.refCat['a_flux'], lcat.refCat['a_flux'])
+            if i == 0:
+                self.assertGreater(loader.metadata.getScalar("shardMmapCacheMisses"), 0)
+            else:
+                self.assertEqual(loader.metadata.getScalar("shardMmapCacheMisses"), 0)
+                self.assertGreater(loader.metadata.getScalar("shardMmapCacheHits"), 0)
+
+    def testLoadSameNameCached(self):
+        """Test that loaders of two catalogs with the same dataset name, shard
+        IDs and format version do not share cached shards.
+        """
+        cache = getSharedShardCache(0)
+        self.addCleanup(cache.clear)
+        cache.clear()
+        cacheDir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cacheDir, True)
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/version1')
+        otherPath = os.path.join(tempfile.mkdtemp(), 'version1')
+        self.addCleanup(shutil.rmtree, os.path.dirname(otherPath), True)
+        shutil.copytree(path, otherPath)
+        shardPath = os.path.join(otherPath, 'ref_cats/cal_ref_cat/4022.fits')
+        catalog = afwTable.SimpleCatalog.readFits(shardPath)
+        expected = catalog['a_flux'].copy()
+        catalog['a_flux'] *= 2
+        catalog.writeFits(shardPath)
+        configs = [LoadIndexedReferenceObjectsConfig() for _ in range(2)]
+        configs[0].shardCacheMaxBytes = 1 << 30
+        configs[1].shardCacheDir = cacheDir
+        for config in configs:
+            for repoPath, scale in ((path, 1), (otherPath, 2)):
+                loader = LoadIndexedReferenceObjectsTask(butler=dafPersist.Butler(repoPath), config=config)
+                result = loader.loadSkyCircle(ingestIndexTestBase.make_coord(10, 20),
+                                              5*lsst.geom.degrees, filterName='a')
+                self.assertFloatsEqual(result.refCat['a_flux'], scale*expected)
+
+    def testGen3SameDataIdCached(self):
+        """Test that gen 3 loaders of two catalogs with the same data IDs do
+        not share cached catalogs.
+        """
+        cache = getSharedShardCache(0)
+        self.addCleanup(cache.clear)
+        cache.clear()
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/version1')
+        catalog = afwTable.SimpleCatalog.readFits(os.path.join(path, 'ref_cats/cal_ref_cat/4022.fits'))
+        otherCatalog = catalog.copy(deep=True)
+        otherCatalog['a_flux'] *= 2
+        config = LoadReferenceObjectsConfig()
+        config.shardCacheMaxBytes = 1 << 30
+        dataId = ("htm7", 4022)
+        for root, refCat in (("astrometry", catalog), ("photometry", otherCatalog)):
+            butler = unittest.mock.Mock()
+            butler.datastore.root = root
+            butler.collections = ["refcats"]
+            butler.get.return_value = refCat
+            loader = ReferenceObjectLoader([dataId], butler, config)
+            for _ in range(2):
+                self.assertFloatsEqual(loader._getRefCat(dataId)['a_flux'], refCat['a_flux'])
+
+    def testShardCacheEviction(self):
+        """Test that the shard cache evicts the least recently used shards to
+        stay within its size limit.
+        """
+        catalog = afwTable.SimpleCatalog(afwTable.SimpleTable.makeMinimalSchema())
+        for i in range(10):
+            catalog.addNew().setId(i)
+        size = ShardCache.getSize(catalog)
+        cache = ShardCache(2*size)
+        for key in ("a", "b", "a", "c"):
+            cache.get(key, lambda: catalog)
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (1, 3, 1))
+        self.assertEqual(cache.nBytes, 2*size)
+        self.assertEqual(len(cache), 2)
+        cache.get("a", lambda: None)
+        self.assertEqual(cache.hits, 2)
+        self.assertEqual(list(cache.get("c", lambda: None)['id']), list(range(10)))
+
     def testLoadPixelBox(self):
         """Test LoadIndexedReferenceObjectsTask.loadPixelBox with default config."""
         loader = LoadIndexedReferenceObjectsTask(butler=self.testButler)
@@ -264,6 +652,67 @@ class HtmIndexTestCase(ingestIndexTestBase.IngestIndexCatalogTestBase, lsst.util
             numFound += len(result.refCat)
         self.assertGreater(numFound, 0)
 
+    def testLoadPixelBoxes(self):
+        """Test that loading several regions at once gives the same catalogs
+        as loading them one at a time, including overlapping regions
+        corrected for proper motion.
+        """
+        loader = LoadIndexedReferenceObjectsTask(butler=self.testButler)
+        bbox = lsst.geom.Box2I(lsst.geom.Point2I(30, -5), lsst.geom.Extent2I(1000, 1004))
+        pixel_scale = 2*self.searchRadius/max(bbox.getHeight(), bbox.getWidth())
+        cdMatrix = afwGeom.makeCdMatrix(scale=pixel_scale)
+        wcsList = [afwGeom.makeSkyWcs(crval=ingestIndexTestBase.make_coord(*tupl), crpix=bbox.getCenter(),
+                                      cdMatrix=cdMatrix)
+                   for tupl in self.compCats]
+        results = loader.loadPixelBoxes([bbox]*len(wcsList), wcsList, filterName="a")
+        self.assertEqual(len(results), len(wcsList))
+        for result, wcs in zip(results, wcsList):
+            single = loader.loadPixelBox(bbox=bbox, wcs=wcs, filterName="a")
+            self.assertEqual(list(result.refCat['id']), list(single.refCat['id']))
+            self.assertEqual(result.fluxField, single.fluxField)
+
+        epoch = astropy.time.Time(50000, format='mjd', scale='tai')
+        circles = [(ingestIndexTestBase.make_coord(*tupl), self.searchRadius) for tupl in self.compCats]
+        # the same circle twice, so that the catalogs share all their shards
+        circles.append(circles[0])
+        results = loader.loadSkyCircles(circles, filterName="a", epoch=epoch)
+        for result, (cent, radius) in zip(results, circles):
+            single = loader.loadSkyCircle(cent, radius, filterName="a", epoch=epoch)
+            self.assertEqual(list(result.refCat['id']), list(single.refCat['id']))
+            self.assertFloatsEqual(result.refCat['coord_ra'], single.refCat['coord_ra'])
+            self.assertFloatsEqual(result.refCat['coord_dec'], single.refCat['coord_dec'])
+
+    def testJoinMatchLists(self):
+        """Test that joining many match lists at once gives the same matches
+        as joining them one at a time.
+        """
+        loader = LoadIndexedReferenceObjectsTask(butler=self.testButler)
+        matchCats = []
+        sourceCats = []
+        for tupl in self.compCats:
+            cent = ingestIndexTestBase.make_coord(*tupl)
+            refCat = loader.loadSkyCircle(cent, self.searchRadius, filterName='a').refCat
+            sourceCat = afwTable.SourceCatalog(afwTable.SourceTable.makeMinimalSchema())
+            matches = afwTable.ReferenceMatchVector()
+            for i, refRecord in enumerate(refCat):
+                source = sourceCat.addNew()
+                source.setId(len(refCat) - i)
+                matches.append(afwTable.ReferenceMatch(refRecord, source, 0.5*i))
+            matchCat = afwTable.packMatches(matches)
+            matchCat.table.setMetadata(loader.getMetadataCircle(cent, self.searchRadius, 'a'))
+            matchCats.append(matchCat)
+            sourceCats.append(sourceCat)
+        # a repeated region and source catalog are loaded and indexed once
+        matchCats.append(matchCats[0])
+        sourceCats.append(sourceCats[0])
+
+        matchLists = loader.joinMatchListsWithCatalog(matchCats, sourceCats)
+        self.assertEqual(len(matchLists), len(matchCats))
+        for matchList, matchCat, sourceCat in zip(matchLists, matchCats, sourceCats):
+            expected = loader.joinMatchListWithCatalog(matchCat, sourceCat)
+            self.assertEqual([(m.first.getId(), m.second.getId(), m.distance) for m in matchList],
+                             [(m.first.getId(), m.second.getId(), m.distance) for m in expected])
+
     def testDefaultFilterAndFilterMap(self):
         """Test defaultFilter and filterMap parameters of LoadIndexedReferenceObjectsConfig."""
         config = LoadIndexedReferenceObjectsConfig()
@@ -325,6 +774,28 @@ class HtmIndexTestCase(ingestIndexTestBase.IngestIndexCatalogTestBase, lsst.util
         self.assertFloatsEqual(catalog['b_flux']*1e9, result.refCat['b_flux'])
         self.assertFloatsEqual(catalog['b_fluxSigma']*1e9, result.refCat['b_fluxErr'])
 
+    def testLoadVersion0Cached(self):
+        """Test that the converted shards of a format_version=0 catalog are
+        cached, and are not converted again when read from the cache.
+        """
+        cache = getSharedShardCache(0)
+        self.addCleanup(cache.clear)
+        cache.clear()
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/version0')
+        catalog = afwTable.SimpleCatalog.readFits(os.path.join(path, 'ref_cats/cal_ref_cat/4022.fits'))
+        config = LoadIndexedReferenceObjectsConfig()
+        config.shardCacheMaxBytes = 1 << 30
+        for _ in range(2):
+            # a new loader checks the format again, but reuses the cached shards
+            loader = LoadIndexedReferenceObjectsTask(butler=dafPersist.Butler(path), config=config)
+            for _ in range(2):
+                result = loader.loadSkyCircle(ingestIndexTestBase.make_coord(10, 20),
+                                              5*lsst.geom.degrees, filterName='a')
+                self.assertTrue(hasNanojanskyFluxUnits(result.refCat.schema))
+                self.assertFloatsEqual(catalog['a_flux']*1e9, result.refCat['a_flux'])
+                self.assertFloatsEqual(catalog['b_fluxSigma']*1e9, result.refCat['b_fluxErr'])
+        self.assertGreater(cache.hits, 0)
+
     def testLoadVersion1(self):
         """Test reading a format_version=1 catalog (fluxes unchanged)."""
         path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/version1')
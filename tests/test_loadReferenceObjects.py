@@ -24,10 +24,18 @@
 import itertools
 import unittest
 
+import astropy.coordinates
+import astropy.time
+import astropy.units
+import numpy as np
+
 import lsst.afw.table as afwTable
+import lsst.geom
 import lsst.log
+from lsst import sphgeom
 from lsst.meas.algorithms import LoadReferenceObjectsTask, getRefFluxField, getRefFluxKeys
 from lsst.meas.algorithms.loadReferenceObjects import hasNanojanskyFluxUnits, convertToNanojansky
+from lsst.meas.algorithms.loadReferenceObjects import _FilterCatalog, applyProperMotionsImpl
 import lsst.utils.tests
 
 
@@ -210,6 +218,95 @@ class TestLoadReferenceObjects(lsst.utils.tests.TestCase):
         newRefCat = convertToNanojansky(oldRefCat, log, doConvert=False)
         self.assertIsNone(newRefCat)
 
+    def testFilterCatalog(self):
+        """Check that _FilterCatalog selects the same records as testing each
+        record against the region.
+        """
+        rng = np.random.RandomState(12345)
+        refCat = afwTable.SimpleCatalog(LoadReferenceObjectsTask.makeMinimalSchema(['r']))
+        for i, (ra, dec) in enumerate(zip(rng.uniform(-20, 20, 2000), rng.uniform(-20, 20, 2000))):
+            record = refCat.addNew()
+            record.setId(i)
+            record.setCoord(lsst.geom.SpherePoint(ra, dec, lsst.geom.degrees))
+        vertices = [sphgeom.UnitVector3d(sphgeom.LonLat.fromDegrees(lon, lat))
+                    for lon, lat in [(-5, -5), (8, -3), (10, 10), (-2, 6)]]
+        regions = [
+            sphgeom.Circle(sphgeom.UnitVector3d(sphgeom.LonLat.fromDegrees(3, 4)),
+                           sphgeom.Angle.fromDegrees(7)),
+            sphgeom.ConvexPolygon(vertices),
+            sphgeom.Box.fromDegrees(-5, -10, 15, 5),
+            # a box whose longitude interval wraps around 0
+            sphgeom.Box(sphgeom.NormalizedAngleInterval.fromDegrees(350, 10),
+                        sphgeom.AngleInterval.fromDegrees(-8, 12)),
+            sphgeom.Ellipse(vertices[0], vertices[2], sphgeom.Angle.fromDegrees(5)),
+        ]
+        for region in regions:
+            with self.subTest(region=region):
+                filtered = _FilterCatalog(region)(refCat, sphgeom.Box.full())
+                expected = [record.getId() for record in refCat
+                            if region.contains(record.getCoord().getVector())]
+                self.assertGreater(len(expected), 0)
+                self.assertEqual([record.getId() for record in filtered], expected)
+
+    def makeProperMotionCatalog(self, size=500):
+        """Make a contiguous catalog of objects all over the sky, with proper
+        motions and parallaxes.
+        """
+        rng = np.random.RandomState(54321)
+        schema = LoadReferenceObjectsTask.makeMinimalSchema(['r'], addProperMotion=True, addParallax=True)
+        refCat = afwTable.SimpleCatalog(schema)
+        refCat.resize(size)
+        refCat['coord_ra'] = rng.uniform(0, 2*np.pi, size)
+        refCat['coord_dec'] = np.arcsin(rng.uniform(-1, 1, size))
+        # include objects very close to a pole
+        refCat['coord_dec'][:2] = [np.pi/2 - 1e-9, -np.pi/2 + 1e-7]
+        masPerYear = (1*lsst.geom.milliarcseconds).asRadians()
+        refCat['pm_ra'] = rng.normal(0, 100, size)*masPerYear
+        refCat['pm_dec'] = rng.normal(0, 100, size)*masPerYear
+        refCat['pm_raErr'] = 1e-2*masPerYear
+        refCat['pm_decErr'] = 1e-2*masPerYear
+        refCat['parallax'] = rng.uniform(0, 1000, size)*(1*lsst.geom.milliarcseconds).asRadians()
+        refCat['parallax'][-1] = np.nan
+        refCat['epoch'] = 51544.0
+        return refCat
+
+    def testApplyProperMotions(self):
+        """Check the vectorized proper motion correction against offsetting
+        each record's coord.
+        """
+        refCat = self.makeProperMotionCatalog()
+        original = refCat.copy(deep=True)
+        epoch = astropy.time.Time(51544.0, format='mjd', scale='tai') + 20*astropy.units.yr
+        applyProperMotionsImpl(lsst.log.Log(), refCat, epoch)
+        years = 20.0
+        for orig, ref in zip(original, refCat):
+            bearing = np.arctan2(orig['pm_dec']*1e6, orig['pm_ra']*1e6)*lsst.geom.radians
+            amount = np.hypot(orig['pm_ra'], orig['pm_dec'])*years*lsst.geom.radians
+            expected = orig.getCoord().offset(bearing=bearing, amount=amount)
+            self.assertSpherePointsAlmostEqual(ref.getCoord(), expected,
+                                               maxSep=1e-6*lsst.geom.milliarcseconds)
+
+    def testApplyParallax(self):
+        """Check the parallax correction against the position of each object
+        relative to the Earth.
+        """
+        refCat = self.makeProperMotionCatalog()
+        refCat['pm_ra'] = 0.0
+        refCat['pm_dec'] = 0.0
+        original = refCat.copy(deep=True)
+        epoch = astropy.time.Time(58000.0, format='mjd', scale='tai')
+        applyProperMotionsImpl(lsst.log.Log(), refCat, epoch, applyParallax=True)
+        earth = astropy.coordinates.get_body_barycentric("earth", epoch.tdb).xyz.to(astropy.units.au).value
+        for orig, ref in zip(original, refCat):
+            if not np.isfinite(orig['parallax']):
+                self.assertSpherePointsAlmostEqual(ref.getCoord(), orig.getCoord())
+                continue
+            distance = 1/orig['parallax']
+            position = np.array(orig.getCoord().getVector())*distance - earth
+            expected = lsst.geom.SpherePoint(sphgeom.Vector3d(*position))
+            self.assertSpherePointsAlmostEqual(ref.getCoord(), expected,
+                                               maxSep=1e-6*lsst.geom.milliarcseconds)
+
 
 class TestMemory(lsst.utils.tests.MemoryTestCase):
     pass
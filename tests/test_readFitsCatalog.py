@@ -128,6 +128,29 @@ class ReadFitsCatalogTaskTestCase(lsst.utils.tests.TestCase):
         arr = task.run(FitsPath)
         self.assertTrue(np.array_equal(arr, self.arr2))
 
+    def testGetRowCount(self):
+        """Test that getRowCount reads the number of rows from the header
+        """
+        for hdu in (1, 2):
+            config = ReadFitsCatalogTask.ConfigClass()
+            config.hdu = hdu
+            task = ReadFitsCatalogTask(config=config)
+            self.assertEqual(task.getRowCount(FitsPath), len(task.run(FitsPath)))
+
+    def testReadBlocks(self):
+        """Test that reading in blocks gives the same rows as reading at once
+        """
+        for hdu in (1, 2):
+            config = ReadFitsCatalogTask.ConfigClass()
+            config.hdu = hdu
+            config.block_size = 2
+            task = ReadFitsCatalogTask(config=config)
+            arr = task.run(FitsPath)
+            blocks = list(task.readBlocks(FitsPath))
+            self.assertEqual([len(block) for block in blocks],
+                             [min(2, len(arr) - start) for start in range(0, len(arr), 2)])
+            self.assertTrue(np.array_equal(np.concatenate(blocks), arr))
+
     def testBadPath(self):
         """Test that an invalid path causes an error"""
         task = ReadFitsCatalogTask()
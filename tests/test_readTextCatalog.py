@@ -94,6 +94,80 @@ class ReadTextCatalogTaskTestCase(lsst.utils.tests.TestCase):
         for inname, outname in zip(self.arr.dtype.names, colnames):
             self.assertTrue(np.array_equal(self.arr[inname], arr[outname]))
 
+    def testGetRowCount(self):
+        """Test that getRowCount is the number of rows read
+        """
+        colnames = ("id", "ra_deg", "dec_deg", "total_counts", "total_flux", "is_resolved")
+        for colnames, header_lines in ((None, 0), (colnames, 1)):
+            config = ReadTextCatalogTask.ConfigClass()
+            if colnames:
+                config.colnames = colnames
+            config.header_lines = header_lines
+            task = ReadTextCatalogTask(config=config)
+            self.assertEqual(task.getRowCount(TextPath), len(task.run(TextPath)))
+
+    def testReadBlocks(self):
+        """Test that reading in blocks gives the same rows as reading at once
+        """
+        colnames = ("id", "ra_deg", "dec_deg", "total_counts", "total_flux", "is_resolved")
+        for colnames, header_lines in ((None, 0), (colnames, 1)):
+            config = ReadTextCatalogTask.ConfigClass()
+            if colnames:
+                config.colnames = colnames
+            config.header_lines = header_lines
+            config.block_size = 1
+            task = ReadTextCatalogTask(config=config)
+            arr = task.run(TextPath)
+            blocks = list(task.readBlocks(TextPath))
+            self.assertEqual(len(blocks), len(arr))
+            for block, row in zip(blocks, arr):
+                self.assertEqual(len(block), 1)
+                self.assertEqual(block.dtype.names, arr.dtype.names)
+                self.assertEqual(block[0].tolist(), row.tolist())
+
+    def testReadBlocksTypes(self):
+        """Test that later blocks are parsed with the types of the first block,
+        that columns that do not fit those types are widened, and that
+        values that cannot be combined with them are an error
+        """
+        config = ReadTextCatalogTask.ConfigClass()
+        config.block_size = 2
+        task = ReadTextCatalogTask(config=config)
+        firstLines = ["name,ra,counts,flux\n", "ab,1,10,1.5\n", "cd,2,20,2.5\n"]
+        with lsst.utils.tests.getTempFilePath(".csv") as path:
+            # a float column holding integers, and a narrower string
+            with open(path, "w") as f:
+                f.writelines(firstLines + ["e,3,30,3\n"])
+            blocks = list(task.readBlocks(path))
+            self.assertEqual(len(blocks), 2)
+            self.assertEqual(blocks[1].dtype, blocks[0].dtype)
+            self.assertEqual(blocks[1].tolist(), [("e", 3, 30, 3.0)])
+
+            # a wider string, and a non-integer value in an integer column
+            for line, name, value in (("efgh,3,30,3.5\n", "name", "efgh"),
+                                      ("e,3,30.5,3.5\n", "counts", 30.5)):
+                with open(path, "w") as f:
+                    f.writelines(firstLines + [line])
+                blocks = list(task.readBlocks(path))
+                self.assertEqual(blocks[1][name][0], value)
+                self.assertEqual(blocks[1].dtype.names, blocks[0].dtype.names)
+                self.assertEqual(list(blocks[0][name]), list(task.run(path)[name][:2]))
+
+            with open(path, "w") as f:
+                f.writelines(firstLines + ["e,3,many,3.5\n"])
+            with self.assertRaises(ValueError):
+                list(task.readBlocks(path))
+
+            # the types of the first block can be set
+            with open(path, "w") as f:
+                f.writelines(firstLines + ["efgh,3,30.5,3.5\n"])
+            config.column_dtypes = {"counts": "f8", "name": "U8"}
+            task = ReadTextCatalogTask(config=config)
+            blocks = list(task.readBlocks(path))
+            self.assertEqual(blocks[0].dtype, blocks[1].dtype)
+            self.assertEqual(blocks[0].dtype["counts"], np.dtype("f8"))
+            self.assertEqual(blocks[0].dtype["name"], np.dtype("U8"))
+
     def testBadPath(self):
         """Test that an invalid path causes an error"""
         task = ReadTextCatalogTask()
@@ -0,0 +1,83 @@
+#
+# LSST Data Management System
+#
+# Copyright 2008-2016  AURA/LSST.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+import unittest
+
+import numpy as np
+
+import lsst.geom
+import lsst.afw.geom as afwGeom
+import lsst.afw.image as afwImage
+from lsst.meas.algorithms import SkyObjectsConfig, generateSkyObjects
+import lsst.utils.tests
+
+
+class SkyObjectsTestCase(lsst.utils.tests.TestCase):
+    def setUp(self):
+        bbox = lsst.geom.Box2I(lsst.geom.Point2I(123, 456), lsst.geom.Extent2I(300, 200))
+        self.mask = afwImage.Mask(bbox)
+        self.mask.set(0)
+        rng = np.random.RandomState(12345)
+        detected = self.mask.getPlaneBitMask("DETECTED")
+        for x, y in zip(rng.randint(self.mask.getWidth() - 10, size=100),
+                        rng.randint(self.mask.getHeight() - 10, size=100)):
+            self.mask.array[y:y + 10, x:x + 10] |= detected
+        self.config = SkyObjectsConfig()
+        self.config.nSources = 50
+
+    def testSkyObjects(self):
+        """Test that sky objects avoid the mask and each other"""
+        skyFootprints = generateSkyObjects(self.mask, 678, self.config)
+        self.assertEqual(len(skyFootprints), self.config.nSources)
+        avoid = afwGeom.SpanSet.fromMask(self.mask, self.mask.getPlaneBitMask(self.config.avoidMask))
+        inner = self.mask.getBBox()
+        inner.grow(-(int(self.config.sourceRadius) + 1))
+        for i, fp in enumerate(skyFootprints):
+            self.assertFalse(fp.getSpans().overlaps(avoid))
+            self.assertTrue(inner.contains(fp.getPeaks()[0].getI()))
+            for other in skyFootprints[:i]:
+                self.assertFalse(fp.getSpans().overlaps(other.getSpans()))
+
+    def testReproducible(self):
+        """Test that the same seed gives the same sky objects"""
+        first = generateSkyObjects(self.mask, 678, self.config)
+        second = generateSkyObjects(self.mask, 678, self.config)
+        self.assertEqual([fp.getPeaks()[0].getI() for fp in first],
+                         [fp.getPeaks()[0].getI() for fp in second])
+
+    def testFull(self):
+        """Test that no sky objects are placed on a fully masked image"""
+        self.mask.array[:] = self.mask.getPlaneBitMask("BAD")
+        self.assertEqual(generateSkyObjects(self.mask, 678, self.config), [])
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()